@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Unit tests for zco-clean
+
+Tests:
+1. Files are grouped by session tag across Stops; legacy names group by timestamp
+2. --keep-last protects N sessions, not N Stop snapshots of one long session
+"""
+
+import importlib.machinery
+import importlib.util
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+COMMANDS_DIR = Path(__file__).resolve().parent
+
+##; zco-clean 没有 .py 后缀，按源文件加载
+_loader = importlib.machinery.SourceFileLoader("zco_clean", str(COMMANDS_DIR / "zco-clean"))
+_spec = importlib.util.spec_from_loader("zco_clean", _loader)
+zco_clean = importlib.util.module_from_spec(_spec)
+_loader.exec_module(zco_clean)
+
+DAY = 86400
+NOW = 100 * DAY
+
+
+class TestZcoClean(unittest.TestCase):
+    """Test suite for the retention policy"""
+
+    def setUp(self):
+        """Create temporary test directory"""
+        self.test_dir = Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        """Clean up temporary files"""
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def entry(self, name, age_days, size=100):
+        return {"path": self.test_dir / name, "name": name, "size": size, "mtime": NOW - age_days * DAY,
+                "session": zco_clean.session_key(name), "compressed": False}
+
+    def test_01_session_key(self):
+        self.assertEqual(zco_clean.session_key("log_261019_010000_0123abcd_spec.md"), "0123abcd")
+        self.assertEqual(zco_clean.session_key("log_261019_020000_0123abcd_cli_style.md.gz"), "0123abcd")
+        self.assertEqual(zco_clean.session_key("log_261019_010000_spec.md"), "log_261019_010000")
+        self.assertEqual(zco_clean.session_key("notes.md"), "notes.md")
+
+        (self.test_dir / "log_261019_010000_0123abcd_spec.md").write_text("a", encoding="utf-8")
+        (self.test_dir / "log_261019_020000_0123abcd_spec.md").write_text("b", encoding="utf-8")
+        (self.test_dir / "log_261019_010000_spec_resources.txt").write_text("c", encoding="utf-8")
+        sessions = {e["session"] for e in zco_clean.scan_history(self.test_dir)}
+        self.assertEqual(sessions, {"0123abcd", "log_261019_010000"})
+
+    def test_02_keep_last_counts_sessions(self):
+        ##; 一个长会话有 5 次 Stop（最新），之前还有两个较旧的会话
+        entries = [self.entry(f"log_261019_0{i}0000_aaaaaaaa_spec.md", 40 + i) for i in range(5)]
+        entries += [self.entry("log_260901_010000_bbbbbbbb_spec.md", 50),
+                    self.entry("log_260801_010000_cccccccc_spec.md", 60),
+                    self.entry("log_260701_010000_plain.md", 70)]
+        policy = zco_clean.CleanPolicy(max_age_days=30, keep_last=2)
+        to_delete, _ = zco_clean.plan_cleanup(entries, policy, now=NOW)
+        deleted = {e["name"] for e in to_delete}
+        ##; 保护的是 aaaaaaaa 和 bbbbbbbb 两个会话，而不是 aaaaaaaa 的两次 Stop
+        self.assertEqual(deleted, {"log_260801_010000_cccccccc_spec.md", "log_260701_010000_plain.md"})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,18 +2,59 @@
 """
 ##;调试 Hook - 打印所有接收到的数据
 ##;用于查看 Hook 事件的完整数据结构
+##;
+##;默认（snapshot）: 每个事件覆盖写 _.zco_hist/hook_debug_<event>.json，只保留最近一次
+##;ZCO_HOOK_CAPTURE=ring: 紧凑记录追加到 _.zco_hist/hook_capture_<event>.jsonl（限大小轮转），
+##;  支持采样 ZCO_HOOK_CAPTURE_SAMPLE=N|first:N 和字段白名单 ZCO_HOOK_CAPTURE_FIELDS，
+##;  用 `zco-claude hooks capture list|extract` 查看
 """
 import json
 import os
+import random
 import sys
 from datetime import datetime
 from pathlib import Path
 
+from zco_hist_common import (
+    append_capture, capture_config, claim_capture_slot, get_hist_dir, metrics,
+    run_entry, select_fields,
+)
+
+
+def capture_ring(input_data: dict, config: dict, rng=random):
+    """##;环形采集: 先做 1-in-N 采样（不命中时不定位仓库、不写文件），再按白名单裁剪后追加；rng 可注入以便测试"""
+    if config["every"] > 1 and rng.randrange(config["every"]) != 0:
+        return
+    event = input_data.get("hook_event_name") or "unknown"
+    session_id = input_data.get("session_id") or ""
+    cwd = input_data.get("cwd")
+    hist_dir = get_hist_dir(Path(cwd) if cwd else None)
+    metrics.mark("git_root")
+    if config["first"] and not claim_capture_slot(hist_dir, session_id, event, config["first"]):
+        return
+    record = {
+        "ts": datetime.now().isoformat(timespec='milliseconds'),
+        "event": event,
+        "session_id": session_id,
+        "input": select_fields(input_data, config["fields"]),
+    }
+    append_capture(hist_dir, event, record, config["max_bytes"])
+    metrics.mark("write")
+
 
 def main():
     try:
+        metrics.start("debug_hook")
+
         ##;读取 stdin 输入
         input_data = json.load(sys.stdin)
+        metrics.context(input_data)
+        metrics.mark("stdin")
+
+        config = capture_config()
+        if config["mode"] == "ring":
+            capture_ring(input_data, config)
+            sys.exit(0)
 
         ##;准备调试输出
         debug_info = {
@@ -50,11 +91,14 @@ def main():
 
         hist_dir = git_root / '_.zco_hist'
         hist_dir.mkdir(exist_ok=True)
+        metrics.hist_dir = hist_dir
+        metrics.mark("git_root")
 
         debug_file = hist_dir / f"hook_debug_{input_data.get('hook_event_name', 'unknown')}.json"
 
         with open(debug_file, 'w', encoding='utf-8') as f:
             json.dump(debug_info, f, indent=2, ensure_ascii=False)
+        metrics.mark("write")
 
         print(f"Debug info saved to: {debug_file}", file=sys.stderr)
         print(f"Model from input: {input_data.get('model', 'NOT FOUND')}", file=sys.stderr)
@@ -69,4 +113,4 @@ def main():
 
 
 if __name__ == '__main__':
-    main()
+    run_entry(main, "debug_hook")
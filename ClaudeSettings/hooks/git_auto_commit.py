@@ -10,184 +10,1290 @@
 ##;   ZCO_AUTO_GIT_COMMIT_MODE=1   只提交 staged 改动
 ##;   ZCO_AUTO_GIT_COMMIT_MODE=2   增量提交 unstaged 改动 (推荐)
 ##;   ZCO_AUTO_GIT_COMMIT_MODE=3   增量提交 untracked 文件
+##;   ZCO_AUTO_GIT_COMMIT_MODE=snapshot
+##;                                快照模式: 不动 index 和 HEAD，工作区快照记录到 refs/zco/snapshots/<分支>
 ##;
 ##; 提交消息:
 ##;   staged    → "tm: auto commit staged"
 ##;   unstaged  → "tm: auto commit unstaged"
 ##;   untracked → "tm: auto commit untracked"
+##; 有 session_id 时附加 "Zco-Session: <id>" trailer
+##;
+##; 只运行一次 `git status --porcelain=v2 -z`（mode<3 时不扫描未追踪文件）得到各类路径，
+##; 后续 git add / git commit 直接使用这些路径
+##;
+##; 大仓库加速: 直接读 .git/config 检测 core.untrackedCache / core.fsmonitor（zco-claude init 可开启）。
+##; untracked cache 只对 --untracked-files=normal 生效，开启时 mode 3 改用 normal，
+##; 再用一次 ls-files 只展开新目录；fsmonitor 由 git status 自动使用
+##;
+##; 快照模式使用 <git-dir>/zco/snapshot.index 作为临时 index（GIT_INDEX_FILE），
+##; ls-files 列出相对临时 index 改动/新增的路径，守卫过滤后 git add 这些路径 + write-tree 得到工作区的 tree，
+##; commit-tree 追加到私有 ref；临时 index 跨次保留，git 可复用其中的 stat 信息，每次只重新哈希改动的文件。
+##; 用 `zco-claude snapshot list|restore` 查看和恢复
+##;
+##; mode 2/3 提交前、快照前对改动和未追踪路径做守卫（只 stat，不读文件内容）:
+##; 跳过超过 ZCO_AUTO_GIT_COMMIT_MAX_MB（默认 5）的文件、按扩展名判定的二进制文件，
+##; 以及匹配项目 .claudeignore（zco-claude init 生成）的路径
+##;
+##; 子模块 ZCO_AUTO_GIT_COMMIT_SUBMODULES=1: 按 .gitmodules 在线程池中（ZCO_AUTO_GIT_COMMIT_JOBS，默认 4）
+##; 对每个子模块执行同样的逻辑，再处理主仓库，并输出每个仓库的耗时
+##;
+##; git add / git commit 遇到 index.lock 被占用（IDE、其它会话、后台 fetch）时按指数退避重试，
+##; 一次 hook 运行（含 mode 3 的 add + commit 和所有子模块）的总等待不超过
+##; ZCO_AUTO_GIT_COMMIT_LOCK_BUDGET_MS（默认 2000）后放弃；
+##; 等待次数/时长/放弃次数记入 hook 耗时记录的 counters（lock_waits / lock_wait_ms / lock_timeouts）
+##;
+##; 后台模式 ZCO_AUTO_GIT_COMMIT_BACKGROUND=1: hook 只记录请求并立即返回，
+##; 由脱离会话的 worker 执行提交；两次提交间隔至少 ZCO_AUTO_GIT_COMMIT_DEBOUNCE 秒（默认 30），
+##; 期间的多次提示合并为一次。状态和结果日志在 <git-dir>/zco/autocommit.{state.json,log}，
+##; 用 `zco-claude snapshot log` 查看
+##;
+##; 定期压缩 ZCO_AUTO_GIT_COMMIT_SQUASH_HOURS=N: hook 每小时最多启动一次后台进程，
+##; 把未推送的、早于 N 小时的连续 tm: 提交按会话（无会话 trailer 时按日期）各压缩为一个，
+##; 然后运行 git maintenance run --auto（旧版 git 为 gc --auto）。已推送的提交不会被改写。
+##; 也可手动执行 `zco-claude snapshot squash`
+##;
+##; 轮次索引: 有 session_id 时把本轮提示对应的快照（提交模式为 HEAD）的 commit/tree 记入
+##; <hist>/zco_turns/<会话8位>.turns（定长记录），`zco-claude rewind --session S --turn N` 按偏移直接定位；
+##; 后台模式在 hook 中先追加占位记录，worker 完成后原地填写
+##;
+##; 每轮改动量: 提交模式解析 git commit 自身输出的 diffstat 摘要（不再加 -q），快照模式在新快照生成时
+##; 对上一个快照做一次 diff-tree --shortstat；{files, insertions, deletions} 与轮次一起追加到 <hist>/zco_churn.jsonl
 """
 
 import json
 import os
+import random
+import re
 import subprocess
 import sys
+import time
+from datetime import datetime
+
 from pathlib import Path
 
+from zco_hist_common import (
+    TURN_FLAG_COALESCED, TURN_FLAG_HEAD, TURN_FLAG_SNAPSHOT, append_churn, append_turn, hist_dir_for_root, metrics,
+    run_entry, update_turn,
+)
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows 没有 fcntl，不做快照互斥
+    fcntl = None
+
+##; 快照 ref 前缀，完整 ref 为 refs/zco/snapshots/<分支>（分离 HEAD 时为 detached）
+SNAPSHOT_REF_PREFIX = "refs/zco/snapshots/"
+SNAPSHOT_MODES = ("snapshot", "s")
+##; 快照完成后可以安全改动工作区的状态（busy/error 时没有恢复前的快照）
+SNAPSHOT_OK = ("created", "unchanged")
+##; 后台模式: 两次提交的最小间隔（秒）和结果日志（位于 <git-dir>/zco/）
+BACKGROUND_DEBOUNCE_DEFAULT = 30
+BACKGROUND_LOG_NAME = "autocommit.log"
+##; 提交前的大小/二进制守卫: 超过该大小（MB，ZCO_AUTO_GIT_COMMIT_MAX_MB 覆盖）的文件不自动提交
+GUARD_MAX_MB_DEFAULT = 5
+##; index.lock 被占用时的重试: 总等待预算（毫秒，ZCO_AUTO_GIT_COMMIT_LOCK_BUDGET_MS 覆盖）、首次和最大退避
+LOCK_BUDGET_MS_DEFAULT = 2000
+LOCK_BACKOFF_START = 0.05
+LOCK_BACKOFF_MAX = 0.8
+##; 子模块并行处理的线程数（ZCO_AUTO_GIT_COMMIT_JOBS 覆盖）
+SUBMODULE_JOBS_DEFAULT = 4
+##; 自动提交说明的前缀和会话 trailer（压缩时按会话分组）
+TM_PREFIX = "tm: "
+TM_SESSION_TRAILER = "Zco-Session"
+##; tm: 提交压缩: 默认年龄阈值（小时）、hook 触发的最小间隔（秒）、压缩前 HEAD 的备份 ref 前缀
+SQUASH_OLDER_THAN_HOURS_DEFAULT = 24
+SQUASH_INTERVAL = 3600
+SQUASH_BACKUP_PREFIX = "refs/zco/squash-backup/"
+##; 按扩展名判定的二进制文件（只看文件名，不读内容）；ZCO_AUTO_GIT_COMMIT_BINARY=1 时允许提交
+BINARY_EXTENSIONS = frozenset((
+    ".7z", ".a", ".avi", ".bin", ".bmp", ".bz2", ".class", ".db", ".dll", ".dmg", ".dylib", ".exe",
+    ".gif", ".gz", ".h5", ".ico", ".iso", ".jar", ".jpeg", ".jpg", ".lib", ".mkv", ".mov", ".mp3",
+    ".mp4", ".npy", ".npz", ".o", ".obj", ".onnx", ".parquet", ".pdf", ".pkl", ".png", ".pt",
+    ".pth", ".pyc", ".rar", ".safetensors", ".so", ".sqlite", ".tar", ".tgz", ".tiff", ".wasm",
+    ".wav", ".webm", ".webp", ".whl", ".xz", ".zip", ".zst",
+))
+
 ##; support>= python3.9 list[str]
 ##; support>= python3.8 list
 
 
-def run_git_command(cmd: list, cwd: str):
+def run_git_command(cmd: list, cwd: str, stdin: str = None):
     """##; 执行 git 命令并返回结果 -> tuple[int, str, str]"""
     result = subprocess.run(
         cmd,
         cwd=cwd,
+        input=stdin,
         capture_output=True,
         text=True
     )
     return result.returncode, result.stdout, result.stderr
 
 
-def has_staged_changes(cwd: str) -> bool:
-    """##; 检查是否有已暂存(staged)的改动"""
-    returncode, _, _ = run_git_command(["git", "diff", "--cached", "--quiet"], cwd)
-    return returncode != 0
+##; 本次运行的 index.lock 等待统计（子模块线程共用，只做累加）
+lock_stats = {"waits": 0, "wait_ms": 0.0, "timeouts": 0}
+##; 本次运行所有加锁 git 命令共用的截止时间（monotonic）；None 时每条命令单独计算预算
+lock_deadline = {"at": None}
 
 
-def has_unstaged_changes(cwd: str) -> bool:
-    """##; 检查是否有未暂存(unstaged)的改动"""
-    returncode, _, _ = run_git_command(["git", "diff", "--quiet"], cwd)
-    return returncode != 0
+def lock_budget() -> float:
+    """##; index.lock 等待预算（秒）"""
+    try:
+        return max(float(os.environ.get("ZCO_AUTO_GIT_COMMIT_LOCK_BUDGET_MS", LOCK_BUDGET_MS_DEFAULT)), 0.0) / 1000
+    except ValueError:
+        return LOCK_BUDGET_MS_DEFAULT / 1000
 
 
-def has_untracked_files(cwd: str) -> bool:
-    """##; 检查是否有未追踪(untracked)的文件"""
-    returncode, stdout, _ = run_git_command(
-        ["git", "ls-files", "--others", "--exclude-standard"],
-        cwd
-    )
-    return returncode == 0 and stdout.strip() != ""
+def start_lock_budget():
+    """##; 开始一次运行: 清零等待统计，设定本次运行共用的 index.lock 等待截止时间"""
+    lock_stats.update(waits=0, wait_ms=0.0, timeouts=0)
+    lock_deadline["at"] = time.monotonic() + lock_budget()
 
 
-def git_commit(cwd: str, message: str) -> bool:
-    """##; 执行 git commit"""
-    returncode, _, stderr = run_git_command(
-        ["git", "commit", "-m", message],
-        cwd
-    )
-    if returncode != 0:
-        print(f"##; 提交失败: {stderr}", file=sys.stderr)
-        return False
-    return True
+def run_git_locked(cmd: list, cwd: str, stdin: str = None):
+    """
+    ##; 执行会获取 index.lock 的 git 命令；锁被占用时以带抖动的指数退避重试，
+    ##; 到达本次运行的截止时间（见 start_lock_budget）后放弃，stderr 换成一行说明 -> tuple[int, str, str]
+    """
+    deadline = lock_deadline["at"] or time.monotonic() + lock_budget()
+    delay = LOCK_BACKOFF_START
+    waited = 0.0
+    while True:
+        returncode, stdout, stderr = run_git_command(cmd, cwd, stdin)
+        if returncode == 0 or "index.lock" not in stderr:
+            return returncode, stdout, stderr
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            lock_stats["timeouts"] += 1
+            metrics.count("lock_timeouts")
+            return returncode, stdout, f"index.lock 被占用，等待 {waited * 1000:.0f}ms 后放弃"
+        pause = min(delay * random.uniform(0.5, 1.0), remaining)
+        time.sleep(pause)
+        waited += pause
+        lock_stats["waits"] += 1
+        lock_stats["wait_ms"] += pause * 1000
+        metrics.count("lock_waits")
+        metrics.count("lock_wait_ms", pause * 1000)
+        delay = min(delay * 2, LOCK_BACKOFF_MAX)
 
 
-def git_add(cwd: str, files: str = ".") -> bool:
-    """##; 执行 git add"""
-    returncode, _, stderr = run_git_command(["git", "add", files], cwd)
+def git_status(cwd: str, untracked: bool = True, untracked_cache: bool = False):
+    """
+    ##; 一次 `git status --porcelain=v2 -z` 得到 staged / unstaged / untracked 路径
+    ##; untracked=False 时加 --untracked-files=no，大仓库里省掉未追踪文件的目录扫描
+    ##; untracked_cache=True 时用 --untracked-files=normal（可命中 untracked cache），
+    ##; 输出中的新目录（以 / 结尾）再由一次 ls-files 展开为文件
+    ##; 不是 git 仓库时返回 None
+    ##; Returns:
+    ##;     {staged: [], unstaged: [], untracked: [], unmerged: []}
+    """
+    mode = "no" if not untracked else "normal" if untracked_cache else "all"
+    cmd = ["git", "status", "--porcelain=v2", "-z", f"--untracked-files={mode}"]
+    returncode, stdout, _ = run_git_command(cmd, cwd)
     if returncode != 0:
-        print(f"##; git add 失败: {stderr}", file=sys.stderr)
-        return False
-    return True
+        return None
+    status = parse_porcelain_v2(stdout)
+    dirs = [p for p in status["untracked"] if p.endswith("/")]
+    if dirs:
+        ##; ls-files 不支持 --pathspec-from-file；新目录通常只有几个，直接作为参数
+        returncode, stdout, _ = run_git_command(
+            ["git", "ls-files", "--others", "--exclude-standard", "--full-name", "-z", "--"]
+            + top_pathspecs(dirs).split("\0"), cwd
+        )
+        files = [p for p in stdout.split("\0") if p] if returncode == 0 else []
+        status["untracked"] = [p for p in status["untracked"] if not p.endswith("/")] + files
+        metrics.count("untracked_dirs", len(dirs))
+    return status
+
+
+def git_common_dir(toplevel: str) -> str:
+    """##; 不启动 git 进程定位 .git 目录；worktree / 子模块的 .git 文件按 gitdir: 和 commondir 解析"""
+    git_path = os.path.join(toplevel, ".git")
+    if os.path.isfile(git_path):
+        try:
+            with open(git_path, "r", encoding="utf-8") as f:
+                content = f.read().strip()
+        except OSError:
+            return git_path
+        if content.startswith("gitdir:"):
+            git_path = os.path.normpath(os.path.join(toplevel, content[len("gitdir:"):].strip()))
+        try:
+            with open(os.path.join(git_path, "commondir"), "r", encoding="utf-8") as f:
+                git_path = os.path.normpath(os.path.join(git_path, f.read().strip()))
+        except OSError:
+            pass
+    return git_path
+
+
+def read_core_config(toplevel: str) -> dict:
+    """
+    ##; 读取仓库 config 的 [core] 段（只读一个文件，不展开 include，不含全局配置）
+    ##; Returns:
+    ##;     {小写键名: 值}
+    """
+    core, section = {}, ""
+    try:
+        with open(os.path.join(git_common_dir(toplevel), "config"), "r", encoding="utf-8") as f:
+            lines = f.readlines()
+    except OSError:
+        return core
+    for line in lines:
+        line = line.split("#", 1)[0].split(";", 1)[0].strip()
+        if line.startswith("["):
+            section = line.strip("[]").strip().lower()
+        elif section == "core" and line:
+            key, _, value = line.partition("=")
+            core[key.strip().lower()] = value.strip().strip('"') if _ else "true"
+    return core
+
+
+def repo_accel(toplevel: str) -> dict:
+    """##; 仓库是否开启了 untracked cache / fsmonitor: {untracked_cache: bool, fsmonitor: bool}"""
+    core = read_core_config(toplevel)
+    fsmonitor = core.get("fsmonitor", "false").lower()
+    return {
+        "untracked_cache": core.get("untrackedcache", "").lower() in ("true", "yes", "on", "1"),
+        "fsmonitor": fsmonitor not in ("", "false", "no", "off", "0"),
+    }
+
+
+def parse_porcelain_v2(output: str) -> dict:
+    """
+    ##; 解析 porcelain v2 -z 输出
+    ##;   1 XY sub mH mI mW hH hI path             普通变更
+    ##;   2 XY sub mH mI mW hH hI Xscore path\0orig 重命名/复制（原路径在下一个 NUL 字段）
+    ##;   u XY sub m1 m2 m3 mW h1 h2 h3 path       冲突
+    ##;   ? path / ! path                          未追踪 / 忽略
+    ##; X 表示 index 相对 HEAD（staged），Y 表示工作区相对 index（unstaged），'.' 为未变
+    """
+    status = {"staged": [], "unstaged": [], "untracked": [], "unmerged": []}
+    fields = output.split("\0")
+    i = 0
+    while i < len(fields):
+        entry = fields[i]
+        i += 1
+        if not entry:
+            continue
+        kind = entry[0]
+        if kind == "?":
+            status["untracked"].append(entry[2:])
+        elif kind == "u":
+            status["unmerged"].append(entry.split(" ", 10)[10])
+        elif kind in ("1", "2"):
+            parts = entry.split(" ", 8 if kind == "1" else 9)
+            xy, path = parts[1], parts[-1]
+            if kind == "2":
+                i += 1  ##; 跳过原路径
+            if xy[0] != ".":
+                status["staged"].append(path)
+            ##; 子模块（sub 字段 S...）只有提交变化（C）才算 unstaged，仅内容脏（M/U）时主仓库无可提交内容
+            sub = parts[2]
+            if xy[1] != "." and not (sub[0] == "S" and sub[1] != "C"):
+                status["unstaged"].append(path)
+    return status
+
+
+def find_toplevel(cwd: str) -> str:
+    """##; 向上查找含 .git（目录或文件）的目录作为工作区根目录，只做 stat，不启动 git 进程"""
+    path = os.path.abspath(cwd)
+    while True:
+        if os.path.exists(os.path.join(path, ".git")):
+            return path
+        parent = os.path.dirname(path)
+        if parent == path:
+            return os.path.abspath(cwd)
+        path = parent
+
+
+def compile_ignore_rules(lines: list) -> list:
+    """
+    ##; 把 gitignore 语法的规则编译为 [(regex, negate, dir_only)]
+    ##; 支持 ! 取反、结尾 / 只匹配目录、含 / 时相对根目录、*、?、** 和 [...]
+    """
+    rules = []
+    for raw in lines:
+        line = raw.rstrip("\n").rstrip()
+        if not line or line.startswith("#"):
+            continue
+        negate = line.startswith("!")
+        if negate:
+            line = line[1:]
+        dir_only = line.endswith("/")
+        line = line.rstrip("/")
+        anchored = "/" in line
+        line = line.lstrip("/")
+        if line.startswith("./"):
+            line = line[2:]
+        if not line:
+            continue
+        out, i = [], 0
+        while i < len(line):
+            if line.startswith("**/", i):
+                out.append("(?:.*/)?")
+                i += 3
+            elif line.startswith("**", i):
+                out.append(".*")
+                i += 2
+            elif line[i] == "*":
+                out.append("[^/]*")
+                i += 1
+            elif line[i] == "?":
+                out.append("[^/]")
+                i += 1
+            elif line[i] == "[" and "]" in line[i + 1:]:
+                end = line.index("]", i + 1)
+                out.append("[" + line[i + 1:end].replace("!", "^", 1) + "]")
+                i = end + 1
+            else:
+                out.append(re.escape(line[i]))
+                i += 1
+        prefix = "" if anchored else "(?:.*/)?"
+        rules.append((re.compile(prefix + "".join(out) + "$"), negate, dir_only))
+    return rules
+
+
+def load_claudeignore(toplevel: str) -> list:
+    """##; 读取项目根目录的 .claudeignore，没有时返回空规则"""
+    try:
+        with open(os.path.join(toplevel, ".claudeignore"), "r", encoding="utf-8") as f:
+            return compile_ignore_rules(f.readlines())
+    except OSError:
+        return []
+
+
+def is_ignored(rules: list, path: str) -> bool:
+    """##; gitignore 语义: 后面的规则覆盖前面的；父目录被忽略时其中的文件一律忽略"""
+    parts = path.split("/")
+    for depth in range(1, len(parts) + 1):
+        sub = "/".join(parts[:depth])
+        is_dir = depth < len(parts)
+        ignored = False
+        for regex, negate, dir_only in rules:
+            if dir_only and not is_dir:
+                continue
+            if regex.match(sub):
+                ignored = not negate
+        if ignored and is_dir:
+            return True
+        if depth == len(parts):
+            return ignored
+    return False
+
+
+def guard_paths(toplevel: str, paths: list, rules: list, max_bytes: int, allow_binary: bool):
+    """
+    ##; 提交前守卫：过滤掉 .claudeignore 匹配、二进制扩展名和超过 max_bytes 的路径
+    ##; 只对通过前两项检查的路径做一次 lstat；已删除的路径保留（提交删除不需要哈希）
+    ##; Returns:
+    ##;     (kept, skipped): skipped 为 {reason: [path]}
+    """
+    kept = []
+    skipped = {"claudeignore": [], "binary": [], "size": []}
+    for path in paths:
+        if rules and is_ignored(rules, path):
+            skipped["claudeignore"].append(path)
+            continue
+        if not allow_binary and os.path.splitext(path)[1].lower() in BINARY_EXTENSIONS:
+            skipped["binary"].append(path)
+            continue
+        try:
+            size = os.lstat(os.path.join(toplevel, path)).st_size
+        except OSError:
+            size = 0
+        if size > max_bytes:
+            skipped["size"].append(path)
+            continue
+        kept.append(path)
+    return kept, skipped
+
+
+def guard_settings():
+    """##; 读取守卫配置: (max_bytes, allow_binary)"""
+    try:
+        max_mb = float(os.environ.get("ZCO_AUTO_GIT_COMMIT_MAX_MB", GUARD_MAX_MB_DEFAULT))
+    except ValueError:
+        max_mb = GUARD_MAX_MB_DEFAULT
+    return int(max_mb * 1024 * 1024), os.environ.get("ZCO_AUTO_GIT_COMMIT_BINARY") == "1"
+
+
+def apply_guard(cwd: str, status: dict) -> dict:
+    """##; 对 status 中的 unstaged / untracked 路径做守卫，原地替换并打印跳过的文件数"""
+    toplevel = find_toplevel(cwd)
+    rules = load_claudeignore(toplevel)
+    max_bytes, allow_binary = guard_settings()
+    total = {"claudeignore": 0, "binary": 0, "size": 0}
+    for key in ("unstaged", "untracked"):
+        if not status[key]:
+            continue
+        status[key], skipped = guard_paths(toplevel, status[key], rules, max_bytes, allow_binary)
+        for reason, paths in skipped.items():
+            total[reason] += len(paths)
+        report_large(skipped["size"], max_bytes)
+    report_skipped(total)
+    status["skipped"] = total
+    return status
 
 
-def git_add_updated(cwd: str) -> bool:
-    """##; 执行 git add -u (只添加已追踪的修改文件)"""
-    returncode, _, stderr = run_git_command(["git", "add", "-u"], cwd)
+def report_large(paths: list, max_bytes: int):
+    """##; 逐个打印被跳过的大文件"""
+    for path in paths:
+        print(f"##; 跳过大文件 (> {max_bytes // 1024 // 1024}MB): {path}", file=sys.stderr)
+
+
+def report_skipped(total: dict):
+    """##; 打印守卫按原因跳过的路径数"""
+    if any(total.values()):
+        print(f"##; 守卫跳过: .claudeignore {total['claudeignore']}, 二进制 {total['binary']}, "
+              f"大文件 {total['size']}", file=sys.stderr)
+
+
+def top_pathspecs(paths: list) -> str:
+    """
+    ##; status 输出的路径相对仓库根目录，而 pathspec 相对 cwd；
+    ##; 用 :(top,literal) 让 cwd 在子目录时也指向同一文件，并关闭通配符展开
+    """
+    return "\0".join(f":(top,literal){p}" for p in paths)
+
+
+##; diffstat 摘要行: " 3 files changed, 10 insertions(+), 2 deletions(-)"（没有的部分省略）
+_SHORTSTAT_RE = re.compile(r"(\d+) files? changed(?:, (\d+) insertions?\(\+\))?(?:, (\d+) deletions?\(-\))?")
+
+
+def parse_shortstat(text: str) -> dict:
+    """##; 从 git 输出中取 diffstat 摘要 -> {files, insertions, deletions}，没有摘要行时全为 0"""
+    found = _SHORTSTAT_RE.search(text or "")
+    if not found:
+        return {"files": 0, "insertions": 0, "deletions": 0}
+    return {"files": int(found.group(1)), "insertions": int(found.group(2) or 0),
+            "deletions": int(found.group(3) or 0)}
+
+
+def add_churn(total: dict, churn: dict) -> dict:
+    for key in ("files", "insertions", "deletions"):
+        total[key] = total.get(key, 0) + churn.get(key, 0)
+    return total
+
+
+def git_commit(cwd: str, message: str, paths: list = None, churn: dict = None) -> bool:
+    """
+    ##; 执行 git commit
+    ##; 指定 paths 时以 pathspec 提交这些路径的工作区内容（等同 --only），不需要先 git add
+    ##; 传入 churn 时不加 -q，从 commit 自身输出的 diffstat 摘要累加改动量，不另起 git 进程
+    """
+    cmd = ["git", "commit", "-m", message] + (["-q"] if churn is None else [])
+    stdin = None
+    if paths:
+        cmd += ["--pathspec-from-file=-", "--pathspec-file-nul"]
+        stdin = top_pathspecs(paths)
+    returncode, stdout, stderr = run_git_locked(cmd, cwd, stdin)
     if returncode != 0:
-        print(f"##; git add -u 失败: {stderr}", file=sys.stderr)
+        print(f"##; 提交失败: {stderr}", file=sys.stderr)
         return False
+    if churn is not None:
+        add_churn(churn, parse_shortstat(stdout))
     return True
 
 
-def is_git_repository(cwd: str) -> bool:
-    """##; 检查当前目录是否是 git 仓库"""
-    returncode, _, _ = run_git_command(
-        ["git", "rev-parse", "--git-dir"],
-        cwd
+def git_add(cwd: str, paths: list) -> bool:
+    """##; 执行 git add，路径列表经 stdin 以 NUL 分隔传入（不受命令行长度限制，不做通配符展开）"""
+    returncode, _, stderr = run_git_locked(
+        ["git", "add", "--pathspec-from-file=-", "--pathspec-file-nul"],
+        cwd, top_pathspecs(paths)
     )
-    return returncode == 0
+    if returncode != 0:
+        print(f"##; git add 失败: {stderr}", file=sys.stderr)
+        return False
+    return True
 
 
-def auto_commit(cwd: str) -> list:
+def auto_commit(cwd: str, status: dict = None) -> list:
     """
-    ##; 自动提交工作区变更
+    ##; 自动提交工作区变更（staged / unstaged / untracked 依次各提交一次）
+    ##; status 为 git_status() 的结果，不传时调用一次
     ##; 返回提交的 commit message 列表
     """
     committed_messages = []
+    status = status if status is not None else git_status(cwd)
+    if status is None:
+        return committed_messages
+    apply_guard(cwd, status)
 
-    ##; 1. 检查是否有已暂存(staged)的改动
-    if has_staged_changes(cwd):
+    ##; 1. 已暂存(staged)的改动
+    if status["staged"]:
         print("##; 检测到已暂存(staged)的代码，正在自动创建备份提交...", file=sys.stderr)
         if git_commit(cwd, "tm: auto commit staged"):
             committed_messages.append("staged")
 
-    ##; 2. 检查是否有未暂存(unstaged)的改动
-    ##; 只针对 Git 已经追踪的文件，全新的 Untracked 文件不会被处理
-    if has_unstaged_changes(cwd):
+    ##; 2. 未暂存(unstaged)的改动，只针对 Git 已经追踪的文件
+    if status["unstaged"]:
         print("##; 检测到未暂存(unstaged)的改动，正在自动添加并备份...", file=sys.stderr)
-        if git_add_updated(cwd):
-            if git_commit(cwd, "tm: auto commit unstaged"):
-                committed_messages.append("unstaged")
+        if git_commit(cwd, "tm: auto commit unstaged", status["unstaged"]):
+            committed_messages.append("unstaged")
 
-    ##; 3. 处理完全未追踪(Untracked)的文件
-    if has_untracked_files(cwd):
+    ##; 3. 完全未追踪(Untracked)的文件
+    if status["untracked"]:
         print("##; 检测到新的未追踪文件，正在自动添加并备份...", file=sys.stderr)
-        if git_add(cwd, "."):
+        if git_add(cwd, status["untracked"]):
             if git_commit(cwd, "tm: auto commit untracked"):
                 committed_messages.append("untracked")
 
     return committed_messages
 
 
-def main():
-    """##; Hook 主入口"""
-    ##; 读取环境变量
-    mode_str = os.environ.get("ZCO_AUTO_GIT_COMMIT_MODE", "0")
+def repo_info(cwd: str):
+    """
+    ##; 一次 rev-parse 取 git 目录、工作区根目录和当前分支
+    ##; 不是 git 仓库（或是裸仓库）时返回 None
+    ##; Returns:
+    ##;     (git_dir, toplevel, branch)
+    """
+    returncode, stdout, _ = run_git_command(
+        ["git", "rev-parse", "--absolute-git-dir", "--show-toplevel", "--abbrev-ref", "HEAD"], cwd
+    )
+    lines = stdout.splitlines()
+    if returncode != 0 or len(lines) < 3:
+        ##; 新仓库还没有提交时 --abbrev-ref HEAD 失败
+        returncode, stdout, _ = run_git_command(["git", "rev-parse", "--absolute-git-dir", "--show-toplevel"], cwd)
+        lines = stdout.splitlines()
+        if returncode != 0 or len(lines) < 2:
+            return None
+        _, branch, _ = run_git_command(["git", "symbolic-ref", "--short", "-q", "HEAD"], cwd)
+        lines = lines[:2] + [branch.strip() or "HEAD"]
+    branch = lines[2] if lines[2] != "HEAD" else "detached"
+    return lines[0], lines[1], branch
+
+
+def resolve_revs(cwd: str, names: list) -> list:
+    """##; 批量解析对象名，不存在的返回空字符串"""
+    returncode, stdout, _ = run_git_command(
+        ["git", "cat-file", "--batch-check=%(objectname)"], cwd, "\n".join(names) + "\n"
+    )
+    oids = stdout.splitlines() if returncode == 0 else []
+    oids += [""] * (len(names) - len(oids))
+    return ["" if " " in oid else oid for oid in oids[:len(names)]]
+
+
+def snapshot_ref(branch: str) -> str:
+    return SNAPSHOT_REF_PREFIX + branch
+
+
+def take_snapshot(cwd: str, message: str = "", gitlinks: dict = None, wait: float = 0) -> dict:
+    """
+    ##; 把工作区（含未追踪文件，遵守 .gitignore）记录为 refs/zco/snapshots/<分支> 上的一个提交
+    ##; 只使用私有的临时 index，不改动用户的 index、HEAD 和分支
+    ##; 工作区与上一个快照相同时不生成新提交
+    ##; gitlinks={子模块路径: 提交} 时快照中的子模块指向这些提交（子模块各自的快照）
+    ##; wait>0 时最多等待该秒数获取 snapshot.lock（hook 正在拍快照），超时返回 busy；hook 自身不等待
+    ##; 与提交模式相同的守卫: 被跳过的路径不哈希，已在临时 index 中的从快照里移除（rewind 不会覆盖它们）
+    ##; Returns:
+    ##;     {status: created|unchanged|busy|error, ref, commit, tree, branch, skipped}
+    """
+    info = repo_info(cwd)
+    if info is None:
+        return {"status": "error", "error": "not a git repository"}
+    git_dir, toplevel, branch = info
+    ref = snapshot_ref(branch)
+    result = {"status": "error", "ref": ref, "branch": branch}
+
+    state_dir = os.path.join(git_dir, "zco")
+    os.makedirs(state_dir, exist_ok=True)
+    index_file = os.path.join(state_dir, "snapshot.index")
+    lock_fd = os.open(os.path.join(state_dir, "snapshot.lock"), os.O_WRONLY | os.O_CREAT, 0o644)
     try:
-        mode = int(mode_str)
+        if fcntl is not None:
+            deadline = time.monotonic() + wait
+            while True:
+                try:
+                    fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except OSError:
+                    if time.monotonic() >= deadline:
+                        return dict(result, status="busy")
+                    time.sleep(LOCK_BACKOFF_START)
+
+        ##; 首次使用时以用户的 index 为起点（复用 stat 信息，避免全量哈希）
+        user_index = os.path.join(git_dir, "index")
+        if not os.path.exists(index_file) and os.path.exists(user_index):
+            import shutil
+            shutil.copyfile(user_index, index_file)
+
+        env = dict(os.environ, GIT_INDEX_FILE=index_file, GIT_LITERAL_PATHSPECS="1")
+        ##; 相对临时 index 改动/删除/新增的路径（只比较 stat），守卫后只 add 保留的路径
+        proc = subprocess.run(["git", "ls-files", "-z", "--modified", "--others", "--exclude-standard"],
+                              cwd=toplevel, env=env, capture_output=True, text=True)
+        if proc.returncode != 0:
+            return dict(result, error=proc.stderr.strip())
+        changed = list(dict.fromkeys(p for p in proc.stdout.split("\0") if p))
+        max_bytes, allow_binary = guard_settings()
+        kept, skipped = guard_paths(toplevel, changed, load_claudeignore(toplevel), max_bytes, allow_binary)
+        report_large(skipped["size"], max_bytes)
+        total = {reason: len(paths) for reason, paths in skipped.items()}
+        report_skipped(total)
+        result["skipped"] = total
+        dropped = [p for paths in skipped.values() for p in paths]
+
+        index_info = "".join(f"160000 {commit}\t{path}\n" for path, commit in (gitlinks or {}).items())
+        cmds = []
+        if kept:
+            cmds.append((["git", "add", "-A", "--pathspec-from-file=-", "--pathspec-file-nul"],
+                         "\0".join(kept)))
+        if dropped:
+            cmds.append((["git", "rm", "--cached", "-f", "-q", "-r", "--ignore-unmatch", "--pathspec-from-file=-",
+                          "--pathspec-file-nul"], "\0".join(dropped)))
+        if index_info:
+            cmds.append((["git", "update-index", "--index-info"], index_info))
+        cmds.append((["git", "write-tree"], None))
+        for cmd, stdin in cmds:
+            proc = subprocess.run(cmd, cwd=toplevel, env=env, input=stdin, capture_output=True, text=True)
+            if proc.returncode != 0:
+                return dict(result, error=proc.stderr.strip())
+        tree = proc.stdout.strip()
+
+        ##; 上一个快照（没有时以 HEAD 为比较对象）: 一次 cat-file --batch-check 解析四个名字
+        parent, previous_tree, head, head_tree = resolve_revs(
+            toplevel, [ref, ref + "^{tree}", "HEAD", "HEAD^{tree}"])
+        base_tree = previous_tree if parent else head_tree
+        if tree == base_tree:
+            return dict(result, status="unchanged", tree=tree, commit=parent)
+
+        body = f"zco snapshot {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\nhead: {head or '-'}\n"
+        if message:
+            body += message.rstrip() + "\n"
+        cmd = ["git", "commit-tree", tree] + (["-p", parent] if parent else [])
+        returncode, commit, stderr = run_git_command(cmd, toplevel, body)
+        if returncode != 0:
+            return dict(result, error=stderr.strip())
+        commit = commit.strip()
+        ##; 以旧值做 CAS 更新，并发写同一个 ref 时后者失败而不是覆盖
+        returncode, _, stderr = run_git_command(
+            ["git", "update-ref", "-m", "zco snapshot", ref, commit, parent or "0" * 40], toplevel
+        )
+        if returncode != 0:
+            return dict(result, error=stderr.strip())
+        ##; 相对上一个快照（或 HEAD）的改动量: 两个 tree 之间的 diff，只读取变化的对象
+        churn = {"files": 0, "insertions": 0, "deletions": 0}
+        if base_tree:
+            churn = parse_shortstat(run_git_command(["git", "diff-tree", "-r", "--shortstat", base_tree, tree],
+                                                    toplevel)[1])
+        return dict(result, status="created", tree=tree, commit=commit, churn=churn)
+    finally:
+        os.close(lock_fd)
+
+
+def snapshot_message(input_data: dict) -> str:
+    """##; 快照提交说明: 会话 id 和提示词首行"""
+    lines = []
+    if input_data.get("session_id"):
+        lines.append(f"session: {input_data['session_id']}")
+    prompt = (input_data.get("prompt") or "").strip()
+    if prompt:
+        lines.append(f"prompt: {prompt.splitlines()[0][:120]}")
+    return "\n".join(lines)
+
+
+def tm_message(kind: str, input_data: dict = None) -> str:
+    """##; 自动提交说明 "tm: auto commit <kind>"，带会话 trailer，供压缩时按会话分组"""
+    message = f"{TM_PREFIX}auto commit {kind}"
+    session_id = (input_data or {}).get("session_id")
+    if session_id:
+        message += f"\n\n{TM_SESSION_TRAILER}: {session_id}"
+    return message
+
+
+def unpushed_chain(cwd: str) -> list:
+    """
+    ##; 当前分支上未推送（任何远程 ref 都不可达）的 first-parent 提交，从旧到新
+    ##; 遇到合并提交时只保留它之后的部分，保证链是线性的
+    ##; Returns:
+    ##;     [{commit, tree, parents, author: (name, email, date), committer: (...), time, body}]
+    """
+    fmt = "%H%x00%T%x00%P%x00%an%x00%ae%x00%ad%x00%cn%x00%ce%x00%cd%x00%B%x01"
+    returncode, stdout, _ = run_git_command(
+        ["git", "log", "--first-parent", "--date=raw", f"--format={fmt}", "HEAD", "--not", "--remotes"], cwd
+    )
+    if returncode != 0:
+        return []
+    chain = []
+    for entry in stdout.split("\x01"):
+        entry = entry.lstrip("\n")
+        if not entry:
+            continue
+        fields = entry.split("\x00", 9)
+        parents = fields[2].split()
+        if len(parents) > 1:
+            break
+        chain.append({
+            "commit": fields[0], "tree": fields[1], "parents": parents,
+            "author": tuple(fields[3:6]), "committer": tuple(fields[6:9]),
+            "time": int(fields[8].split()[0]), "body": fields[9],
+        })
+    chain.reverse()
+    return chain
+
+
+def tm_group_key(entry: dict, by: str) -> str:
+    """##; 压缩分组: by=session 时取会话 trailer（没有时退回日期），by=day 时取提交日期"""
+    if by == "session":
+        found = re.search(rf"^{TM_SESSION_TRAILER}: (\S+)$", entry["body"], re.MULTILINE)
+        if found:
+            return f"session {found.group(1)}"
+    return "day " + datetime.fromtimestamp(entry["time"]).strftime("%Y-%m-%d")
+
+
+def plan_tm_squash(chain: list, older_than: float, by: str = "session", now: float = None) -> list:
+    """
+    ##; 把链切分为段: 连续的、早于 older_than 秒的、同一分组的 tm: 提交合并为一段，其它提交各自一段
+    ##; Returns:
+    ##;     [(key, [entry, ...])]，key 为 None 表示原样保留
+    """
+    cutoff = (now or time.time()) - older_than
+    segments = []
+    for entry in chain:
+        key = None
+        if entry["body"].startswith(TM_PREFIX) and entry["time"] < cutoff:
+            key = tm_group_key(entry, by)
+        if key is not None and segments and segments[-1][0] == key:
+            segments[-1][1].append(entry)
+        else:
+            segments.append((key, [entry]))
+    ##; 只有一个提交的段不需要压缩
+    return [(key if len(entries) > 1 else None, entries) for key, entries in segments]
+
+
+def _commit_tree(cwd: str, tree: str, parent: str, body: str, author: tuple, committer: tuple) -> str:
+    """##; commit-tree 生成提交，保留原作者/提交者和时间（raw 日期格式），失败返回空字符串"""
+    env = dict(os.environ,
+               GIT_AUTHOR_NAME=author[0], GIT_AUTHOR_EMAIL=author[1], GIT_AUTHOR_DATE=author[2],
+               GIT_COMMITTER_NAME=committer[0], GIT_COMMITTER_EMAIL=committer[1], GIT_COMMITTER_DATE=committer[2])
+    cmd = ["git", "commit-tree", tree] + (["-p", parent] if parent else [])
+    proc = subprocess.run(cmd, cwd=cwd, env=env, input=body, capture_output=True, text=True)
+    return proc.stdout.strip() if proc.returncode == 0 else ""
+
+
+def squash_tm_commits(cwd: str, older_than_hours: float = SQUASH_OLDER_THAN_HOURS_DEFAULT, by: str = "session",
+                      dry_run: bool = False) -> dict:
+    """
+    ##; 把当前分支上未推送的、早于 older_than_hours 的连续 tm: 提交按会话（或日期）各压缩为一个
+    ##; 已推送的历史不改动；用 commit-tree 重建压缩点之后的提交（tree 不变，作者/时间/说明保留），
+    ##; 最后以旧值做 CAS 更新分支 ref。最终 tree 与原 HEAD 相同，index 和工作区不受影响。
+    ##; 原 HEAD 记录在 refs/zco/squash-backup/<分支>
+    ##; Returns:
+    ##;     {status: squashed|planned|unchanged|skipped|error, branch, runs, removed, old_head, new_head, detail}
+    """
+    info = repo_info(cwd)
+    if info is None:
+        return {"status": "error", "detail": "not a git repository"}
+    git_dir, toplevel, branch = info
+    result = {"status": "unchanged", "branch": branch, "runs": [], "removed": 0}
+    if branch == "detached":
+        return dict(result, status="skipped", detail="detached HEAD")
+    busy = [name for name in ("rebase-merge", "rebase-apply", "MERGE_HEAD", "CHERRY_PICK_HEAD", "REVERT_HEAD")
+            if os.path.exists(os.path.join(git_dir, name))]
+    if busy:
+        return dict(result, status="skipped", detail=f"{busy[0]} in progress")
+
+    chain = unpushed_chain(toplevel)
+    if not chain:
+        return result
+    segments = plan_tm_squash(chain, older_than_hours * 3600, by)
+    runs = [(key, entries) for key, entries in segments if key]
+    result["runs"] = [{"key": key, "count": len(entries), "first": entries[0]["commit"],
+                       "last": entries[-1]["commit"]} for key, entries in runs]
+    result["removed"] = sum(len(entries) - 1 for _, entries in runs)
+    old_head = chain[-1]["commit"]
+    result["old_head"] = old_head
+    if not runs or dry_run:
+        return dict(result, status="unchanged" if not runs else "planned")
+
+    parent = chain[0]["parents"][0] if chain[0]["parents"] else ""
+    rewriting = False
+    for key, entries in segments:
+        last = entries[-1]
+        if key:
+            subjects = "".join(f"- {e['body'].splitlines()[0]} ({e['commit'][:10]})\n" for e in entries)
+            body = (f"{TM_PREFIX}auto commit squashed {len(entries)} commits ({key})\n\n{subjects}")
+            rewriting = True
+        elif not rewriting:
+            parent = last["commit"]
+            continue
+        else:
+            body = last["body"]
+        parent = _commit_tree(toplevel, last["tree"], parent, body, last["author"], last["committer"])
+        if not parent:
+            return dict(result, status="error", detail=f"commit-tree failed at {last['commit'][:10]}")
+
+    ref = f"refs/heads/{branch}"
+    run_git_command(["git", "update-ref", "-m", "zco tm squash backup", SQUASH_BACKUP_PREFIX + branch, old_head],
+                    toplevel)
+    ##; 分支在此期间有新提交时 CAS 失败，放弃本次压缩（下次再试）
+    returncode, _, stderr = run_git_command(
+        ["git", "update-ref", "-m", f"zco tm squash: {result['removed']} commits", ref, parent, old_head], toplevel
+    )
+    if returncode != 0:
+        return dict(result, status="error", detail=stderr.strip())
+    return dict(result, status="squashed", new_head=parent)
+
+
+def run_maintenance(cwd: str, background: bool = True) -> bool:
+    """
+    ##; 运行 `git maintenance run --auto`（git < 2.29 时退回 `git gc --auto`），只在需要时打包/清理
+    ##; background=True 时启动脱离会话的进程后立即返回
+    """
+    returncode, _, _ = run_git_command(["git", "maintenance", "run", "-h"], cwd)
+    ##; -h 的退出码为 129；命令不存在时 git 返回 1
+    cmd = ["git", "maintenance", "run", "--auto", "--quiet"] if returncode == 129 else ["git", "gc", "--auto", "--quiet"]
+    if background:
+        subprocess.Popen(cmd, cwd=cwd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                         stderr=subprocess.DEVNULL, start_new_session=True, close_fds=True)
+        return True
+    return run_git_command(cmd, cwd)[0] == 0
+
+
+def squash_hours() -> float:
+    """##; ZCO_AUTO_GIT_COMMIT_SQUASH_HOURS: hook 定期压缩的 tm: 提交年龄阈值（小时），0 或未设置时不压缩"""
+    try:
+        return max(float(os.environ.get("ZCO_AUTO_GIT_COMMIT_SQUASH_HOURS", 0)), 0.0)
+    except ValueError:
+        return 0.0
+
+
+def schedule_squash(git_dir: str, cwd: str) -> bool:
+    """
+    ##; hook 中调用: 距上次压缩超过 SQUASH_INTERVAL 秒时启动后台压缩 + git maintenance，立即返回
+    ##; 上次时间记在后台状态文件的 last_squash 中（状态锁内检查并更新，并发的 hook 只有一个会启动）
+    """
+    hours = squash_hours()
+    if not hours:
+        return False
+    paths = background_paths(git_dir)
+    os.makedirs(paths["dir"], exist_ok=True)
+    now = time.time()
+
+    def claim(state):
+        if now - state.get("last_squash", 0) < SQUASH_INTERVAL:
+            return False
+        state["last_squash"] = now
+        return True
+    if not _update_state(paths, claim):
+        return False
+    subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--squash", cwd, str(hours)],
+        stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        start_new_session=True, close_fds=True,
+    )
+    return True
+
+
+def squash_worker(cwd: str, hours: float):
+    """##; 后台压缩进程: 压缩后运行 git maintenance，结果追加到 autocommit.log"""
+    start = time.perf_counter()
+    try:
+        result = squash_tm_commits(cwd, hours)
+    except Exception as e:
+        result = {"status": "error", "detail": str(e)}
+    info = repo_info(cwd)
+    if info is None:
+        return
+    run_maintenance(info[1], background=False)
+    record = dict(time=datetime.now().strftime('%Y-%m-%d %H:%M:%S'), mode="squash", requests=1,
+                  ms=round((time.perf_counter() - start) * 1000, 1), status=result.get("status", ""),
+                  commit=result.get("new_head", ""),
+                  detail=result.get("detail") or f"{result.get('removed', 0)} commits in {len(result.get('runs', []))} runs")
+    append_log(background_paths(info[0])["log"], record)
+
+
+def append_log(path: str, record: dict):
+    """##; 以一行 JSON 追加到日志（O_APPEND 单次写，多进程不交错）"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    log_fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(log_fd, (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8"))
+    finally:
+        os.close(log_fd)
+
+
+def parse_mode(mode_str: str):
+    """
+    ##; 解析 ZCO_AUTO_GIT_COMMIT_MODE
+    ##; Returns:
+    ##;     (mode, snapshot): mode=0 表示禁用；快照模式时 mode=-1
+    """
+    if mode_str.strip().lower() in SNAPSHOT_MODES:
+        return -1, True
+    try:
+        return int(mode_str), False
     except ValueError:
         print(f"##; 无效的 ZCO_AUTO_GIT_COMMIT_MODE 值: {mode_str}，默认禁用", file=sys.stderr)
-        mode = 0
+        return 0, False
 
-    ##; mode=0 或未设置时禁用
-    if mode == 0:
-        sys.exit(0)
 
-    ##; 读取 stdin 输入的 Hook 事件数据
+def read_submodules(toplevel: str) -> list:
+    """##; 从 .gitmodules 读取已初始化（含 .git）的子模块路径，只读文件和 stat"""
     try:
-        input_data = json.load(sys.stdin)
-    except json.JSONDecodeError as e:
-        print(f"##; 解析输入数据失败: {e}", file=sys.stderr)
-        sys.exit(0)
+        with open(os.path.join(toplevel, ".gitmodules"), "r", encoding="utf-8") as f:
+            content = f.read()
+    except OSError:
+        return []
+    paths = re.findall(r"^\s*path\s*=\s*(.+?)\s*$", content, re.MULTILINE)
+    return [p for p in paths if os.path.exists(os.path.join(toplevel, p, ".git"))]
 
-    ##; 获取当前工作目录
-    cwd = input_data.get("cwd", ".")
 
-    ##; 检查是否是 git 仓库
-    if not is_git_repository(cwd):
+def submodule_jobs() -> int:
+    try:
+        return max(int(os.environ.get("ZCO_AUTO_GIT_COMMIT_JOBS", SUBMODULE_JOBS_DEFAULT)), 1)
+    except ValueError:
+        return SUBMODULE_JOBS_DEFAULT
+
+
+def commit_submodules(toplevel: str, mode: int, snapshot: bool, input_data: dict) -> list:
+    """
+    ##; 在有界线程池中对每个子模块执行同样的 status / 守卫 / 提交（或快照），记录每个仓库的耗时
+    ##; Returns:
+    ##;     [{path, ms, status, detail, commit}]，按耗时从高到低排序
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    def work(path):
+        start = time.perf_counter()
+        sub_dir = os.path.join(toplevel, path)
+        try:
+            result = _run_commit_repo(sub_dir, mode, snapshot, input_data, timed=False)
+        except Exception as e:
+            result = {"status": "error", "detail": str(e)}
+        if snapshot and not result.get("commit"):
+            ##; 工作区与 HEAD 相同且还没有快照时，子模块指向 HEAD
+            result["commit"] = resolve_revs(sub_dir, ["HEAD"])[0]
+        return dict(result, path=path, ms=round((time.perf_counter() - start) * 1000, 1))
+
+    paths = read_submodules(toplevel)
+    if not paths:
+        return []
+    with ThreadPoolExecutor(max_workers=min(submodule_jobs(), len(paths))) as pool:
+        results = list(pool.map(work, paths))
+    results.sort(key=lambda r: r["ms"], reverse=True)
+    for r in results:
+        print(f"##; [子模块] {r['path']}: {r['status']} {r['ms']:.1f}ms", file=sys.stderr)
+    return results
+
+
+def run_commit(cwd: str, mode: int, snapshot: bool, input_data: dict) -> dict:
+    """
+    ##; 按模式执行一次自动提交（同步 hook 和后台 worker 共用）
+    ##; ZCO_AUTO_GIT_COMMIT_SUBMODULES=1 时先并行处理子模块，再处理主仓库：
+    ##; 快照模式下主仓库快照中的子模块指向各自的快照；提交模式下子模块的新提交作为 gitlink 改动提交
+    ##; Returns:
+    ##;     {status: committed|snapshot|unchanged|skipped|busy|error, detail, commit, repos}
+    """
+    repos, gitlinks = [], None
+    start_lock_budget()
+    try:
+        if os.environ.get("ZCO_AUTO_GIT_COMMIT_SUBMODULES") == "1":
+            repos = commit_submodules(find_toplevel(cwd), mode, snapshot, input_data)
+            if snapshot:
+                gitlinks = {r["path"]: r["commit"] for r in repos if r.get("commit")}
+            metrics.mark("submodules")
+        result = _run_commit_repo(cwd, mode, snapshot, input_data, gitlinks=gitlinks)
+    finally:
+        lock_deadline["at"] = None
+    if repos:
+        result["repos"] = repos
+    if lock_stats["waits"] or lock_stats["timeouts"]:
+        result["lock"] = dict(lock_stats, wait_ms=round(lock_stats["wait_ms"], 1))
+    return result
+
+
+def _run_commit_repo(cwd: str, mode: int, snapshot: bool, input_data: dict, gitlinks: dict = None,
+                     timed: bool = True) -> dict:
+    """##; 对单个仓库执行提交或快照；timed=False 时不记录分阶段耗时（线程池中调用）"""
+    mark = metrics.mark if timed else (lambda phase: None)
+    if snapshot:
+        result = take_snapshot(cwd, snapshot_message(input_data), gitlinks)
+        mark("snapshot")
+        if result["status"] == "created":
+            print(f"##; 快照完成: {result['ref']} {result['commit'][:10]}", file=sys.stderr)
+            return {"status": "snapshot", "detail": result["ref"], "commit": result["commit"], "tree": result["tree"],
+                    "churn": result["churn"]}
+        if result["status"] == "error":
+            print(f"##; 快照失败: {result.get('error', '')}", file=sys.stderr)
+        return {"status": result["status"], "detail": result.get("error", result.get("ref", "")),
+                "commit": result.get("commit", ""), "tree": result.get("tree", "")}
+
+    ##; 一次 status 同时完成仓库检查和变更分类
+    accel = repo_accel(find_toplevel(cwd)) if mode >= 3 else {}
+    status = git_status(cwd, untracked=mode >= 3, untracked_cache=accel.get("untracked_cache", False))
+    if status is None:
         print("##; 当前目录不是 git 仓库，跳过自动提交", file=sys.stderr)
-        sys.exit(0)
+        return {"status": "skipped", "detail": "not a git repository"}
+    mark("status")
+    if mode >= 2:
+        apply_guard(cwd, status)
+        mark("guard")
 
     ##; 根据模式执行对应的提交
     committed_messages = []
+    churn = {"files": 0, "insertions": 0, "deletions": 0}
+
+    if status["unmerged"]:
+        print(f"##; 存在 {len(status['unmerged'])} 个冲突文件，跳过自动提交", file=sys.stderr)
+        return {"status": "skipped", "detail": f"{len(status['unmerged'])} unmerged"}
 
-    if mode >= 1 and has_staged_changes(cwd):
+    elif mode >= 1 and status["staged"]:
         ##; 模式 1: 只提交 staged
         print("##; [mode=1] 检测到已暂存(staged)的代码，正在自动创建备份提交...", file=sys.stderr)
-        if git_commit(cwd, "tm: auto commit staged"):
+        if git_commit(cwd, tm_message("staged", input_data), churn=churn):
             committed_messages.append("staged")
 
-    elif mode >= 2 and has_unstaged_changes(cwd):
-        ##; 模式 2: 增量提交 unstaged
+    elif mode >= 2 and status["unstaged"]:
+        ##; 模式 2: 增量提交 unstaged（pathspec 提交，省去 git add -u）
         print("##; [mode=2] 检测到未暂存(unstaged)的改动，正在自动添加并备份...", file=sys.stderr)
-        if git_add_updated(cwd):
-            if git_commit(cwd, "tm: auto commit unstaged"):
-                committed_messages.append("unstaged")
+        if git_commit(cwd, tm_message("unstaged", input_data), status["unstaged"], churn=churn):
+            committed_messages.append("unstaged")
 
-    elif mode >= 3 and has_untracked_files(cwd):
+    elif mode >= 3 and status["untracked"]:
         ##; 模式 3: 增量提交 untracked
         print("##; [mode=3] 检测到新的未追踪文件，正在自动添加并备份...", file=sys.stderr)
-        if git_add(cwd, "."):
-            if git_commit(cwd, "tm: auto commit untracked"):
+        if git_add(cwd, status["untracked"]):
+            if git_commit(cwd, tm_message("untracked", input_data), churn=churn):
                 committed_messages.append("untracked")
 
+    mark("commit")
+
     if committed_messages:
         print(f"##; 自动提交完成: {', '.join(committed_messages)}", file=sys.stderr)
-    else:
-        print("##; 没有需要提交的变更", file=sys.stderr)
+        return {"status": "committed", "detail": ", ".join(committed_messages), "churn": churn}
+    if lock_stats["timeouts"]:
+        return {"status": "lock_timeout", "detail": "index.lock"}
+    print("##; 没有需要提交的变更", file=sys.stderr)
+    return {"status": "unchanged", "detail": ""}
+
+
+def turn_target(cwd: str, result: dict):
+    """
+    ##; 本轮提示对应的 (commit, tree, flags)
+    ##; 快照模式取快照（工作区与 HEAD 相同且还没有快照时取 HEAD），提交模式取提交后的 HEAD
+    """
+    if result.get("commit") and result.get("tree"):
+        return result["commit"], result["tree"], TURN_FLAG_SNAPSHOT
+    if result.get("status") in ("error", "busy", "skipped"):
+        return "", "", 0
+    head, tree = resolve_revs(cwd, ["HEAD", "HEAD^{tree}"])
+    return head, tree, TURN_FLAG_HEAD if head else 0
+
+
+def record_turn(cwd: str, session_id: str, result: dict, turns: list = None):
+    """
+    ##; 把本次结果写入轮次索引: turns=[[session_id, 轮次]] 为后台模式预先追加的占位记录，
+    ##; 原地填写（合并的较早请求加 COALESCED 标志）；否则追加新的一轮
+    """
+    if not session_id and not turns:
+        return
+    commit, tree, flags = turn_target(cwd, result)
+    try:
+        hist_dir = hist_dir_for_root(Path(find_toplevel(cwd)))
+        if not turns:
+            turn = append_turn(hist_dir, session_id, commit, tree, flags)
+        else:
+            for i, (sid, turn) in enumerate(turns):
+                coalesced = TURN_FLAG_COALESCED if i < len(turns) - 1 else 0
+                update_turn(hist_dir, sid, turn, commit, tree, flags | coalesced if flags else 0)
+            ##; 合并请求的改动量记在最后一轮
+            session_id, turn = turns[-1]
+        if result.get("status") in ("snapshot", "committed", "unchanged"):
+            churn = result.get("churn") or {"files": 0, "insertions": 0, "deletions": 0}
+            append_churn(hist_dir, dict(session_id=session_id, turn=turn, commit=commit,
+                                        mode="snapshot" if flags & TURN_FLAG_SNAPSHOT else "commit", **churn))
+    except OSError as e:
+        print(f"##; 写入轮次索引失败: {e}", file=sys.stderr)
+
+
+def background_paths(git_dir: str) -> dict:
+    """##; 后台 worker 的状态文件、日志和锁（位于 <git-dir>/zco/）"""
+    state_dir = os.path.join(git_dir, "zco")
+    return {
+        "dir": state_dir,
+        "state": os.path.join(state_dir, "autocommit.state.json"),
+        "state_lock": os.path.join(state_dir, "autocommit.state.lock"),
+        "worker_lock": os.path.join(state_dir, "autocommit.worker.lock"),
+        "log": os.path.join(state_dir, BACKGROUND_LOG_NAME),
+    }
+
+
+def _update_state(paths: dict, update) -> dict:
+    """##; 在状态锁内读-改-写状态文件；update(state) 原地修改并可返回任意值"""
+    lock_fd = os.open(paths["state_lock"], os.O_WRONLY | os.O_CREAT, 0o644)
+    try:
+        if fcntl is not None:
+            fcntl.flock(lock_fd, fcntl.LOCK_EX)
+        try:
+            with open(paths["state"], "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            state = {}
+        result = update(state)
+        tmp = f"{paths['state']}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp, paths["state"])
+        return result
+    finally:
+        os.close(lock_fd)
+
+
+def _try_lock(path: str):
+    """##; 非阻塞获取文件锁，成功返回 fd，失败返回 None"""
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT, 0o644)
+    if fcntl is None:
+        return fd
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return fd
+    except OSError:
+        os.close(fd)
+        return None
+
+
+def enqueue_background(git_dir: str, request: dict) -> bool:
+    """
+    ##; 记录一次待处理请求并在没有 worker 时启动后台 worker，立即返回
+    ##; 多个请求合并为一个（保留最新的 cwd/模式/提示词，计数累加）
+    ##; Returns:
+    ##;     是否启动了新的 worker
+    """
+    paths = background_paths(git_dir)
+    os.makedirs(paths["dir"], exist_ok=True)
+
+    def add(state):
+        pending = state.get("pending") or {}
+        turns = pending.get("turns", []) + request.get("turns", [])
+        state["pending"] = dict(request, requests=pending.get("requests", 0) + 1, turns=turns)
+    _update_state(paths, add)
+
+    ##; worker 正在运行（持有锁）时由它处理合并后的请求
+    fd = _try_lock(paths["worker_lock"])
+    if fd is None:
+        return False
+    os.close(fd)
+    subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--worker", git_dir],
+        stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        start_new_session=True, close_fds=True,
+    )
+    return True
 
+
+def background_worker(git_dir: str, debounce: float = None):
+    """
+    ##; 后台 worker: 持有 worker 锁，循环处理合并后的请求直到没有待处理请求
+    ##; 两次提交至少间隔 debounce 秒，等待期间到达的请求合并到下一次
+    ##; 每次结果以一行 JSON 追加到 <git-dir>/zco/autocommit.log
+    """
+    if debounce is None:
+        debounce = background_debounce()
+    paths = background_paths(git_dir)
+    while True:
+        fd = _try_lock(paths["worker_lock"])
+        if fd is None:
+            return
+        try:
+            while True:
+                state = _update_state(paths, lambda st: dict(st))
+                if not state.get("pending"):
+                    break
+                wait = state.get("last_run", 0) + debounce - time.time()
+                if wait > 0:
+                    time.sleep(wait)
+                request = _update_state(paths, lambda st: st.pop("pending", None))
+                if not request:
+                    break
+                start = time.perf_counter()
+                mode, snapshot = parse_mode(str(request.get("mode", "0")))
+                try:
+                    result = run_commit(request.get("cwd", "."), mode, snapshot, request)
+                except Exception as e:
+                    result = {"status": "error", "detail": str(e)}
+                if request.get("turns"):
+                    record_turn(request.get("cwd", "."), "", result, request["turns"])
+                finished = time.time()
+                _update_state(paths, lambda st: st.update(last_run=finished))
+                record = dict(
+                    time=datetime.now().strftime('%Y-%m-%d %H:%M:%S'), mode=request.get("mode"),
+                    requests=request.get("requests", 1), session_id=request.get("session_id", ""),
+                    ms=round((time.perf_counter() - start) * 1000, 1), **result,
+                )
+                append_log(paths["log"], record)
+        finally:
+            os.close(fd)
+        ##; 释放锁之后再检查一次：避免 hook 在“处理完最后一个请求”和“释放锁”之间入队的请求被遗漏
+        state = _update_state(paths, lambda st: dict(st))
+        if not state.get("pending"):
+            return
+
+
+def background_debounce() -> float:
+    try:
+        return max(float(os.environ.get("ZCO_AUTO_GIT_COMMIT_DEBOUNCE", BACKGROUND_DEBOUNCE_DEFAULT)), 0.0)
+    except ValueError:
+        return float(BACKGROUND_DEBOUNCE_DEFAULT)
+
+
+def main():
+    """##; Hook 主入口"""
+    ##; 读取环境变量
+    mode_str = os.environ.get("ZCO_AUTO_GIT_COMMIT_MODE", "0")
+    mode, snapshot = parse_mode(mode_str)
+
+    ##; mode=0 或未设置时禁用
+    if mode == 0:
+        sys.exit(0)
+
+    metrics.start("git_auto_commit")
+
+    ##; 读取 stdin 输入的 Hook 事件数据
+    try:
+        input_data = json.load(sys.stdin)
+    except json.JSONDecodeError as e:
+        print(f"##; 解析输入数据失败: {e}", file=sys.stderr)
+        sys.exit(0)
+    metrics.context(input_data)
+    metrics.mark("stdin")
+
+    ##; 获取当前工作目录
+    cwd = input_data.get("cwd", ".")
+
+    if os.environ.get("ZCO_AUTO_GIT_COMMIT_BACKGROUND") == "1":
+        ##; 后台模式: 入队后立即返回，提交由 worker 去抖、合并后执行
+        returncode, git_dir, _ = run_git_command(["git", "rev-parse", "--absolute-git-dir"], cwd)
+        if returncode != 0:
+            sys.exit(0)
+        session_id = input_data.get("session_id", "")
+        request = {"cwd": cwd, "mode": mode_str, "session_id": session_id,
+                   "prompt": input_data.get("prompt", "")}
+        if session_id:
+            ##; 轮次按提示顺序在 hook 中分配，worker 提交后填写
+            try:
+                turn = append_turn(hist_dir_for_root(Path(find_toplevel(cwd))), session_id)
+                request["turns"] = [[session_id, turn]]
+            except OSError as e:
+                print(f"##; 写入轮次索引失败: {e}", file=sys.stderr)
+        enqueue_background(git_dir.strip(), request)
+        metrics.mark("enqueue")
+        schedule_squash(git_dir.strip(), cwd)
+        sys.exit(0)
+
+    result = run_commit(cwd, mode, snapshot, input_data)
+    record_turn(cwd, input_data.get("session_id", ""), result)
+    metrics.mark("turn")
+    if squash_hours():
+        info = repo_info(cwd)
+        if info is not None:
+            schedule_squash(info[0], cwd)
     sys.exit(0)
 
 
 if __name__ == "__main__":
-    main()
+    if len(sys.argv) == 3 and sys.argv[1] == "--worker":
+        background_worker(sys.argv[2])
+    elif len(sys.argv) == 4 and sys.argv[1] == "--squash":
+        squash_worker(sys.argv[2], float(sys.argv[3]))
+    else:
+        run_entry(main, "git_auto_commit")
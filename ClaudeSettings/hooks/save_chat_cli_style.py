@@ -10,40 +10,14 @@ Environment Variables:
 import json
 import os
 import sys
-import subprocess
 from datetime import datetime
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict
 
-
-def get_git_root(project_dir: Path = None) -> Path:
-    """##;获取 Git 仓库根目录"""
-    try:
-        if project_dir:
-            result = subprocess.run(
-                ['git', '-C', str(project_dir), 'rev-parse', '--show-toplevel'],
-                capture_output=True, text=True, check=True
-            )
-        else:
-            result = subprocess.run(
-                ['git', 'rev-parse', '--show-toplevel'],
-                capture_output=True, text=True, check=True
-            )
-        return Path(result.stdout.strip())
-    except (subprocess.CalledProcessError, FileNotFoundError):
-        return Path.cwd()
-
-
-def get_hist_dir(project_dir: Path = None) -> Path:
-    """##;获取历史记录目录"""
-    hist_dir_name = os.environ.get('ZCO_CHAT_SAVE_DIR', None)
-    git_root = get_git_root(project_dir)
-    if not hist_dir_name:
-        hist_dir = git_root / '_.zco_hist'
-    else:
-        hist_dir = os.path.abspath(os.path.join(str(git_root), hist_dir_name))
-    hist_dir.mkdir(exist_ok=True)
-    return hist_dir
+from zco_hist_common import (
+    atomic_open, get_hist_dir, hist_filename, metrics,
+    parse_transcript, record_session, run_entry,
+)
 
 
 class MessageFormatter:
@@ -212,24 +186,6 @@ def extract_tool_results(messages: List[Dict]) -> Dict[str, str]:
     return results
 
 
-def parse_transcript(transcript_path: str) -> List[Dict[str, Any]]:
-    """##;解析 transcript 文件"""
-    messages = []
-    try:
-        with open(transcript_path, 'r', encoding='utf-8') as f:
-            for line in f:
-                try:
-                    msg = json.loads(line.strip())
-                    if msg and msg.get("type") in ["user", "assistant"]:
-                        messages.append(msg)
-                except json.JSONDecodeError:
-                    continue
-    except Exception as e:
-        print(f"Error reading transcript: {e}", file=sys.stderr)
-
-    return messages
-
-
 def generate_cli_style_markdown(messages: List[Dict], session_id: str, model: str = None) -> str:
     """##;生成 CLI 风格的 Markdown"""
     lines = [
@@ -269,29 +225,36 @@ def generate_cli_style_markdown(messages: List[Dict], session_id: str, model: st
     return "\n".join(lines)
 
 
-def save_conversation(transcript_path: str, project_dir: str, session_id: str, model: str = None):
-    """##;保存对话"""
+def save_conversation(transcript_path: str, project_dir: str, session_id: str, model: str = None,
+                      now: datetime = None, hist_dir: Path = None):
+    """##;保存对话（now 用于文件名时间，默认当前时间；hist_dir 指定输出目录，默认按项目定位）"""
     try:
         messages = parse_transcript(transcript_path)
+        metrics.mark("parse")
         if not messages:
             print("No messages to save", file=sys.stderr)
             return
 
         ##;生成 CLI 样式的 Markdown
         markdown_content = generate_cli_style_markdown(messages, session_id, model)
+        metrics.mark("render")
 
-        ##;文件名
-        timestamp = datetime.now().strftime('%y%m%d_%H%M%S')
-        filename = f"log_{timestamp}_cli_style.md"
+        ##;文件名（带会话标识，并发 Stop 不会互相覆盖）
+        filename = hist_filename(session_id, "cli_style", now=now)
 
-        hist_dir = get_hist_dir(project_dir)
+        hist_dir = Path(hist_dir) if hist_dir else get_hist_dir(project_dir)
         output_file = hist_dir / filename
+        metrics.mark("git_root")
 
-        with open(output_file, 'w', encoding='utf-8') as f:
+        with atomic_open(output_file) as f:
             f.write(markdown_content)
 
         print(f"CLI style conversation saved to: {output_file}", file=sys.stderr)
 
+        ##;记录会话索引
+        record_session(hist_dir, session_id, transcript_path, project_dir)
+        metrics.mark("write")
+
     except Exception as e:
         print(f"Error: {e}", file=sys.stderr)
         import traceback
@@ -303,7 +266,10 @@ def main():
         if os.environ.get('ZCO_CHAT_SAVE_CLI') != '1':
             sys.exit(0)
 
+        metrics.start("save_chat_cli_style")
         input_data = json.load(sys.stdin)
+        metrics.context(input_data)
+        metrics.mark("stdin")
         hook_event = input_data.get('hook_event_name', '')
 
         if hook_event == 'Stop':
@@ -323,4 +289,4 @@ def main():
 
 
 if __name__ == '__main__':
-    main()
+    run_entry(main, "save_chat_cli_style")
@@ -10,40 +10,13 @@ Environment Variables:
 import json
 import os
 import sys
-import subprocess
 from datetime import datetime
 from pathlib import Path
 
-
-def get_hist_dir(project_dir: Path = None) -> Path:
-    """获取历史记录目录"""
-    hist_dir_name = os.environ.get('ZCO_CHAT_SAVE_DIR', None)
-    git_root = get_git_root(project_dir)
-    if not hist_dir_name:
-        hist_dir = git_root / '_.zco_hist'
-    else:
-        hist_dir = os.path.abspath(os.path.join(str(git_root), hist_dir_name))
-    hist_dir.mkdir(exist_ok=True)
-    return hist_dir
-
-
-def get_git_root(project_dir: Path = None) -> Path:
-    """获取当前 Git 仓库根目录"""
-    try:
-        # 执行 git rev-parse --show-toplevel 命令
-        if project_dir:
-            result = subprocess.run(
-                ['git', '-C', str(project_dir), 'rev-parse', '--show-toplevel'],
-                capture_output=True, text=True, check=True
-            )
-        else:
-            result = subprocess.run(
-                ['git', 'rev-parse', '--show-toplevel'],
-                capture_output=True, text=True, check=True
-            )
-        return Path(result.stdout.strip())
-    except (subprocess.CalledProcessError, FileNotFoundError):
-        return Path.cwd()
+from zco_hist_common import (
+    atomic_open, get_hist_dir, hist_filename, iter_transcript,
+    metrics, record_session, run_entry,
+)
 
 
 def extract_text_from_message(msg: dict) -> str:
@@ -71,32 +44,26 @@ def extract_text_from_message(msg: dict) -> str:
     return ''
 
 
-def save_simple_conversation(transcript_path: str, project_dir: str, session_id: str):
-    """保存对话为简单的纯文本格式"""
+def save_simple_conversation(transcript_path: str, project_dir: str, session_id: str,
+                             now: datetime = None, hist_dir: Path = None):
+    """保存对话为简单的纯文本格式（now 用于文件名时间，默认当前时间；hist_dir 指定输出目录，默认按项目定位）"""
     try:
         # 解析 transcript
-        messages = []
-        with open(transcript_path, 'r', encoding='utf-8') as f:
-            for line in f:
-                try:
-                    msg = json.loads(line.strip())
-                    if msg.get('type') in ['user', 'assistant']:
-                        messages.append(msg)
-                except BaseException:
-                    continue
+        messages = list(iter_transcript(transcript_path))
+        metrics.mark("parse")
 
         if not messages:
             print("No messages to save", file=sys.stderr)
             return
 
-        # 生成文件名
-        timestamp = datetime.now().strftime('%y%m%d_%H%M%S')
-        filename = f"log_{timestamp}_plain.md"
-        hist_dir = get_hist_dir(project_dir)
+        # 生成文件名（带会话标识，并发 Stop 不会互相覆盖）
+        filename = hist_filename(session_id, "plain", now=now)
+        hist_dir = Path(hist_dir) if hist_dir else get_hist_dir(project_dir)
         output_file = hist_dir / filename
+        metrics.mark("git_root")
 
-        # 生成简单的 Markdown
-        with open(output_file, 'w', encoding='utf-8') as f:
+        # 生成简单的 Markdown（写临时文件后原子替换）
+        with atomic_open(output_file) as f:
             f.write(f"# AI Code Conversation\n\n")
             f.write(f"**Time**: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
             f.write(f"**Session ID**: {session_id}\n\n")
@@ -118,6 +85,11 @@ def save_simple_conversation(transcript_path: str, project_dir: str, session_id:
 
         print(f"Simple conversation saved to: {output_file}", file=sys.stderr)
 
+        # 记录会话索引
+        record_session(hist_dir, session_id, transcript_path, project_dir)
+        ##; 纯文本版边渲染边写入，合并计入 write
+        metrics.mark("write")
+
     except Exception as e:
         print(f"Error: {e}", file=sys.stderr)
         import traceback
@@ -131,7 +103,10 @@ def main():
             # Silently exit if not enabled
             sys.exit(0)
 
+        metrics.start("save_chat_plain")
         input_data = json.load(sys.stdin)
+        metrics.context(input_data)
+        metrics.mark("stdin")
         hook_event = input_data.get('hook_event_name', '')
 
         if hook_event == 'Stop':
@@ -149,4 +124,4 @@ def main():
 
 
 if __name__ == '__main__':
-    main()
+    run_entry(main, "save_chat_plain")
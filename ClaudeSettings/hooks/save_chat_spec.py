@@ -11,22 +11,14 @@ import json
 import os
 import sys
 import re
-import subprocess
 from datetime import datetime
 from pathlib import Path
 from typing import List, Dict, Any, Set
 
-
-def get_hist_dir(project_dir: Path = None) -> Path:
-    """获取历史记录目录"""
-    hist_dir_name = os.environ.get('ZCO_CHAT_SAVE_DIR', None)
-    git_root = get_git_root(project_dir)
-    if not hist_dir_name:
-        hist_dir = git_root / '_.zco_hist'
-    else:
-        hist_dir = os.path.abspath(os.path.join(str(git_root), hist_dir_name))
-    hist_dir.mkdir(exist_ok=True)
-    return hist_dir
+from zco_hist_common import (
+    atomic_open, get_hist_dir, hist_filename, metrics,
+    parse_transcript, record_session, run_entry,
+)
 
 
 def extract_keywords(text: str, max_keywords: int = 3) -> str:
@@ -53,25 +45,6 @@ def extract_keywords(text: str, max_keywords: int = 3) -> str:
     return '_'.join(keywords[:max_keywords])
 
 
-def get_git_root(project_dir: Path = None) -> Path:
-    """获取当前 Git 仓库根目录"""
-    try:
-        # 执行 git rev-parse --show-toplevel 命令
-        if project_dir:
-            result = subprocess.run(
-                ['git', '-C', str(project_dir), 'rev-parse', '--show-toplevel'],
-                capture_output=True, text=True, check=True
-            )
-        else:
-            result = subprocess.run(
-                ['git', 'rev-parse', '--show-toplevel'],
-                capture_output=True, text=True, check=True
-            )
-        return Path(result.stdout.strip())
-    except (subprocess.CalledProcessError, FileNotFoundError):
-        return Path.cwd()
-
-
 def format_message_content(msg_data: Any) -> str:
     """格式化消息内容（支持 AI Code 格式）"""
     # AI Code 格式：外层 message 对象包含 role 和 content
@@ -214,27 +187,6 @@ def extract_references(tool_calls: List[Dict], tool_results: Dict) -> Set[str]:
     return references
 
 
-def parse_transcript(transcript_path: str) -> List[Dict[str, Any]]:
-    """解析 AI Code 的会话文件（JSONL 格式）"""
-    messages = []
-
-    try:
-        with open(transcript_path, 'r', encoding='utf-8') as f:
-            for line in f:
-                try:
-                    msg = json.loads(line.strip())
-                    # 只保留 user 和 assistant 类型的消息
-                    if msg and msg.get('type') in ['user', 'assistant']:
-                        messages.append(msg)
-                except json.JSONDecodeError:
-                    continue
-    except Exception as e:
-        print(f"Error reading transcript: {e}", file=sys.stderr)
-        return []
-
-    return messages
-
-
 def generate_markdown(messages: List[Dict[str, Any]],
                       tool_calls: List[Dict],
                       references: Set[str],
@@ -305,7 +257,7 @@ def save_resources(references: Set[str], output_dir: Path, base_filename: str):
     resources_file = output_dir / f"{base_filename}_resources.txt"
 
     try:
-        with open(resources_file, 'w', encoding='utf-8') as f:
+        with atomic_open(resources_file) as f:
             f.write(f"# 参考资源\n")
             f.write(f"# 生成时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
             f.write(f"# 对话文件: {base_filename}.md\n\n")
@@ -318,11 +270,13 @@ def save_resources(references: Set[str], output_dir: Path, base_filename: str):
         print(f"Error saving resources: {e}", file=sys.stderr)
 
 
-def save_conversation(transcript_path: str, project_dir: str, session_id: str):
-    """保存对话到 Markdown 文件（增强版）"""
+def save_conversation(transcript_path: str, project_dir: str, session_id: str,
+                      now: datetime = None, hist_dir: Path = None):
+    """保存对话到 Markdown 文件（增强版，now 用于文件名时间，默认当前时间；hist_dir 指定输出目录，默认按项目定位）"""
     try:
         # 解析会话文件
         messages = parse_transcript(transcript_path)
+        metrics.mark("parse")
         if not messages:
             print("No messages to save", file=sys.stderr)
             return
@@ -343,20 +297,23 @@ def save_conversation(transcript_path: str, project_dir: str, session_id: str):
         # 提取关键词
         # keywords = extract_keywords(first_user_msg)
 
-        # 生成文件名: YYmmddHH_{关键词}
-        timestamp = datetime.now().strftime('%y%m%d_%H%M%S')
-        base_filename = f"log_{timestamp}_spec"
+        metrics.mark("render")
+
+        # 生成文件名: log_<时间>_<会话8位>_spec（并发 Stop 不会互相覆盖）
+        base_filename = hist_filename(session_id, "spec", ext="", now=now)
         filename = f"{base_filename}.md"
 
         # 使用环境变量指定的目录，默认 _.zco_hist
-        hist_dir = get_hist_dir(project_dir)
+        hist_dir = Path(hist_dir) if hist_dir else get_hist_dir(project_dir)
+        metrics.mark("git_root")
 
         # 生成 Markdown 内容
         markdown_content = generate_markdown(messages, tool_calls, references, session_id)
+        metrics.mark("render")
 
         # 保存主文件
         output_file = hist_dir / filename
-        with open(output_file, 'w', encoding='utf-8') as f:
+        with atomic_open(output_file) as f:
             f.write(markdown_content)
 
         print(f"Conversation saved to: {output_file}", file=sys.stderr)
@@ -364,6 +321,10 @@ def save_conversation(transcript_path: str, project_dir: str, session_id: str):
         # 保存参考资源列表
         save_resources(references, hist_dir, base_filename)
 
+        # 记录会话索引，供 zco-hist-smy --source jsonl 直接读取原始 transcript
+        record_session(hist_dir, session_id, transcript_path, project_dir)
+        metrics.mark("write")
+
     except Exception as e:
         print(f"Error saving conversation: {e}", file=sys.stderr)
         import traceback
@@ -378,7 +339,10 @@ def main():
             # Silently exit if not enabled
             sys.exit(0)
 
+        metrics.start("save_chat_spec")
         input_data = json.load(sys.stdin)
+        metrics.context(input_data)
+        metrics.mark("stdin")
         hook_event = input_data.get('hook_event_name', '')
 
         if hook_event == 'Stop':
@@ -401,4 +365,4 @@ def main():
 
 
 if __name__ == '__main__':
-    main()
+    run_entry(main, "save_chat_spec")
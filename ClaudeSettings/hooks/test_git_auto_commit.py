@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+"""
+Unit tests for git_auto_commit.py
+
+Tests:
+1. porcelain v2 -z parsing: ordinary, renamed, unmerged and untracked entries
+2. mode 2/3 from a subdirectory commit exactly the status paths (spaces, glob characters, deletions)
+3. snapshot mode records the work tree on refs/zco/snapshots/<branch> without touching index or HEAD;
+   a held snapshot.lock yields busy, or waits when asked to
+4. background mode returns at once and coalesces rapid prompts into debounced snapshots
+5. size/binary/.claudeignore guard keeps large, binary and ignored paths out of mode 3 commits and snapshots
+6. submodules are snapshotted in parallel and the superproject snapshot points at their snapshots
+7. index.lock contention is retried with backoff within one budget shared by the whole run, then given up cleanly
+8. old unpushed tm: commits are squashed per session, pushed history and the final tree are untouched
+9. each prompt with a session id records its snapshot / HEAD in the turn index
+10. with core.untrackedCache the hook uses -unormal and expands new directories, honouring .gitignore
+11. shortstat parsing, and per-turn churn (files/insertions/deletions) appended for snapshot and commit modes
+"""
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+
+HOOKS_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(HOOKS_DIR))
+
+from zco_hist_common import TURN_FLAG_HEAD, TURN_FLAG_SNAPSHOT, iter_churn, read_turn  # noqa: E402
+from git_auto_commit import (  # noqa: E402
+    compile_ignore_rules, git_commit, is_ignored, lock_deadline, lock_stats, parse_porcelain_v2, parse_shortstat,
+    repo_accel, squash_tm_commits, start_lock_budget,
+    take_snapshot, tm_message,
+)
+
+
+def git(repo: Path, *args: str) -> str:
+    return subprocess.run(["git", "-C", str(repo)] + list(args), check=True,
+                          capture_output=True, text=True).stdout
+
+
+class TestGitAutoCommit(unittest.TestCase):
+    """Test suite for the auto-commit hook"""
+
+    def setUp(self):
+        """Create a temporary repository with one commit"""
+        self.test_dir = Path(tempfile.mkdtemp())
+        self.repo = self.test_dir / "repo"
+        (self.repo / "sub").mkdir(parents=True)
+        git(self.repo, "init", "-q")
+        git(self.repo, "config", "user.email", "test@localhost")
+        git(self.repo, "config", "user.name", "test")
+        for name in ("a[1]*.txt", "sub/b.txt", "del.txt", "old.txt"):
+            (self.repo / name).write_text(name + "\n", encoding="utf-8")
+        git(self.repo, "add", "-A")
+        git(self.repo, "commit", "-q", "-m", "init")
+
+    def tearDown(self):
+        """Clean up temporary files"""
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def run_hook(self, mode, cwd: Path, session_id: str = "", **env) -> subprocess.CompletedProcess:
+        payload = json.dumps({"hook_event_name": "UserPromptSubmit", "cwd": str(cwd), "session_id": session_id})
+        return subprocess.run([sys.executable, str(HOOKS_DIR / "git_auto_commit.py")], input=payload, text=True,
+                              capture_output=True, env=dict(os.environ, ZCO_AUTO_GIT_COMMIT_MODE=str(mode), **env))
+
+    def test_01_parse_porcelain_v2(self):
+        git(self.repo, "mv", "old.txt", "new name.txt")
+        (self.repo / "sub/b.txt").write_text("changed\n", encoding="utf-8")
+        (self.repo / "sub/untracked.txt").write_text("u\n", encoding="utf-8")
+        out = git(self.repo, "status", "--porcelain=v2", "-z", "--untracked-files=all")
+        status = parse_porcelain_v2(out)
+        self.assertEqual(status["staged"], ["new name.txt"])
+        self.assertEqual(status["unstaged"], ["sub/b.txt"])
+        self.assertEqual(status["untracked"], ["sub/untracked.txt"])
+
+        unmerged = ("u UU N... 100644 100644 100644 100644 " + " ".join(["0" * 40] * 3) + " conflict file.txt\0")
+        self.assertEqual(parse_porcelain_v2(unmerged)["unmerged"], ["conflict file.txt"])
+
+    def test_02_commit_status_paths_from_subdir(self):
+        (self.repo / "a[1]*.txt").write_text("changed\n", encoding="utf-8")
+        (self.repo / "del.txt").unlink()
+        ##; 通配符路径不能匹配到其它文件
+        (self.repo / "a1x.txt").write_text("untracked\n", encoding="utf-8")
+
+        self.assertEqual(self.run_hook(2, self.repo / "sub").returncode, 0)
+        changed = git(self.repo, "show", "--name-only", "--format=", "HEAD").split()
+        self.assertEqual(sorted(changed), ["a[1]*.txt", "del.txt"])
+        self.assertEqual(git(self.repo, "status", "--porcelain"), "?? a1x.txt\n")
+
+        self.assertEqual(self.run_hook(3, self.repo / "sub").returncode, 0)
+        self.assertEqual(git(self.repo, "log", "-1", "--format=%s"), "tm: auto commit untracked\n")
+        self.assertEqual(git(self.repo, "status", "--porcelain"), "")
+
+    def test_03_snapshot_mode(self):
+        head = git(self.repo, "rev-parse", "HEAD")
+        (self.repo / "sub/b.txt").write_text("changed\n", encoding="utf-8")
+        (self.repo / "staged.txt").write_text("s\n", encoding="utf-8")
+        git(self.repo, "add", "staged.txt")
+        (self.repo / "untracked.txt").write_text("u\n", encoding="utf-8")
+        status_before = git(self.repo, "status", "--porcelain")
+
+        self.assertEqual(self.run_hook("snapshot", self.repo / "sub").returncode, 0)
+        ref = "refs/zco/snapshots/" + git(self.repo, "symbolic-ref", "--short", "HEAD").strip()
+        files = git(self.repo, "ls-tree", "-r", "--name-only", ref).split("\n")
+        self.assertIn("untracked.txt", files)
+        self.assertEqual(git(self.repo, "show", f"{ref}:sub/b.txt"), "changed\n")
+        ##; 用户的 index / HEAD / 工作区状态不变
+        self.assertEqual(git(self.repo, "rev-parse", "HEAD"), head)
+        self.assertEqual(git(self.repo, "status", "--porcelain"), status_before)
+
+        ##; 工作区没有变化时不产生新快照
+        first = git(self.repo, "rev-parse", ref)
+        self.assertEqual(take_snapshot(str(self.repo))["status"], "unchanged")
+        (self.repo / "untracked.txt").write_text("u2\n", encoding="utf-8")
+        result = take_snapshot(str(self.repo), "prompt: again")
+        self.assertEqual(result["status"], "created")
+        self.assertEqual(git(self.repo, "rev-parse", f"{ref}~1"), first)
+
+        ##; hook 持有 snapshot.lock 时: 不等待立即返回 busy，wait 期间锁释放则正常拍快照
+        import fcntl
+        fd = os.open(str(self.repo / ".git/zco/snapshot.lock"), os.O_WRONLY)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        self.assertEqual(take_snapshot(str(self.repo), wait=0.2)["status"], "busy")
+        threading.Timer(0.2, os.close, [fd]).start()
+        self.assertEqual(take_snapshot(str(self.repo), wait=5)["status"], "unchanged")
+
+    def test_04_background_coalesce(self):
+        env = dict(ZCO_AUTO_GIT_COMMIT_BACKGROUND="1", ZCO_AUTO_GIT_COMMIT_DEBOUNCE="1")
+        for i in range(4):
+            (self.repo / "sub/b.txt").write_text(f"{i}\n", encoding="utf-8")
+            self.assertEqual(self.run_hook("snapshot", self.repo, **env).returncode, 0)
+
+        log_file = self.repo / ".git" / "zco" / "autocommit.log"
+        deadline = time.time() + 15
+        records = []
+        while time.time() < deadline:
+            if log_file.exists():
+                records = [json.loads(line) for line in log_file.read_text(encoding="utf-8").splitlines()]
+                if sum(r["requests"] for r in records) == 4:
+                    break
+            time.sleep(0.2)
+        self.assertEqual(sum(r["requests"] for r in records), 4)
+        self.assertLess(len(records), 4)
+        self.assertTrue(all(r["status"] == "snapshot" for r in records))
+        ref = "refs/zco/snapshots/" + git(self.repo, "symbolic-ref", "--short", "HEAD").strip()
+        self.assertEqual(git(self.repo, "show", f"{ref}:sub/b.txt"), "3\n")
+
+    def test_05_guard(self):
+        rules = compile_ignore_rules(["**/_.*/", "/build/", "*.log", "!keep.log", "data/**/*.csv"])
+        self.assertTrue(is_ignored(rules, "sub/_.cache/x.txt"))
+        self.assertTrue(is_ignored(rules, "build/out.txt"))
+        self.assertFalse(is_ignored(rules, "src/build/out.txt"))
+        self.assertFalse(is_ignored(rules, "keep.log"))
+        self.assertTrue(is_ignored(rules, "data/a/b.csv"))
+
+        (self.repo / ".claudeignore").write_text("/build/\n", encoding="utf-8")
+        (self.repo / "build").mkdir()
+        (self.repo / "build/out.txt").write_text("o\n", encoding="utf-8")
+        (self.repo / "big.txt").write_bytes(b"x" * 4096)
+        (self.repo / "image.png").write_bytes(b"\x89PNG")
+        (self.repo / "small.txt").write_text("s\n", encoding="utf-8")
+
+        proc = self.run_hook(3, self.repo, ZCO_AUTO_GIT_COMMIT_MAX_MB="0.001")
+        self.assertEqual(proc.returncode, 0)
+        self.assertIn("big.txt", proc.stderr)
+        committed = git(self.repo, "show", "--name-only", "--format=", "HEAD").split()
+        self.assertEqual(sorted(committed), [".claudeignore", "small.txt"])
+
+        ##; 快照模式同样守卫: 被跳过的文件不进入快照，已在快照中的被移除
+        git(self.repo, "reset", "-q", "HEAD~1")
+        proc = self.run_hook("snapshot", self.repo, ZCO_AUTO_GIT_COMMIT_MAX_MB="0.001")
+        self.assertEqual(proc.returncode, 0)
+        self.assertIn("big.txt", proc.stderr)
+        ref = "refs/zco/snapshots/" + git(self.repo, "symbolic-ref", "--short", "HEAD").strip()
+        files = set(git(self.repo, "ls-tree", "-r", "--name-only", ref).split())
+        self.assertTrue({".claudeignore", "small.txt", "sub/b.txt"} <= files)
+        self.assertFalse({"big.txt", "image.png", "build/out.txt"} & files)
+
+        (self.repo / "small.txt").write_bytes(b"y" * 4096)
+        self.assertEqual(self.run_hook("snapshot", self.repo, ZCO_AUTO_GIT_COMMIT_MAX_MB="0.001").returncode, 0)
+        self.assertNotIn("small.txt", git(self.repo, "ls-tree", "-r", "--name-only", ref).split())
+
+    def test_06_submodules(self):
+        sub = self.test_dir / "sub_origin"
+        sub.mkdir()
+        git(sub, "init", "-q")
+        git(sub, "config", "user.email", "test@localhost")
+        git(sub, "config", "user.name", "test")
+        (sub / "f.txt").write_text("f\n", encoding="utf-8")
+        git(sub, "add", "f.txt")
+        git(sub, "commit", "-q", "-m", "init")
+        git(self.repo, "-c", "protocol.file.allow=always", "submodule", "add", "-q", str(sub), "lib/sub")
+        git(self.repo, "commit", "-q", "-m", "add submodule")
+        (self.repo / "lib/sub/f.txt").write_text("changed\n", encoding="utf-8")
+
+        ##; 克隆出的子模块没有 user.name/user.email 配置
+        identity = dict(GIT_AUTHOR_NAME="test", GIT_AUTHOR_EMAIL="test@localhost",
+                        GIT_COMMITTER_NAME="test", GIT_COMMITTER_EMAIL="test@localhost")
+        proc = self.run_hook("snapshot", self.repo, ZCO_AUTO_GIT_COMMIT_SUBMODULES="1", **identity)
+        self.assertEqual(proc.returncode, 0)
+        self.assertRegex(proc.stderr, r"\[子模块\] lib/sub: snapshot [0-9.]+ms")
+        branch = git(self.repo / "lib/sub", "symbolic-ref", "--short", "HEAD").strip()
+        sub_snapshot = git(self.repo / "lib/sub", "rev-parse", f"refs/zco/snapshots/{branch}").strip()
+        top_ref = "refs/zco/snapshots/" + git(self.repo, "symbolic-ref", "--short", "HEAD").strip()
+        gitlink = git(self.repo, "ls-tree", top_ref, "lib/sub").split()
+        self.assertEqual(gitlink[:3], ["160000", "commit", sub_snapshot])
+
+    def test_07_index_lock_backoff(self):
+        lock = self.repo / ".git" / "index.lock"
+        (self.repo / "sub/b.txt").write_text("changed\n", encoding="utf-8")
+        lock_stats.update(waits=0, wait_ms=0.0, timeouts=0)
+
+        ##; 锁在预算内释放: 重试后提交成功
+        lock.touch()
+        threading.Timer(0.3, lock.unlink).start()
+        self.assertTrue(git_commit(str(self.repo), "tm: locked", ["sub/b.txt"]))
+        self.assertGreater(lock_stats["waits"], 0)
+        self.assertGreaterEqual(lock_stats["wait_ms"], 200)
+        self.assertEqual(lock_stats["timeouts"], 0)
+
+        ##; 锁一直被占用: 超过预算后放弃
+        (self.repo / "sub/b.txt").write_text("again\n", encoding="utf-8")
+        lock.touch()
+        old = os.environ.get("ZCO_AUTO_GIT_COMMIT_LOCK_BUDGET_MS")
+        os.environ["ZCO_AUTO_GIT_COMMIT_LOCK_BUDGET_MS"] = "200"
+        try:
+            start = time.monotonic()
+            self.assertFalse(git_commit(str(self.repo), "tm: locked", ["sub/b.txt"]))
+            self.assertLess(time.monotonic() - start, 1.5)
+        finally:
+            lock.unlink()
+            if old is None:
+                os.environ.pop("ZCO_AUTO_GIT_COMMIT_LOCK_BUDGET_MS")
+            else:
+                os.environ["ZCO_AUTO_GIT_COMMIT_LOCK_BUDGET_MS"] = old
+        self.assertEqual(lock_stats["timeouts"], 1)
+
+        ##; 一次运行内的多条加锁命令共用同一个截止时间，总等待不超过一个预算
+        lock.touch()
+        os.environ["ZCO_AUTO_GIT_COMMIT_LOCK_BUDGET_MS"] = "300"
+        try:
+            start_lock_budget()
+            start = time.monotonic()
+            for _ in range(3):
+                self.assertFalse(git_commit(str(self.repo), "tm: locked", ["sub/b.txt"]))
+            self.assertLess(time.monotonic() - start, 0.6)
+            self.assertEqual(lock_stats["timeouts"], 3)
+            self.assertLessEqual(lock_stats["wait_ms"], 320)
+        finally:
+            lock_deadline["at"] = None
+            lock.unlink()
+            if old is None:
+                os.environ.pop("ZCO_AUTO_GIT_COMMIT_LOCK_BUDGET_MS")
+            else:
+                os.environ["ZCO_AUTO_GIT_COMMIT_LOCK_BUDGET_MS"] = old
+
+    def test_08_squash_tm(self):
+        remote = self.test_dir / "remote.git"
+        git(self.test_dir, "init", "-q", "--bare", str(remote))
+        git(self.repo, "remote", "add", "origin", str(remote))
+
+        def commit(message, age_hours):
+            (self.repo / "sub/b.txt").write_text(f"{message} {age_hours}\n", encoding="utf-8")
+            date = f"{int(time.time() - age_hours * 3600)} +0000"
+            subprocess.run(["git", "-C", str(self.repo), "commit", "-q", "-a", "-m", message], check=True,
+                           env=dict(os.environ, GIT_AUTHOR_DATE=date, GIT_COMMITTER_DATE=date))
+
+        a = tm_message("unstaged", {"session_id": "sess-a"})
+        commit(a, 50)
+        commit(a, 49)
+        git(self.repo, "push", "-q", "origin", "HEAD")
+        pushed = git(self.repo, "rev-parse", "HEAD").strip()
+        commit(a, 48)
+        commit(a, 47)
+        commit(a, 46)
+        commit("user work", 45)
+        commit(tm_message("unstaged", {"session_id": "sess-b"}), 44)
+        commit(tm_message("unstaged", {"session_id": "sess-b"}), 43)
+        commit(tm_message("unstaged", {"session_id": "sess-b"}), 1)
+        commit(tm_message("unstaged", {"session_id": "sess-b"}), 0.5)
+        head_tree = git(self.repo, "rev-parse", "HEAD^{tree}")
+        old_head = git(self.repo, "rev-parse", "HEAD").strip()
+
+        self.assertEqual(squash_tm_commits(str(self.repo), 24, dry_run=True)["status"], "planned")
+        self.assertEqual(git(self.repo, "rev-parse", "HEAD").strip(), old_head)
+
+        result = squash_tm_commits(str(self.repo), 24)
+        self.assertEqual(result["status"], "squashed")
+        self.assertEqual(result["removed"], 3)
+        self.assertEqual([r["count"] for r in result["runs"]], [3, 2])
+        subjects = git(self.repo, "log", "--format=%s", f"{pushed}..HEAD").splitlines()
+        self.assertEqual(subjects, [
+            "tm: auto commit unstaged", "tm: auto commit unstaged",
+            "tm: auto commit squashed 2 commits (session sess-b)", "user work",
+            "tm: auto commit squashed 3 commits (session sess-a)",
+        ])
+        ##; 已推送的提交、最终 tree、工作区都不变; 原 HEAD 有备份
+        self.assertEqual(git(self.repo, "rev-parse", "HEAD~5").strip(), pushed)
+        self.assertEqual(git(self.repo, "rev-parse", "HEAD^{tree}"), head_tree)
+        self.assertEqual(git(self.repo, "status", "--porcelain"), "")
+        branch = git(self.repo, "symbolic-ref", "--short", "HEAD").strip()
+        self.assertEqual(git(self.repo, "rev-parse", f"refs/zco/squash-backup/{branch}").strip(), old_head)
+        self.assertEqual(squash_tm_commits(str(self.repo), 24)["status"], "unchanged")
+
+    def test_09_turn_index(self):
+        sid = "feedbeef-0000-4000-8000-000000000000"
+        hist_dir = self.repo / "_.zco_hist"
+        (self.repo / ".git/info/exclude").write_text("_.zco_hist\n", encoding="utf-8")
+        (self.repo / "sub/b.txt").write_text("turn 1\n", encoding="utf-8")
+        self.assertEqual(self.run_hook("snapshot", self.repo, sid).returncode, 0)
+        (self.repo / "sub/b.txt").write_text("turn 2\n", encoding="utf-8")
+        self.assertEqual(self.run_hook("snapshot", self.repo, sid).returncode, 0)
+
+        first, second = read_turn(hist_dir, sid, 1), read_turn(hist_dir, sid, 2)
+        self.assertEqual(first["flags"], TURN_FLAG_SNAPSHOT)
+        self.assertEqual(git(self.repo, "show", f"{first['tree']}:sub/b.txt"), "turn 1\n")
+        self.assertEqual(git(self.repo, "show", f"{second['commit']}:sub/b.txt"), "turn 2\n")
+
+        ##; 提交模式记录提交后的 HEAD
+        (self.repo / "sub/b.txt").write_text("turn 3\n", encoding="utf-8")
+        self.assertEqual(self.run_hook(2, self.repo, sid).returncode, 0)
+        third = read_turn(hist_dir, sid, 3)
+        self.assertEqual(third["flags"], TURN_FLAG_HEAD)
+        self.assertEqual(third["commit"], git(self.repo, "rev-parse", "HEAD").strip())
+        self.assertIn("Zco-Session: " + sid, git(self.repo, "log", "-1", "--format=%B"))
+
+    def test_10_untracked_cache(self):
+        self.assertEqual(repo_accel(str(self.repo)), {"untracked_cache": False, "fsmonitor": False})
+        git(self.repo, "config", "core.untrackedCache", "true")
+        self.assertTrue(repo_accel(str(self.repo))["untracked_cache"])
+
+        (self.repo / "new/deep").mkdir(parents=True)
+        (self.repo / "new/deep/x.txt").write_text("x\n", encoding="utf-8")
+        (self.repo / "new/skip.tmp").write_text("t\n", encoding="utf-8")
+        (self.repo / "new/.gitignore").write_text("*.tmp\n", encoding="utf-8")
+        (self.repo / "top.txt").write_text("t\n", encoding="utf-8")
+        self.assertEqual(self.run_hook(3, self.repo / "sub").returncode, 0)
+        committed = git(self.repo, "show", "--name-only", "--format=", "HEAD").split()
+        self.assertEqual(sorted(committed), ["new/.gitignore", "new/deep/x.txt", "top.txt"])
+
+    def test_11_turn_churn(self):
+        self.assertEqual(parse_shortstat(" 3 files changed, 10 insertions(+), 2 deletions(-)"),
+                         {"files": 3, "insertions": 10, "deletions": 2})
+        self.assertEqual(parse_shortstat(" 1 file changed, 1 deletion(-)"),
+                         {"files": 1, "insertions": 0, "deletions": 1})
+
+        sid = "c0ffee00-0000-4000-8000-000000000000"
+        hist_dir = self.repo / "_.zco_hist"
+        (self.repo / ".git/info/exclude").write_text("_.zco_hist\n", encoding="utf-8")
+        (self.repo / "sub/b.txt").write_text("one\ntwo\nthree\n", encoding="utf-8")
+        self.assertEqual(self.run_hook("snapshot", self.repo, sid).returncode, 0)
+        (self.repo / "sub/b.txt").write_text("one\n", encoding="utf-8")
+        (self.repo / "new.txt").write_text("x\n", encoding="utf-8")
+        self.assertEqual(self.run_hook(3, self.repo, sid).returncode, 0)
+        ##; 每轮只提交一类改动，新文件在下一轮提交；没有改动的轮次记为 0
+        self.assertEqual(self.run_hook(3, self.repo, sid).returncode, 0)
+        self.assertEqual(self.run_hook(3, self.repo, sid).returncode, 0)
+
+        records = list(iter_churn(hist_dir))
+        self.assertEqual([(r["turn"], r["mode"]) for r in records],
+                         [(1, "snapshot"), (2, "commit"), (3, "commit"), (4, "commit")])
+        self.assertEqual([(r["files"], r["insertions"], r["deletions"]) for r in records],
+                         [(1, 3, 1), (1, 1, 1), (1, 1, 0), (0, 0, 0)])
+        self.assertEqual(records[2]["commit"], git(self.repo, "rev-parse", "HEAD").strip())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""
+Unit tests for zco_hist_common.py
+
+Tests:
+1. Session-scoped file names
+2. Atomic write replaces the target and cleans up on error
+3. Hist dir creation through a dangling symlink
+4. Session index compaction keeps the last record per session
+5. 50 concurrent Stop events in one repo (stress)
+6. Hook metrics are a no-op when disabled and one JSON line when enabled
+7. ZCO_PROFILE capture writes .prof + Chrome trace and keeps the newest N;
+   without out_dir it resolves the hist dir after the entry runs (subdir cwd, first Stop)
+8. debug_hook ring capture stays size-bounded, samples first N per session (also under concurrency,
+   counts pruned on rotation), samples 1-in-N with an injected RNG and applies the field allowlist
+9. Turn index: fixed-width records, placeholder fill-in and O(1) lookup by turn;
+   read-only hist dir lookup honours ZCO_CHAT_SAVE_DIR
+"""
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+HOOKS_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(HOOKS_DIR))
+
+import debug_hook  # noqa: E402
+import zco_hist_common  # noqa: E402
+from zco_hist_common import (  # noqa: E402
+    CAPTURE_MAX_BYTES_DEFAULT, TURN_FLAG_HEAD, TURN_FLAG_SNAPSHOT, TURN_RECORD, HookMetrics, append_capture, append_turn, atomic_open,
+    claim_capture_slot, compact_sessions, ensure_dir, hist_dir_path, hist_filename, iter_captures, iter_turns,
+    load_sessions, read_turn, record_session, run_entry, select_fields, session_tag, turn_index_path, update_turn,
+)
+
+TRANSCRIPT_LINES = [
+    {"type": "user", "message": {"role": "user", "content": "hello"},
+     "timestamp": "2026-10-19T01:00:00.000Z"},
+    {"type": "assistant", "message": {"role": "assistant", "content": [
+        {"type": "text", "text": "reading"},
+        {"type": "tool_use", "id": "t1", "name": "Read", "input": {"file_path": "/a.py"}},
+    ]}, "timestamp": "2026-10-19T01:00:01.000Z"},
+    {"type": "user", "message": {"role": "user", "content": [
+        {"type": "tool_result", "tool_use_id": "t1", "content": "print(1)"},
+    ]}, "timestamp": "2026-10-19T01:00:02.000Z"},
+    {"type": "assistant", "message": {"role": "assistant", "content": [
+        {"type": "text", "text": "done"},
+    ]}, "timestamp": "2026-10-19T01:00:03.000Z"},
+]
+
+HOOKS = {
+    "save_chat_spec.py": "ZCO_CHAT_SAVE_SPEC",
+    "save_chat_plain.py": "ZCO_CHAT_SAVE_PLAIN",
+    "save_chat_cli_style.py": "ZCO_CHAT_SAVE_CLI",
+}
+
+
+class TestZcoHistCommon(unittest.TestCase):
+    """Test suite for the shared history helpers"""
+
+    def setUp(self):
+        """Create temporary test directory"""
+        self.test_dir = Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        """Clean up temporary files"""
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_01_session_scoped_names(self):
+        now = datetime(2026, 10, 19, 1, 2, 3)
+        a = hist_filename("0f1e2d3c-aaaa-bbbb-cccc-000000000000", "spec", now=now)
+        b = hist_filename("9a8b7c6d-aaaa-bbbb-cccc-000000000000", "spec", now=now)
+        self.assertEqual(a, "log_261019_010203_0f1e2d3c_spec.md")
+        self.assertNotEqual(a, b)
+        ##; 非 uuid 的 session_id 也得到稳定的 8 位十六进制标识
+        self.assertEqual(session_tag("{session_id}"), session_tag("{session_id}"))
+        self.assertRegex(session_tag("{session_id}"), r"^[0-9a-f]{8}$")
+
+    def test_02_atomic_open(self):
+        target = self.test_dir / "log.md"
+        target.write_text("old", encoding="utf-8")
+        with self.assertRaises(RuntimeError):
+            with atomic_open(target) as f:
+                f.write("partial")
+                raise RuntimeError("boom")
+        self.assertEqual(target.read_text(encoding="utf-8"), "old")
+        self.assertEqual(sorted(p.name for p in self.test_dir.iterdir()), ["log.md"])
+
+        with atomic_open(target) as f:
+            f.write("new")
+        self.assertEqual(target.read_text(encoding="utf-8"), "new")
+        self.assertEqual(sorted(p.name for p in self.test_dir.iterdir()), ["log.md"])
+
+    def test_03_ensure_dir_dangling_symlink(self):
+        home = self.test_dir / "home" / "proj.12345678"
+        link = self.test_dir / "_.zco_hist"
+        link.symlink_to(home)
+        ensure_dir(link)
+        ensure_dir(link)
+        self.assertTrue(home.is_dir())
+
+    def test_04_compact_sessions(self):
+        old_limit = zco_hist_common.SESSION_INDEX_COMPACT_BYTES
+        zco_hist_common.SESSION_INDEX_COMPACT_BYTES = 1024
+        try:
+            for i in range(40):
+                record_session(self.test_dir, f"s{i % 5}", f"/t/{i}.jsonl")
+        finally:
+            zco_hist_common.SESSION_INDEX_COMPACT_BYTES = old_limit
+        index = self.test_dir / zco_hist_common.SESSION_INDEX_NAME
+        self.assertLess(index.stat().st_size, 2048)
+        sessions = load_sessions(self.test_dir)
+        self.assertEqual(sorted(sessions), [f"s{i}" for i in range(5)])
+        self.assertEqual(sessions["s4"]["transcript_path"], "/t/39.jsonl")
+        self.assertFalse(compact_sessions(self.test_dir))
+
+    def test_05_concurrent_stop_events(self):
+        """50 sessions stop at the same time in one repo; every hook output must survive intact"""
+        repo = self.test_dir / "repo"
+        repo.mkdir()
+        subprocess.run(["git", "init", "-q", str(repo)], check=True)
+        transcript = self.test_dir / "t.jsonl"
+        transcript.write_text("\n".join(json.dumps(m) for m in TRANSCRIPT_LINES) + "\n", encoding="utf-8")
+
+        env = dict(os.environ)
+        env.pop("ZCO_CHAT_SAVE_DIR", None)
+        env.update({name: "1" for name in HOOKS.values()})
+        session_ids = [f"{i:08x}-0000-4000-8000-000000000000" for i in range(50)]
+
+        def fire(args):
+            hook, session_id = args
+            payload = json.dumps({
+                "hook_event_name": "Stop",
+                "session_id": session_id,
+                "transcript_path": str(transcript),
+                "cwd": str(repo),
+            })
+            return subprocess.run([sys.executable, str(HOOKS_DIR / hook)], input=payload,
+                                  capture_output=True, text=True, env=env, cwd=str(repo))
+
+        jobs = [(hook, sid) for sid in session_ids for hook in HOOKS]
+        with ThreadPoolExecutor(max_workers=len(jobs)) as pool:
+            results = list(pool.map(fire, jobs))
+        for r in results:
+            self.assertEqual(r.returncode, 0, r.stderr)
+
+        hist_dir = repo / "_.zco_hist"
+        names = sorted(p.name for p in hist_dir.iterdir())
+        self.assertFalse([n for n in names if n.endswith(".tmp")])
+        for kind in ("spec.md", "plain.md", "cli_style.md", "spec_resources.txt"):
+            files = [n for n in names if n.endswith("_" + kind)]
+            self.assertEqual(len(files), 50, kind)
+        for name in names:
+            if name.endswith("_plain.md"):
+                self.assertIn("*Generated at", (hist_dir / name).read_text(encoding="utf-8"))
+        self.assertEqual(sorted(load_sessions(hist_dir)), sorted(session_ids))
+
+    def test_06_hook_metrics(self):
+        metrics_file = self.test_dir / zco_hist_common.METRICS_FILE_NAME
+        old = os.environ.pop("ZCO_HOOK_METRICS", None)
+        try:
+            disabled = HookMetrics()
+            disabled.start("save_chat_spec")
+            disabled.mark("parse")
+            disabled.hist_dir = self.test_dir
+            disabled.flush()
+            self.assertFalse(metrics_file.exists())
+
+            os.environ["ZCO_HOOK_METRICS"] = "1"
+            enabled = HookMetrics()
+            enabled.start("save_chat_spec")
+            enabled.context({"hook_event_name": "Stop", "session_id": "s1", "cwd": str(self.test_dir)})
+            enabled.mark("stdin")
+            enabled.mark("parse")
+            enabled.mark("parse")
+            enabled.hist_dir = self.test_dir
+            enabled.flush()
+            enabled.flush()
+        finally:
+            os.environ.pop("ZCO_HOOK_METRICS", None)
+            if old is not None:
+                os.environ["ZCO_HOOK_METRICS"] = old
+
+        lines = metrics_file.read_text(encoding="utf-8").splitlines()
+        self.assertEqual(len(lines), 1)
+        record = json.loads(lines[0])
+        self.assertEqual((record["event"], record["hook"], record["session_id"]), ("Stop", "save_chat_spec", "s1"))
+        self.assertEqual(sorted(record["phases"]), ["parse", "stdin"])
+        self.assertGreaterEqual(record["total_ms"], sum(record["phases"].values()) - 0.01)
+
+    def test_07_profile_capture(self):
+        out_dir = self.test_dir / "profiles"
+
+        def work():
+            return sum(sorted(range(20000), key=lambda x: -x))
+
+        old = {k: os.environ.pop(k, None) for k in ("ZCO_PROFILE", "ZCO_PROFILE_KEEP")}
+        try:
+            self.assertEqual(run_entry(lambda: 42, "noop", out_dir=out_dir, read_payload=False), 42)
+            self.assertFalse(out_dir.exists())
+
+            os.environ.update(ZCO_PROFILE="cpu", ZCO_PROFILE_KEEP="2")
+            for i in range(3):
+                self.assertEqual(run_entry(work, f"bench{i}", out_dir=out_dir, read_payload=False),
+                                 sum(range(20000)))
+                os.utime(next(out_dir.glob(f"*bench{i}.prof")), (i + 1, i + 1))
+        finally:
+            for k, v in old.items():
+                os.environ.pop(k, None)
+                if v is not None:
+                    os.environ[k] = v
+
+        names = sorted(p.name for p in out_dir.iterdir())
+        self.assertEqual(len([n for n in names if n.endswith(".prof")]), 2)
+        self.assertFalse([n for n in names if "bench0" in n])
+        trace = json.loads(next(out_dir.glob("*bench2.trace.json")).read_text(encoding="utf-8"))
+        self.assertTrue(any("work" in e["name"] for e in trace["traceEvents"]))
+        self.assertTrue(all(e["ph"] == "X" and e["dur"] >= 0 for e in trace["traceEvents"]))
+
+        ##; 未指定 out_dir 时在 entry() 之后定位: 首次 Stop 新建的历史目录、子目录 cwd 均能保存；找不到时提示
+        repo = self.test_dir / "repo"
+        (repo / "sub").mkdir(parents=True)
+        subprocess.run(["git", "init", "-q", str(repo)], check=True)
+        script = ("import sys; sys.path.insert(0, %r); from pathlib import Path; import zco_hist_common as c; "
+                  "c.run_entry(lambda: c.get_hist_dir(Path(sys.argv[1])) if sys.argv[1] else None, 'hook')"
+                  % str(HOOKS_DIR))
+        env = dict(os.environ, ZCO_PROFILE="cpu")
+        env.pop("ZCO_CHAT_SAVE_DIR", None)
+
+        def hook(cwd, make_hist):
+            payload = json.dumps({"hook_event_name": "Stop", "session_id": "s", "cwd": str(cwd)})
+            return subprocess.run([sys.executable, "-c", script, str(cwd) if make_hist else ""], input=payload,
+                                  text=True, env=env, cwd=str(cwd), check=True, capture_output=True)
+
+        profiles = repo / "_.zco_hist" / "zco_profiles"
+        hook(repo / "sub", make_hist=False)
+        self.assertFalse(profiles.exists())
+        hook(repo / "sub", make_hist=True)
+        self.assertEqual(len(list(profiles.glob("*.prof"))), 1)
+        hook(repo / "sub", make_hist=False)
+        self.assertEqual(len(list(profiles.glob("*.prof"))), 2)
+        self.assertIn("ZCO_PROFILE", hook(self.test_dir, make_hist=False).stderr)
+
+    def test_08_capture_ring(self):
+        ##; 环形文件: 两段合计不超过上限，读取顺序为时间顺序，最新记录总在
+        for i in range(500):
+            append_capture(self.test_dir, "PreToolUse", {"ts": f"{i:05d}", "pad": "x" * 100}, max_bytes=8192)
+        files = list(self.test_dir.glob("hook_capture_PreToolUse.jsonl*"))
+        self.assertLessEqual(sum(p.stat().st_size for p in files if not p.name.endswith(".lock")), 8192 + 200)
+        seq = [r["ts"] for r in iter_captures(self.test_dir, "PreToolUse")]
+        self.assertEqual(seq, sorted(seq))
+        self.assertEqual(seq[-1], "00499")
+
+        ##; first:N 采样按 会话+事件 计数
+        self.assertEqual([claim_capture_slot(self.test_dir, "s1", "Stop", 2) for _ in range(3)],
+                         [True, True, False])
+        self.assertTrue(claim_capture_slot(self.test_dir, "s2", "Stop", 2))
+
+        ##; 并发占用名额不超过 N
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            claims = list(pool.map(lambda _: claim_capture_slot(self.test_dir, "s3", "Stop", 5), range(64)))
+        self.assertLessEqual(sum(claims), 5)
+
+        ##; 环形文件轮转时清理窗口之前的计数文件，窗口内的保留
+        counts = self.test_dir / "hook_capture_counts"
+        os.utime(counts / f"{session_tag('s1')}_Stop", (1, 1))
+        claim_capture_slot(self.test_dir, "s1", "PreToolUse", 2)
+        os.utime(counts / f"{session_tag('s1')}_PreToolUse", (1, 1))
+        append_capture(self.test_dir, "Stop", {"ts": "00000", "pad": "x" * 3000}, max_bytes=4096)
+        self.assertTrue((counts / f"{session_tag('s1')}_Stop").exists())
+        later = time.time() + 60
+        os.utime(counts / f"{session_tag('s2')}_Stop", (later, later))
+        append_capture(self.test_dir, "Stop", {"ts": "00001", "pad": "x" * 3000}, max_bytes=4096)
+        self.assertFalse((counts / f"{session_tag('s1')}_Stop").exists())
+        self.assertTrue((counts / f"{session_tag('s2')}_Stop").exists())
+        self.assertTrue((counts / f"{session_tag('s1')}_PreToolUse").exists())
+
+        ##; 字段白名单支持嵌套字段
+        data = {"session_id": "s", "tool_input": {"file_path": "/a", "content": "big"}, "prompt": "p"}
+        self.assertEqual(select_fields(data, ["session_id", "tool_input.file_path", "missing.x"]),
+                         {"session_id": "s", "tool_input": {"file_path": "/a"}})
+
+        ##; debug_hook ring 模式: 按白名单写入；1-in-N 采样不命中时不写文件（注入 rng 使结果确定）
+        repo = self.test_dir / "repo"
+        repo.mkdir()
+        subprocess.run(["git", "init", "-q", str(repo)], check=True)
+        env = dict(os.environ, ZCO_HOOK_CAPTURE="ring", ZCO_HOOK_CAPTURE_FIELDS="hook_event_name,tool_name",
+                   ZCO_HOOK_CAPTURE_SAMPLE="1")
+        input_data = {"hook_event_name": "PreToolUse", "session_id": "s", "cwd": str(repo),
+                      "tool_name": "Read", "tool_input": {"file_path": "/a"}}
+        subprocess.run([sys.executable, str(HOOKS_DIR / "debug_hook.py")], input=json.dumps(input_data),
+                       text=True, env=env, check=True, capture_output=True)
+        records = list(iter_captures(repo / "_.zco_hist"))
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0]["input"], {"hook_event_name": "PreToolUse", "tool_name": "Read"})
+
+        class FixedRng:
+            def __init__(self, value):
+                self.value = value
+
+            def randrange(self, n):
+                return self.value
+
+        config = dict(mode="ring", max_bytes=CAPTURE_MAX_BYTES_DEFAULT, every=1000, first=0, fields=[])
+        debug_hook.capture_ring(input_data, config, rng=FixedRng(1))
+        self.assertEqual(len(list(iter_captures(repo / "_.zco_hist"))), 1)
+        debug_hook.capture_ring(input_data, config, rng=FixedRng(0))
+        self.assertEqual(len(list(iter_captures(repo / "_.zco_hist"))), 2)
+        zco_hist_common.metrics.hist_dir = None
+        self.assertFalse((repo / "_.zco_hist" / "hook_debug_PreToolUse.json").exists())
+
+    def test_09_turn_index(self):
+        sid = "0123abcd-0000-4000-8000-000000000000"
+        sha1, sha256 = "ab" * 20, "cd" * 32
+        self.assertEqual(append_turn(self.test_dir, sid, sha1, "ef" * 20, TURN_FLAG_SNAPSHOT, ts=100), 1)
+        self.assertEqual(append_turn(self.test_dir, sid), 2)
+        self.assertEqual(append_turn(self.test_dir, sid, sha256, sha256, TURN_FLAG_HEAD), 3)
+        self.assertEqual(turn_index_path(self.test_dir, sid).stat().st_size, 3 * TURN_RECORD.size)
+
+        self.assertEqual(read_turn(self.test_dir, sid, 1),
+                         {"turn": 1, "time": 100, "flags": TURN_FLAG_SNAPSHOT, "commit": sha1, "tree": "ef" * 20})
+        self.assertEqual(read_turn(self.test_dir, sid, 2)["commit"], "")
+        self.assertEqual(read_turn(self.test_dir, sid, 3)["tree"], sha256)
+        self.assertIsNone(read_turn(self.test_dir, sid, 4))
+        self.assertIsNone(read_turn(self.test_dir, "other", 1))
+
+        ##; 占位记录原地填写，时间不变
+        placeholder_time = read_turn(self.test_dir, sid, 2)["time"]
+        self.assertTrue(update_turn(self.test_dir, sid, 2, sha1, sha1, TURN_FLAG_SNAPSHOT))
+        self.assertEqual(read_turn(self.test_dir, sid, 2)["commit"], sha1)
+        self.assertEqual(read_turn(self.test_dir, sid, 2)["time"], placeholder_time)
+        self.assertFalse(update_turn(self.test_dir, sid, 9, sha1, sha1, 0))
+
+        ##; 半条记录补齐后新记录仍然对齐
+        with open(turn_index_path(self.test_dir, sid), 'ab') as f:
+            f.write(b'\x01\x02')
+        self.assertEqual(append_turn(self.test_dir, sid, sha1, sha1, TURN_FLAG_HEAD), 5)
+        self.assertEqual([t["turn"] for t in iter_turns(self.test_dir, sid)], [1, 2, 3, 4, 5])
+        self.assertEqual(read_turn(self.test_dir, sid, 4)["commit"], "")
+
+        ##; 只读命令按 ZCO_CHAT_SAVE_DIR 定位历史目录，且不创建目录
+        self.assertEqual(hist_dir_path(self.test_dir), self.test_dir / "_.zco_hist")
+        os.environ["ZCO_CHAT_SAVE_DIR"] = "custom_hist"
+        try:
+            self.assertEqual(hist_dir_path(self.test_dir), self.test_dir / "custom_hist")
+        finally:
+            del os.environ["ZCO_CHAT_SAVE_DIR"]
+        self.assertFalse((self.test_dir / "custom_hist").exists())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,916 @@
+#!/usr/bin/env python3
+"""
+##; 对话历史 hooks 的公共函数
+##;
+##; - get_git_root / get_hist_dir: 定位项目与历史目录
+##; - iter_transcript / parse_transcript: 快速解析 Claude 会话 JSONL
+##; - scan_transcript: 只统计 tool_use 的轻量扫描（供 zco-hist-smy 使用）
+##; - record_session / load_sessions: 会话索引，记录 session_id 与 transcript 路径
+##; - hist_filename / atomic_open: 同一仓库多个会话并发 Stop 时的安全写入
+##; - metrics: hook 分阶段耗时（ZCO_HOOK_METRICS=1 时追加到 zco_hook_metrics.jsonl）
+##; - capture_config / append_capture / iter_captures: debug_hook 的环形采集文件（按事件分文件、限大小）
+##; - append_turn / update_turn / read_turn: 会话第 N 轮提示对应的快照（定长记录，按偏移 O(1) 查找）
+##; - append_churn / iter_churn: 自动提交记录的每轮改动量（文件数/新增/删除行数）
+##;
+##; 可选依赖: 安装了 orjson 时使用 orjson.loads，否则回退到标准库 json
+"""
+import hashlib
+import json
+import os
+import re
+import struct
+import subprocess
+import sys
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import orjson
+
+    _json_loads = orjson.loads
+    _JSON_ERRORS: Tuple = (orjson.JSONDecodeError, ValueError)
+except ImportError:  # pragma: no cover - 取决于运行环境
+    _json_loads = json.loads
+    _JSON_ERRORS = (json.JSONDecodeError, ValueError)
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows 没有 fcntl，跳过索引压缩
+    fcntl = None
+
+##; 会话索引文件（位于历史目录下，一行一个 JSON 记录）
+SESSION_INDEX_NAME = "zco_sessions.jsonl"
+##; hook 耗时记录文件（位于历史目录下，一行一个 JSON 记录）
+METRICS_FILE_NAME = "zco_hook_metrics.jsonl"
+##; debug_hook 环形采集文件: hook_capture_<event>.jsonl（当前段）+ .jsonl.1（上一段）
+CAPTURE_FILE_PREFIX = "hook_capture_"
+##; 每个事件的采集文件总大小上限（两段合计），可用 ZCO_HOOK_CAPTURE_MAX_KB 覆盖
+CAPTURE_MAX_BYTES_DEFAULT = 1024 * 1024
+##; first:N 采样的计数目录（每个 会话+事件 一个文件，文件大小即已采集条数）
+CAPTURE_COUNTS_DIR = "hook_capture_counts"
+##; 每轮改动量记录（位于历史目录下，一行一个 JSON 记录）
+CHURN_FILE_NAME = "zco_churn.jsonl"
+##; 轮次索引目录: zco_turns/<会话8位>.turns，第 N 轮（从 1 开始）在偏移 (N-1)*TURN_RECORD.size 处
+TURN_INDEX_DIR = "zco_turns"
+##; 轮次记录: 轮次、unix 秒、标志、oid 字节数、commit、tree（sha1 20 字节 / sha256 32 字节，补零）
+TURN_RECORD = struct.Struct("<IIBB2x32s32s4x")
+TURN_FLAG_SNAPSHOT = 1   ##; commit 是 refs/zco/snapshots 上的快照（含未追踪文件）
+TURN_FLAG_HEAD = 2       ##; commit 是当时的 HEAD（提交模式，或还没有快照）
+TURN_FLAG_COALESCED = 4  ##; 后台模式合并请求: 指向之后一轮提示时的快照
+##; 索引超过该大小时压缩（按 session_id 去重），压缩期间持有 fcntl 文件锁
+SESSION_INDEX_COMPACT_BYTES = 512 * 1024
+
+##; 只解析这些类型的消息，其余（summary/system 等）在 json 解析前就跳过
+MESSAGE_TYPES = ("user", "assistant")
+_TYPE_MARKERS = tuple(f'"type":"{t}"'.encode() for t in MESSAGE_TYPES) + tuple(
+    f'"type": "{t}"'.encode() for t in MESSAGE_TYPES
+)
+_TIMESTAMP_RE = re.compile(rb'"timestamp"\s*:\s*"([^"]+)"')
+
+
+def get_git_root(project_dir: Path = None) -> Path:
+    """获取当前 Git 仓库根目录"""
+    try:
+        if project_dir:
+            result = subprocess.run(
+                ['git', '-C', str(project_dir), 'rev-parse', '--show-toplevel'],
+                capture_output=True, text=True, check=True
+            )
+        else:
+            result = subprocess.run(
+                ['git', 'rev-parse', '--show-toplevel'],
+                capture_output=True, text=True, check=True
+            )
+        return Path(result.stdout.strip())
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        return Path.cwd()
+
+
+def get_hist_dir(project_dir: Path = None) -> Path:
+    """获取历史记录目录（ZCO_CHAT_SAVE_DIR 可指定相对 Git 根目录的路径）"""
+    return hist_dir_for_root(get_git_root(project_dir))
+
+
+def hist_dir_path(git_root: Path) -> Path:
+    """已知 Git 根目录时历史记录目录的路径（遵守 ZCO_CHAT_SAVE_DIR，不创建目录，供只读的命令使用）"""
+    hist_dir_name = os.environ.get('ZCO_CHAT_SAVE_DIR', None)
+    git_root = Path(git_root)
+    if not hist_dir_name:
+        return git_root / '_.zco_hist'
+    return Path(os.path.abspath(os.path.join(str(git_root), hist_dir_name)))
+
+
+def hist_dir_for_root(git_root: Path) -> Path:
+    """已知 Git 根目录时的历史记录目录（不启动 git 进程）"""
+    hist_dir = hist_dir_path(git_root)
+    ensure_dir(hist_dir)
+    metrics.hist_dir = hist_dir
+    return hist_dir
+
+
+def ensure_dir(path: Path):
+    """
+    ##; 创建目录，容忍并发创建
+    ##; _.zco_hist 是指向 ~/.claude/zco_hist/<name> 的软链接时，目标不存在则创建目标目录
+    """
+    try:
+        path.mkdir(parents=True, exist_ok=True)
+    except FileExistsError:
+        if path.is_symlink():
+            os.makedirs(os.path.realpath(path), exist_ok=True)
+        elif not path.is_dir():
+            raise
+
+
+def session_tag(session_id: str) -> str:
+    """会话标识（8 位十六进制），用于文件名；非 uuid 形式的 session_id 取其 md5"""
+    compact = (session_id or "").replace('-', '')[:8].lower()
+    if len(compact) == 8 and all(c in '0123456789abcdef' for c in compact):
+        return compact
+    return hashlib.md5((session_id or "").encode('utf-8')).hexdigest()[:8]
+
+
+def hist_filename(session_id: str, kind: str, ext: str = ".md", now: datetime = None) -> str:
+    """
+    ##; 历史文件名: log_<yymmdd_HHMMSS>_<会话8位>_<kind><ext>
+    ##; 同一秒内多个会话的 Stop 不会写到同一个文件
+    """
+    timestamp = (now or datetime.now()).strftime('%y%m%d_%H%M%S')
+    return f"log_{timestamp}_{session_tag(session_id)}_{kind}{ext}"
+
+
+@contextmanager
+def atomic_open(path: Path, encoding: str = 'utf-8'):
+    """
+    ##; 原子写入：先写同目录下的临时文件，成功后 os.replace 到目标路径
+    ##; 读者要么看到旧文件，要么看到完整的新文件；异常时删除临时文件
+    """
+    path = Path(path)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{os.urandom(4).hex()}.tmp")
+    f = open(tmp_path, 'w', encoding=encoding)
+    try:
+        yield f
+        f.close()
+        os.replace(tmp_path, path)
+    except BaseException:
+        f.close()
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def iter_transcript(transcript_path: str,
+                    types: Tuple[str, ...] = MESSAGE_TYPES) -> Iterator[Dict[str, Any]]:
+    """
+    ##; 逐行解析会话文件（JSONL），只产出指定 type 的消息
+    ##; 以二进制读取，先用字节匹配过滤掉无关行，再做 json 解析
+    """
+    markers = _TYPE_MARKERS if types == MESSAGE_TYPES else tuple(
+        m for t in types for m in (f'"type":"{t}"'.encode(), f'"type": "{t}"'.encode())
+    )
+    with open(transcript_path, 'rb') as f:
+        for line in f:
+            if not any(m in line for m in markers):
+                continue
+            try:
+                msg = _json_loads(line)
+            except _JSON_ERRORS:
+                continue
+            if isinstance(msg, dict) and msg.get('type') in types:
+                yield msg
+
+
+def parse_transcript(transcript_path: str) -> List[Dict[str, Any]]:
+    """解析 AI Code 的会话文件（JSONL 格式），只保留 user 和 assistant 消息"""
+    try:
+        return list(iter_transcript(transcript_path))
+    except Exception as e:
+        print(f"Error reading transcript: {e}", file=sys.stderr)
+        return []
+
+
+def _parse_timestamp(raw: bytes) -> Optional[datetime]:
+    """解析 transcript 中的 ISO 时间戳（转为本地时间，去掉时区）"""
+    try:
+        text = raw.decode().replace('Z', '+00:00')
+        return datetime.fromisoformat(text).astimezone().replace(tzinfo=None)
+    except ValueError:
+        return None
+
+
+def scan_transcript(transcript_path: str) -> Dict[str, Any]:
+    """
+    ##; 轻量扫描会话文件，精确统计 tool_use 块
+    ##; 只对包含 tool_use 的 assistant 行做 json 解析，时间戳直接从字节中提取
+    ##; Returns:
+    ##;     {tools: Counter, files: set, urls: set, prompts: int, first_time, last_time}
+    """
+    tools = Counter()
+    files = set()
+    urls = set()
+    prompts = 0
+    first_time = last_time = None
+
+    with open(transcript_path, 'rb') as f:
+        for line in f:
+            ts_match = _TIMESTAMP_RE.search(line)
+            if ts_match:
+                if first_time is None:
+                    first_time = ts_match.group(1)
+                last_time = ts_match.group(1)
+
+            if b'"tool_use"' not in line:
+                ##; 用户提问：user 消息且不是工具结果
+                if b'"type":"user"' in line and b'"tool_result"' not in line:
+                    prompts += 1
+                continue
+            try:
+                msg = _json_loads(line)
+            except _JSON_ERRORS:
+                continue
+            if not isinstance(msg, dict) or msg.get('type') != 'assistant':
+                continue
+            content = (msg.get('message') or {}).get('content')
+            if not isinstance(content, list):
+                continue
+            for item in content:
+                if not isinstance(item, dict) or item.get('type') != 'tool_use':
+                    continue
+                name = item.get('name', 'unknown')
+                tools[name] += 1
+                tool_input = item.get('input') or {}
+                if not isinstance(tool_input, dict):
+                    continue
+                file_path = tool_input.get('file_path') or tool_input.get('notebook_path')
+                if file_path:
+                    files.add(file_path)
+                url = tool_input.get('url')
+                if url:
+                    urls.add(url)
+
+    return {
+        "tools": tools,
+        "files": files,
+        "urls": urls,
+        "prompts": prompts,
+        "first_time": _parse_timestamp(first_time) if first_time else None,
+        "last_time": _parse_timestamp(last_time) if last_time else None,
+    }
+
+
+def record_session(hist_dir: Path, session_id: str, transcript_path: str, cwd: str = ""):
+    """
+    ##; 追加一条会话索引记录（session_id -> transcript_path）
+    ##; 单次 O_APPEND 写入一整行，多个 hook 并发追加不会交错，追加路径不加锁
+    ##; 索引超过 SESSION_INDEX_COMPACT_BYTES 时触发一次压缩
+    """
+    record = {
+        "session_id": session_id,
+        "transcript_path": str(transcript_path),
+        "cwd": str(cwd),
+        "time": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+    }
+    line = (json.dumps(record, ensure_ascii=False) + "\n").encode('utf-8')
+    fd = os.open(str(Path(hist_dir) / SESSION_INDEX_NAME), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, line)
+        size = os.fstat(fd).st_size
+    finally:
+        os.close(fd)
+    if size > SESSION_INDEX_COMPACT_BYTES:
+        compact_sessions(hist_dir)
+
+
+def compact_sessions(hist_dir: Path) -> bool:
+    """
+    ##; 压缩会话索引：按 session_id 去重后原子替换
+    ##; 只有压缩者之间用 fcntl 锁互斥（拿不到锁说明别人在压缩，直接返回）；
+    ##; 追加者不加锁，替换前后追加到旧文件的行会被补写到新文件。
+    ##; 极端情况下丢失的一行会在该会话下次 Stop 时重新写入。
+    ##; Returns:
+    ##;     是否执行了压缩
+    """
+    if fcntl is None:
+        return False
+    index_file = Path(hist_dir) / SESSION_INDEX_NAME
+    lock_fd = os.open(str(index_file) + '.lock', os.O_WRONLY | os.O_CREAT, 0o644)
+    try:
+        try:
+            fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return False
+        try:
+            old = open(index_file, 'rb')
+        except FileNotFoundError:
+            return False
+        with old:
+            ##; 加锁后再检查大小：别的压缩者可能刚完成
+            if os.fstat(old.fileno()).st_size <= SESSION_INDEX_COMPACT_BYTES:
+                return False
+            data = old.read()
+            sessions: Dict[str, bytes] = {}
+            for line in data.splitlines(keepends=True):
+                try:
+                    record = _json_loads(line)
+                except _JSON_ERRORS:
+                    continue
+                if isinstance(record, dict) and record.get('session_id'):
+                    sessions.pop(record['session_id'], None)
+                    sessions[record['session_id']] = line if line.endswith(b'\n') else line + b'\n'
+            tmp_path = index_file.with_name(f".{index_file.name}.{os.getpid()}.tmp")
+            with open(tmp_path, 'wb') as f:
+                f.write(b''.join(sessions.values()))
+            os.replace(tmp_path, index_file)
+            ##; 补写读取之后追加到旧文件的行
+            tail = old.read()
+            if tail:
+                fd = os.open(str(index_file), os.O_WRONLY | os.O_APPEND)
+                try:
+                    os.write(fd, tail)
+                finally:
+                    os.close(fd)
+        return True
+    finally:
+        os.close(lock_fd)
+
+
+def load_sessions(hist_dir: Path) -> Dict[str, Dict[str, Any]]:
+    """
+    ##; 读取会话索引，按 session_id 去重（同一会话保留最后一条记录）
+    ##; Returns:
+    ##;     {session_id: record}
+    """
+    sessions: Dict[str, Dict[str, Any]] = {}
+    index_file = Path(hist_dir) / SESSION_INDEX_NAME
+    if not index_file.exists():
+        return sessions
+    with open(index_file, 'rb') as f:
+        for line in f:
+            try:
+                record = _json_loads(line)
+            except _JSON_ERRORS:
+                continue
+            if isinstance(record, dict) and record.get('session_id'):
+                sessions[record['session_id']] = record
+    return sessions
+
+
+def capture_config() -> Dict[str, Any]:
+    """
+    ##; 读取 debug_hook 的采集配置
+    ##;   ZCO_HOOK_CAPTURE=ring            环形采集（默认 snapshot: 每个事件覆盖写一个 hook_debug_<event>.json）
+    ##;   ZCO_HOOK_CAPTURE_MAX_KB=1024     每个事件采集文件的总大小上限
+    ##;   ZCO_HOOK_CAPTURE_SAMPLE=N        每 N 个事件随机采 1 个；first:N 表示每个会话每个事件只采前 N 个
+    ##;   ZCO_HOOK_CAPTURE_FIELDS=a,b.c    只保留这些字段（点号表示嵌套字段），默认全部
+    """
+    sample = (os.environ.get('ZCO_HOOK_CAPTURE_SAMPLE') or '1').strip().lower()
+    every, first = 1, 0
+    try:
+        if sample.startswith('first:'):
+            first = max(int(sample[len('first:'):]), 1)
+        else:
+            every = max(int(sample), 1)
+    except ValueError:
+        pass
+    try:
+        max_bytes = int(os.environ.get('ZCO_HOOK_CAPTURE_MAX_KB', '')) * 1024
+    except ValueError:
+        max_bytes = CAPTURE_MAX_BYTES_DEFAULT
+    fields = [f.strip() for f in (os.environ.get('ZCO_HOOK_CAPTURE_FIELDS') or '').split(',') if f.strip()]
+    return {
+        "mode": (os.environ.get('ZCO_HOOK_CAPTURE') or 'snapshot').strip().lower(),
+        "max_bytes": max(max_bytes, 4096),
+        "every": every,
+        "first": first,
+        "fields": fields,
+    }
+
+
+def select_fields(data: Dict[str, Any], fields: List[str]) -> Dict[str, Any]:
+    """按字段白名单裁剪（'tool_input.file_path' 只保留嵌套字段），空白名单返回原数据"""
+    if not fields:
+        return data
+    out: Dict[str, Any] = {}
+    for field in fields:
+        keys = field.split('.')
+        src, dst = data, out
+        for i, key in enumerate(keys):
+            if not isinstance(src, dict) or key not in src:
+                break
+            if i == len(keys) - 1:
+                dst[key] = src[key]
+            else:
+                src = src[key]
+                dst = dst.setdefault(key, {})
+    return out
+
+
+def claim_capture_slot(hist_dir: Path, session_id: str, event: str, first: int) -> bool:
+    """
+    ##; first:N 采样：该会话该事件已采集不足 N 个时占用一个名额
+    ##; 计数文件每次追加 1 字节，文件大小即计数，无需加锁
+    ##; 以追加后的大小判断是否占到名额：并发时 O_APPEND 保证每个字节位置唯一，不会超过 N 个
+    ##; （同时写入时可能少采，不会多采）；已满时先 stat 直接返回，文件不再增长
+    """
+    counts_dir = Path(hist_dir) / CAPTURE_COUNTS_DIR
+    counts_dir.mkdir(exist_ok=True)
+    path = counts_dir / f"{session_tag(session_id)}_{_capture_event_name(event)}"
+    try:
+        if path.stat().st_size >= first:
+            return False
+    except FileNotFoundError:
+        pass
+    fd = os.open(str(path), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, b'.')
+        size = os.fstat(fd).st_size
+    finally:
+        os.close(fd)
+    return size <= first
+
+
+def prune_capture_counts(hist_dir: Path, event: str, before: float):
+    """
+    ##; 删除该事件在 before（时间戳）之前最后一次写入的 first:N 计数文件
+    ##; 环形文件轮转时调用：这些会话的采集记录已不在环形窗口内，计数随之作废
+    """
+    event_name = _capture_event_name(event)
+    for path in (Path(hist_dir) / CAPTURE_COUNTS_DIR).glob(f"*_{event_name}"):
+        ##; 文件名为 <8 位会话标识>_<事件名>，事件名本身可能含下划线
+        if path.name[9:] != event_name:
+            continue
+        try:
+            if path.stat().st_mtime < before:
+                path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def _capture_event_name(event: str) -> str:
+    return re.sub(r'[^A-Za-z0-9_-]', '_', event or 'unknown')
+
+
+def capture_path(hist_dir: Path, event: str) -> Path:
+    """事件的当前采集段路径"""
+    return Path(hist_dir) / f"{CAPTURE_FILE_PREFIX}{_capture_event_name(event)}.jsonl"
+
+
+def append_capture(hist_dir: Path, event: str, record: Dict[str, Any],
+                   max_bytes: int = CAPTURE_MAX_BYTES_DEFAULT):
+    """
+    ##; 追加一条紧凑 JSON 记录到事件的环形采集文件
+    ##; 当前段超过 max_bytes/2 时轮转为 .1（覆盖上一段），两段合计不超过约 max_bytes
+    ##; 追加为单次 O_APPEND 写入；轮转只在拿到 fcntl 锁的进程中进行，拿不到锁直接跳过
+    ##; 轮转时被覆盖的旧 .1 段最后写入之前的 first:N 计数文件一并清理
+    """
+    path = capture_path(hist_dir, event)
+    line = (json.dumps(record, ensure_ascii=False, separators=(',', ':'), default=str) + "\n").encode('utf-8')
+    fd = os.open(str(path), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, line)
+        size = os.fstat(fd).st_size
+    finally:
+        os.close(fd)
+    if size <= max_bytes // 2 or fcntl is None:
+        return
+    lock_fd = os.open(str(path) + '.lock', os.O_WRONLY | os.O_CREAT, 0o644)
+    try:
+        try:
+            fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return
+        ##; 加锁后再检查：别的进程可能刚完成轮转
+        try:
+            if os.stat(path).st_size > max_bytes // 2:
+                try:
+                    window_start = os.stat(str(path) + '.1').st_mtime
+                except FileNotFoundError:
+                    window_start = None
+                os.replace(path, str(path) + '.1')
+                if window_start is not None:
+                    prune_capture_counts(hist_dir, event, window_start)
+        except FileNotFoundError:
+            pass
+    finally:
+        os.close(lock_fd)
+
+
+def list_capture_events(hist_dir: Path) -> List[str]:
+    """历史目录下有采集文件的事件名"""
+    events = set()
+    for path in Path(hist_dir).glob(f"{CAPTURE_FILE_PREFIX}*.jsonl*"):
+        name = path.name[len(CAPTURE_FILE_PREFIX):]
+        if name.endswith('.jsonl') or name.endswith('.jsonl.1'):
+            events.add(name.rsplit('.jsonl', 1)[0])
+    return sorted(events)
+
+
+def iter_captures(hist_dir: Path, event: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """
+    ##; 按时间顺序读取采集记录（先 .1 段再当前段）；不指定 event 时合并所有事件并按 ts 排序
+    """
+    if event is None:
+        records = [r for e in list_capture_events(hist_dir) for r in iter_captures(hist_dir, e)]
+        records.sort(key=lambda r: r.get('ts', ''))
+        yield from records
+        return
+    path = capture_path(hist_dir, event)
+    for segment in (Path(str(path) + '.1'), path):
+        try:
+            f = open(segment, 'rb')
+        except FileNotFoundError:
+            continue
+        with f:
+            for line in f:
+                try:
+                    record = _json_loads(line)
+                except _JSON_ERRORS:
+                    continue
+                if isinstance(record, dict):
+                    yield record
+
+
+def turn_index_path(hist_dir: Path, session_id: str) -> Path:
+    """会话的轮次索引文件"""
+    return Path(hist_dir) / TURN_INDEX_DIR / f"{session_tag(session_id)}.turns"
+
+
+def _pack_turn(turn: int, ts: int, flags: int, commit: str, tree: str) -> bytes:
+    commit_raw = bytes.fromhex(commit) if commit else b''
+    tree_raw = bytes.fromhex(tree) if tree else b''
+    return TURN_RECORD.pack(turn, ts, flags, len(commit_raw or tree_raw), commit_raw, tree_raw)
+
+
+def _unpack_turn(data: bytes) -> Dict[str, Any]:
+    turn, ts, flags, oid_len, commit_raw, tree_raw = TURN_RECORD.unpack(data)
+    commit = commit_raw[:oid_len].hex() if oid_len and commit_raw.strip(b'\0') else ""
+    tree = tree_raw[:oid_len].hex() if oid_len and tree_raw.strip(b'\0') else ""
+    return {"turn": turn, "time": ts, "flags": flags, "commit": commit, "tree": tree}
+
+
+def append_turn(hist_dir: Path, session_id: str, commit: str = "", tree: str = "", flags: int = 0,
+                ts: Optional[int] = None) -> int:
+    """
+    ##; 追加会话下一轮的记录，返回轮次（从 1 开始）
+    ##; 轮次由文件大小推算；fcntl 锁内 fstat + 单次 O_APPEND 写，同一会话的并发 hook 不会得到相同轮次
+    ##; commit/tree 为空时是占位记录，之后由 update_turn 填写（后台模式）
+    """
+    path = turn_index_path(hist_dir, session_id)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(str(path), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        size = os.fstat(fd).st_size
+        turn = size // TURN_RECORD.size + 1
+        if size % TURN_RECORD.size:
+            ##; 写入中断留下的半条记录换成空的占位记录，保证之后的记录仍然对齐、轮次不错位
+            os.ftruncate(fd, (turn - 1) * TURN_RECORD.size)
+            os.write(fd, _pack_turn(turn, 0, 0, "", ""))
+            turn += 1
+        os.write(fd, _pack_turn(turn, int(ts if ts is not None else time.time()), flags, commit, tree))
+        return turn
+    finally:
+        os.close(fd)
+
+
+def update_turn(hist_dir: Path, session_id: str, turn: int, commit: str, tree: str, flags: int) -> bool:
+    """##; 原地改写第 turn 轮的 commit/tree/标志（保留时间），记录不存在时返回 False"""
+    path = turn_index_path(hist_dir, session_id)
+    try:
+        fd = os.open(str(path), os.O_RDWR)
+    except OSError:
+        return False
+    try:
+        offset = (turn - 1) * TURN_RECORD.size
+        data = os.pread(fd, TURN_RECORD.size, offset)
+        if turn < 1 or len(data) < TURN_RECORD.size:
+            return False
+        os.pwrite(fd, _pack_turn(turn, _unpack_turn(data)["time"], flags, commit, tree), offset)
+        return True
+    finally:
+        os.close(fd)
+
+
+def read_turn(hist_dir: Path, session_id: str, turn: int) -> Optional[Dict[str, Any]]:
+    """
+    ##; 按偏移读取第 turn 轮的记录（一次 seek + read，与会话长度无关）
+    ##; Returns:
+    ##;     {turn, time, flags, commit, tree}，不存在时返回 None
+    """
+    if turn < 1:
+        return None
+    try:
+        with open(turn_index_path(hist_dir, session_id), 'rb') as f:
+            f.seek((turn - 1) * TURN_RECORD.size)
+            data = f.read(TURN_RECORD.size)
+    except OSError:
+        return None
+    return _unpack_turn(data) if len(data) == TURN_RECORD.size else None
+
+
+def iter_turns(hist_dir: Path, session_id: str) -> Iterator[Dict[str, Any]]:
+    """按顺序读取会话的全部轮次记录"""
+    try:
+        with open(turn_index_path(hist_dir, session_id), 'rb') as f:
+            data = f.read()
+    except OSError:
+        return
+    for offset in range(0, len(data) - TURN_RECORD.size + 1, TURN_RECORD.size):
+        yield _unpack_turn(data[offset:offset + TURN_RECORD.size])
+
+
+def list_turn_sessions(hist_dir: Path) -> List[Tuple[str, int, float]]:
+    """
+    ##; 有轮次索引的会话，按最近修改时间从新到旧
+    ##; Returns:
+    ##;     [(会话8位, 轮数, mtime)]
+    """
+    result = []
+    for path in (Path(hist_dir) / TURN_INDEX_DIR).glob("*.turns"):
+        st = path.stat()
+        result.append((path.stem, st.st_size // TURN_RECORD.size, st.st_mtime))
+    result.sort(key=lambda x: x[2], reverse=True)
+    return result
+
+
+def append_churn(hist_dir: Path, record: Dict[str, Any]):
+    """
+    ##; 追加一轮的改动量 {session_id, turn, commit, mode, files, insertions, deletions}，自动补 time
+    ##; 单次 O_APPEND 写入一整行，并发 hook 不会交错
+    """
+    record = dict(record, time=record.get("time") or datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+    line = (json.dumps(record, ensure_ascii=False, separators=(',', ':')) + "\n").encode('utf-8')
+    fd = os.open(str(Path(hist_dir) / CHURN_FILE_NAME), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, line)
+    finally:
+        os.close(fd)
+
+
+def iter_churn(hist_dir: Path) -> Iterator[Dict[str, Any]]:
+    """按写入顺序读取改动量记录，跳过损坏的行"""
+    try:
+        f = open(Path(hist_dir) / CHURN_FILE_NAME, 'rb')
+    except OSError:
+        return
+    with f:
+        for line in f:
+            try:
+                record = _json_loads(line)
+            except _JSON_ERRORS:
+                continue
+            if isinstance(record, dict) and record.get('session_id'):
+                yield record
+
+
+class HookMetrics:
+    """
+    ##; hook 分阶段计时，ZCO_HOOK_METRICS=1 时启用
+    ##; 未启用时 mark() 只做一次属性判断；启用后在进程退出时以一次 O_APPEND 写入一行 JSON
+    ##; 阶段: stdin（读取输入）、git_root（定位仓库/历史目录）、parse（解析 transcript）、render、write
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.hook = ""
+        self.event = ""
+        self.session_id = ""
+        self.cwd = ""
+        self.hist_dir: Optional[Path] = None
+        self.phases: Dict[str, float] = {}
+        self.counters: Dict[str, float] = {}
+        self._start = self._last = 0.0
+
+    def start(self, hook: str):
+        """hook 入口调用，开始计时"""
+        if os.environ.get('ZCO_HOOK_METRICS') != '1':
+            return
+        import atexit
+        self.enabled = True
+        self.hook = hook
+        self._start = self._last = time.perf_counter()
+        atexit.register(self.flush)
+
+    def context(self, input_data: Dict[str, Any]):
+        """记录 hook 输入中的事件、会话和工作目录"""
+        if not self.enabled or not isinstance(input_data, dict):
+            return
+        self.event = input_data.get('hook_event_name', '') or ''
+        self.session_id = input_data.get('session_id', '') or ''
+        self.cwd = input_data.get('cwd', '') or ''
+
+    def mark(self, phase: str):
+        """结束一个阶段：自上次 mark 以来的耗时累加到 phase"""
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.phases[phase] = self.phases.get(phase, 0.0) + (now - self._last) * 1000
+        self._last = now
+
+    def count(self, name: str, value: float = 1):
+        """累加一个计数器（如 index.lock 等待次数/时长），随记录一起写出"""
+        if not self.enabled:
+            return
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def flush(self):
+        """写出一行记录（只写一次）；没有历史目录时跳过"""
+        if not self.enabled:
+            return
+        self.enabled = False
+        hist_dir = self.hist_dir
+        if hist_dir is None and self.cwd:
+            candidate = Path(self.cwd) / '_.zco_hist'
+            hist_dir = candidate if candidate.is_dir() else None
+        if hist_dir is None:
+            return
+        record = {
+            "time": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            "event": self.event,
+            "hook": self.hook,
+            "session_id": self.session_id,
+            "total_ms": round((time.perf_counter() - self._start) * 1000, 3),
+            "phases": {k: round(v, 3) for k, v in self.phases.items()},
+        }
+        if self.counters:
+            record["counters"] = {k: round(v, 3) for k, v in self.counters.items()}
+        try:
+            fd = os.open(str(Path(hist_dir) / METRICS_FILE_NAME), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, (json.dumps(record, ensure_ascii=False) + "\n").encode('utf-8'))
+            finally:
+                os.close(fd)
+        except OSError:
+            pass
+
+
+##; 进程内唯一的计时器，hooks 直接 import 使用
+metrics = HookMetrics()
+
+
+##; ZCO_PROFILE 采集结果目录（位于历史目录下）及默认保留份数
+PROFILE_DIR_NAME = "zco_profiles"
+PROFILE_KEEP_DEFAULT = 20
+
+
+def run_entry(entry, name: str, out_dir: Optional[Path] = None, read_payload: bool = True):
+    """
+    ##; 运行入口函数；设置 ZCO_PROFILE 时在 profiler 下运行并保存结果
+    ##;   ZCO_PROFILE=cpu     cProfile，输出 .prof 和 Chrome trace (.trace.json)
+    ##;   ZCO_PROFILE=sample  安装了 pyinstrument 时采样，输出 .txt/.html；否则回退到 cpu
+    ##; 未设置时直接调用 entry()，没有额外开销
+    ##; Args:
+    ##;     out_dir: 结果目录；None 时在 entry() 结束后取历史目录下的 zco_profiles（见 _profile_dir）
+    ##;     read_payload: 是否预读 stdin 以取得事件名和会话 ID（hooks 使用）
+    """
+    mode = os.environ.get('ZCO_PROFILE', '').strip()
+    if not mode:
+        return entry()
+    return _run_profiled(entry, name, mode, out_dir, read_payload)
+
+
+def _run_profiled(entry, name: str, mode: str, out_dir: Optional[Path], read_payload: bool):
+    import io
+
+    event, session_id, cwd = "cli", "", None
+    if read_payload:
+        raw = sys.stdin.read()
+        sys.stdin = io.StringIO(raw)
+        try:
+            payload = json.loads(raw) if raw.strip() else {}
+        except json.JSONDecodeError:
+            payload = {}
+        if isinstance(payload, dict):
+            event = payload.get('hook_event_name') or "unknown"
+            session_id = payload.get('session_id') or ""
+            cwd = payload.get('cwd')
+
+    sampler = None
+    if mode == 'sample':
+        try:
+            from pyinstrument import Profiler
+            sampler = Profiler()
+        except ImportError:
+            print("ZCO_PROFILE=sample: pyinstrument 未安装，使用 cProfile", file=sys.stderr)
+
+    import cProfile
+    profiler = None if sampler else cProfile.Profile()
+    if sampler:
+        sampler.start()
+    else:
+        profiler.enable()
+    try:
+        return entry()
+    finally:
+        if sampler:
+            sampler.stop()
+        else:
+            profiler.disable()
+        try:
+            target = Path(out_dir) if out_dir is not None else _profile_dir(cwd)
+            if target is None:
+                print("ZCO_PROFILE: 未找到历史目录 (_.zco_hist)，未保存采集结果", file=sys.stderr)
+            else:
+                _save_profile(target, name, event, session_id, profiler, sampler)
+        except Exception as e:  # 采集失败不影响 hook 本身
+            print(f"ZCO_PROFILE: 保存失败: {e}", file=sys.stderr)
+
+
+def _profile_dir(cwd: Optional[str]) -> Optional[Path]:
+    """
+    ##; entry() 结束后确定采集结果目录: 优先用本次运行定位过的历史目录（metrics.hist_dir），
+    ##; 否则按 cwd（子目录也可）所在 Git 仓库和 ZCO_CHAT_SAVE_DIR 查找已有的历史目录；都没有时返回 None
+    """
+    if metrics.hist_dir is not None:
+        return Path(metrics.hist_dir) / PROFILE_DIR_NAME
+    hist_dir = hist_dir_path(get_git_root(Path(cwd) if cwd else None))
+    return hist_dir / PROFILE_DIR_NAME if hist_dir.is_dir() else None
+
+
+def _save_profile(out_dir: Path, name: str, event: str, session_id: str, profiler, sampler):
+    """保存采集结果，并按 ZCO_PROFILE_KEEP 只保留最近的若干份"""
+    ensure_dir(out_dir)
+    tag = session_tag(session_id) if session_id else "nosess"
+    stem = f"prof_{datetime.now().strftime('%y%m%d_%H%M%S')}_{os.getpid()}_{event}_{tag}_{name}"
+    if sampler is not None:
+        (out_dir / f"{stem}.txt").write_text(sampler.output_text(), encoding='utf-8')
+        (out_dir / f"{stem}.html").write_text(sampler.output_html(), encoding='utf-8')
+    else:
+        import pstats
+        profiler.dump_stats(str(out_dir / f"{stem}.prof"))
+        trace = pstats_to_chrome_trace(pstats.Stats(profiler))
+        with open(out_dir / f"{stem}.trace.json", 'w', encoding='utf-8') as f:
+            json.dump(trace, f)
+    print(f"ZCO_PROFILE: {out_dir / stem}.*", file=sys.stderr)
+
+    try:
+        keep = int(os.environ.get('ZCO_PROFILE_KEEP', PROFILE_KEEP_DEFAULT))
+    except ValueError:
+        keep = PROFILE_KEEP_DEFAULT
+    captures: Dict[str, float] = {}
+    with os.scandir(out_dir) as it:
+        for entry in it:
+            if entry.name.startswith('prof_'):
+                key = entry.name.split('.', 1)[0]
+                captures[key] = max(captures.get(key, 0.0), entry.stat().st_mtime)
+    for key in sorted(captures, key=captures.get, reverse=True)[max(keep, 1):]:
+        for suffix in ('.prof', '.trace.json', '.txt', '.html'):
+            try:
+                os.unlink(out_dir / f"{key}{suffix}")
+            except OSError:
+                pass
+
+
+def pstats_to_chrome_trace(stats, min_ms: float = 0.05, max_depth: int = 64) -> Dict[str, Any]:
+    """
+    ##; 把 pstats 的调用图转为 Chrome trace（chrome://tracing / Perfetto 可打开）
+    ##; cProfile 只有聚合数据，这里按 "调用者 -> 被调用者" 的累计时间排成火焰图式的嵌套区间，
+    ##; 时间轴表示占比而非真实先后顺序
+    """
+    raw = stats.stats  # {func: (cc, nc, tt, ct, callers)}
+    children: Dict[Tuple, List[Tuple[Tuple, float]]] = {}
+    roots = []
+    for func, (_, _, _, ct, callers) in raw.items():
+        if not callers:
+            roots.append((func, ct))
+        for caller, caller_stats in callers.items():
+            children.setdefault(caller, []).append((func, caller_stats[3]))
+
+    def label(func) -> str:
+        filename, line, fn = func
+        return fn if filename == '~' else f"{fn} ({os.path.basename(filename)}:{line})"
+
+    events: List[Dict[str, Any]] = []
+    min_us = min_ms * 1000
+
+    def emit(func, start_us: float, dur_us: float, depth: int, stack: set):
+        events.append({"name": label(func), "ph": "X", "ts": round(start_us, 3), "dur": round(dur_us, 3),
+                       "pid": 1, "tid": 1, "cat": "python",
+                       "args": {"file": func[0], "line": func[1]}})
+        if depth >= max_depth:
+            return
+        offset = start_us
+        stack.add(func)
+        for child, ct in sorted(children.get(func, []), key=lambda x: -x[1]):
+            child_us = min(ct * 1e6, start_us + dur_us - offset)
+            if child in stack or child_us < min_us:
+                continue
+            emit(child, offset, child_us, depth + 1, stack)
+            offset += child_us
+        stack.discard(func)
+
+    offset = 0.0
+    for func, ct in sorted(roots, key=lambda x: -x[1]):
+        dur = ct * 1e6
+        if dur < min_us:
+            continue
+        emit(func, offset, dur, 0, set())
+        offset += dur
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
@@ -0,0 +1,1487 @@
+#!/usr/bin/env python3
+"""
+##;zco-hist-smy: 对话历史汇总工具
+##;用法: zco-hist-smy [-d days]
+##;  -d 1   当天 (默认)
+##;  -d 7   近 7 天
+##;  -d 0   所有历史
+##;  --all-projects  汇总 ~/.claude/zco-linked-projects.json 中的全部项目
+##;  --source jsonl  直接读取原始会话 JSONL 统计（按 session_id 去重）
+##;
+##;进程内调用（无需启动子进程）:
+##;  import zco_hist_smy
+##;  inputs = zco_hist_smy.select_inputs(hist_dir, days=7)     # 选择
+##;  parsed = zco_hist_smy.parse_input(inputs[0])              # 解析
+##;  merged = zco_hist_smy.aggregate(hist_dir, days=7)         # 聚合（日桶缓存）
+##;  text = zco_hist_smy.render(merged)                        # 渲染 Markdown
+##;  zco_hist_smy.main(["-d", "7"])                            # 等同命令行
+"""
+
+import argparse
+import csv
+import hashlib
+import heapq
+import json
+import os
+import re
+import subprocess
+import sys
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+
+ZCO_CLAUDE_RECORD_FILE = Path.home() / ".claude" / "zco-linked-projects.json"
+ZCO_HIST_HOME_ROOT = Path.home() / ".claude" / "zco_hist"
+##;多项目汇总的增量状态，记录每个项目上次汇总时的历史签名
+ZCO_ROLLUP_STATE_FILE = ZCO_HIST_HOME_ROOT / "_.rollup_state.json"
+##;Claude 保存原始会话 JSONL 的目录
+CLAUDE_PROJECTS_DIR = Path.home() / ".claude" / "projects"
+
+##;复用 hooks 中的会话解析与索引（ClaudeSettings/hooks/zco_hist_common.py）
+_HOOKS_DIR = str(Path(__file__).resolve().parents[2] / "hooks")
+if _HOOKS_DIR not in sys.path:
+    sys.path.insert(0, _HOOKS_DIR)
+from zco_hist_common import iter_churn, load_sessions, scan_transcript  # noqa: E402
+
+##;统计来源: md 解析渲染后的 Markdown，jsonl 读取原始会话记录
+SUMMARY_SOURCES = ("md", "jsonl")
+
+##;日桶缓存目录（位于历史目录下）及格式版本，版本变化时旧缓存自动失效
+BUCKET_CACHE_DIR = "_.zco_hist_smy_cache"
+BUCKET_CACHE_VERSION = 1
+##;热点文件/URL 默认显示数量
+DEFAULT_TOP_N = 20
+
+##;输出格式: md 生成 Markdown 报告，其余为机器可读格式（直接输出到 stdout 或 --output）
+OUTPUT_FORMATS = ("md", "json", "ndjson", "csv")
+##;CSV 统一表头，不同 record_type 只填写相关列
+CSV_FIELDS = [
+    "record_type", "name", "session_id", "chat_time", "title",
+    "count", "tool_calls", "files_count", "urls_count", "share", "tools",
+]
+
+
+def get_hist_dir(project_dir: Path = None) -> Path:
+    """获取历史记录目录"""
+    hist_dir_name = os.environ.get('ZCO_CHAT_SAVE_DIR', None)
+    git_root = get_git_root(project_dir)
+    if not hist_dir_name:
+        hist_dir = git_root / '_.zco_hist'
+    else:
+        hist_dir = Path(os.path.abspath(os.path.join(str(git_root), hist_dir_name)))
+    hist_dir.mkdir(parents=True, exist_ok=True)
+    return hist_dir
+
+
+def get_git_root(project_dir: Path = None) -> Path:
+    """获取当前 Git 仓库根目录"""
+    try:
+        # 执行 git rev-parse --show-toplevel 命令
+        if project_dir:
+            result = subprocess.run(
+                ['git', '-C', str(project_dir), 'rev-parse', '--show-toplevel'],
+                capture_output=True, text=True, check=True
+            )
+        else:
+            result = subprocess.run(
+                ['git', 'rev-parse', '--show-toplevel'],
+                capture_output=True, text=True, check=True
+            )
+        return Path(result.stdout.strip())
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        return Path.cwd()
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    """##;解析命令行参数（argv 为 None 时读取 sys.argv）"""
+    parser = argparse.ArgumentParser(
+        description="汇总 _.zco_hist 目录下的对话历史记录",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+示例:
+  zco-hist-smy        # 汇总当天
+  zco-hist-smy -d 1   # 汇总当天（显式）
+  zco-hist-smy -d 7   # 汇总近 7 天
+  zco-hist-smy -d 0   # 汇总所有历史记录
+  zco-hist-smy --all-projects -d 1   # 汇总所有已链接项目的当天记录
+        """,
+    )
+    parser.add_argument(
+        "-d",
+        "--days",
+        type=int,
+        default=1,
+        help="天数范围 (默认: 1, 0 表示不限)",
+    )
+    parser.add_argument(
+        "--all-projects",
+        action="store_true",
+        default=False,
+        help="汇总 ~/.claude/zco-linked-projects.json 中记录的全部项目",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=0,
+        help="--all-projects 模式下的并发数 (默认: min(8, CPU 数))",
+    )
+    parser.add_argument(
+        "--record-file",
+        default=None,
+        help="已链接项目记录文件 (默认: ~/.claude/zco-linked-projects.json)",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        default=False,
+        help="--all-projects 模式下忽略增量状态，重新汇总所有项目",
+    )
+    parser.add_argument(
+        "--source",
+        choices=SUMMARY_SOURCES,
+        default="md",
+        help="统计来源 (默认: md)；jsonl 直接读取原始会话记录，精确统计 tool_use 并按 session_id 去重",
+    )
+    parser.add_argument(
+        "--format",
+        choices=OUTPUT_FORMATS,
+        default="md",
+        help="输出格式 (默认: md)；json/ndjson/csv 不生成 Markdown，直接输出统计记录",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        default=None,
+        help="json/ndjson/csv 的输出文件 (默认: stdout)",
+    )
+    parser.add_argument(
+        "--stats-only",
+        action="store_true",
+        default=False,
+        help="只输出聚合统计，跳过逐个会话的明细（适合 cron 定时任务）",
+    )
+    parser.add_argument(
+        "--top",
+        type=int,
+        default=DEFAULT_TOP_N,
+        help=f"热点文件/URL 显示数量 (默认: {DEFAULT_TOP_N})",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        default=False,
+        help="忽略日桶缓存，重新解析统计周期内的全部记录",
+    )
+    return parser.parse_args(argv)
+
+
+def calculate_date_range(days: int) -> Tuple[Optional[datetime], datetime]:
+    """##;计算日期范围
+    ##;Args:
+    ##;    days: 天数，0 表示不限
+    ##;Returns:
+    ##;    (start_date, end_date)，start_date 可能为 None
+    """
+    end_date = datetime.now()
+    if days == 0:
+        return None, end_date
+    start_date = end_date - timedelta(days=days - 1)
+    ##;重置为当天开始
+    start_date = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
+    return start_date, end_date
+
+
+def get_hist_files(
+    hist_dir: Path, start_date: Optional[datetime], end_date: datetime
+) -> List[Path]:
+    """##;获取符合条件的对话文件"""
+    if not hist_dir.exists():
+        return []
+
+    files = []
+    for f in hist_dir.glob("*.md"):
+        ##;跳过 debug 文件和汇总文件
+        if "debug" in f.name or "smy" in f.name:
+            continue
+
+        ##;获取文件修改时间
+        mtime = datetime.fromtimestamp(f.stat().st_mtime)
+
+        ##;检查是否在日期范围内
+        if start_date is None:
+            files.append(f)
+        elif start_date <= mtime <= end_date:
+            files.append(f)
+
+    ##;按修改时间排序
+    files.sort(key=lambda x: x.stat().st_mtime)
+    return files
+
+
+def extract_tools_from_content(content: str) -> List[str]:
+    """##;从内容中提取工具名称"""
+    tools = []
+
+    ##;匹配折叠面板中的工具名 <summary>📄 <b>Read</b>
+    pattern1 = r"<summary>.*?<b>(\w+)</b>"
+    tools.extend(re.findall(pattern1, content))
+
+    ##;匹配工具使用统计行
+    pattern2 = r"-\s+(\w+):\s*\d+"
+    tools.extend(re.findall(pattern2, content))
+
+    return tools
+
+
+def extract_files_from_content(content: str) -> List[str]:
+    """##;从内容中提取文件路径"""
+    files = []
+
+    ##;匹配 📄 文件路径
+    pattern = r"📄\s+`?([^`\n]+)`?"
+    matches = re.findall(pattern, content)
+    files.extend(matches)
+
+    ##;匹配代码块中的 file_path
+    pattern2 = r'"file_path":\s*"([^"]+)"'
+    matches = re.findall(pattern2, content)
+    files.extend(matches)
+
+    return list(set(files))
+
+
+def extract_urls_from_content(content: str) -> List[str]:
+    """##;从内容中提取 URLs"""
+    urls = []
+
+    ##;匹配 🌐 URL
+    pattern = r"🌐\s+(https?://[^\s\n]+)"
+    matches = re.findall(pattern, content)
+    urls.extend(matches)
+
+    return list(set(urls))
+
+
+def parse_chat_file(file_path: Path, detail: bool = True) -> Dict:
+    """##;解析单个对话文件
+    ##;Args:
+    ##;    detail: False 时只提取统计所需字段（工具、文件、URL），跳过标题、时间和预览
+    """
+    try:
+        content = file_path.read_text(encoding="utf-8")
+    except Exception as e:
+        return {
+            "filename": file_path.name,
+            "error": str(e),
+            "mtime": datetime.fromtimestamp(file_path.stat().st_mtime),
+        }
+
+    ##;提取基本信息
+    mtime = datetime.fromtimestamp(file_path.stat().st_mtime)
+
+    if not detail:
+        return {
+            "filename": file_path.name,
+            "mtime": mtime,
+            "tools": Counter(extract_tools_from_content(content)),
+            "files": extract_files_from_content(content),
+            "urls": extract_urls_from_content(content),
+        }
+
+    ##;尝试提取标题（第一个 # 标题）
+    title_match = re.search(r"^#\s+(.+)$", content, re.MULTILINE)
+    title = title_match.group(1) if title_match else file_path.stem
+
+    ##;提取时间（从文件内容或文件名）
+    time_match = re.search(r"\*\*时间\*\*[:：]\s*(.+)", content)
+    if time_match:
+        try:
+            chat_time = datetime.strptime(time_match.group(1).strip(), "%Y-%m-%d %H:%M:%S")
+        except ValueError:
+            chat_time = mtime
+    else:
+        chat_time = mtime
+
+    ##;提取会话 ID（spec/cli 样式为 "会话 ID"，plain 样式为 "Session ID"）
+    sid_match = re.search(r"\*\*(?:会话 ID|Session ID)\*\*[:：]\s*`?([^`\s]+)`?", content)
+    session_id = sid_match.group(1) if sid_match else ""
+
+    ##;提取工具
+    tools = extract_tools_from_content(content)
+    tool_counts = Counter(tools)
+
+    ##;提取文件
+    files = extract_files_from_content(content)
+
+    ##;提取 URLs
+    urls = extract_urls_from_content(content)
+
+    return {
+        "filename": file_path.name,
+        "session_id": session_id,
+        "title": title,
+        "mtime": mtime,
+        "chat_time": chat_time,
+        "tools": tool_counts,
+        "files": files,
+        "urls": urls,
+        "content_preview": content[:500] if content else "",
+    }
+
+
+def find_transcript(session_id: str) -> Optional[Path]:
+    """##;在 ~/.claude/projects/*/ 下查找会话的原始 JSONL"""
+    for candidate in CLAUDE_PROJECTS_DIR.glob(f"*/{session_id}.jsonl"):
+        return candidate
+    return None
+
+
+def discover_transcripts(hist_dir: Path, md_files: List[Path]) -> Dict[str, Path]:
+    """##;收集会话的原始 transcript 路径，按 session_id 去重
+    ##;优先使用 hooks 记录的会话索引；索引之外的旧会话从 Markdown 头部读取 session_id 再查找
+    """
+    transcripts: Dict[str, Path] = {}
+    for session_id, record in load_sessions(hist_dir).items():
+        path = Path(record.get("transcript_path", ""))
+        if path.is_file():
+            transcripts[session_id] = path
+
+    sid_pattern = re.compile(r"\*\*(?:会话 ID|Session ID)\*\*[:：]\s*`?([^`\s]+)`?")
+    for f in md_files:
+        try:
+            with open(f, "r", encoding="utf-8", errors="ignore") as fp:
+                head = fp.read(1024)
+        except OSError:
+            continue
+        match = sid_pattern.search(head)
+        if not match or match.group(1) in transcripts:
+            continue
+        path = find_transcript(match.group(1))
+        if path:
+            transcripts[match.group(1)] = path
+    return transcripts
+
+
+def parse_transcript_file(session_id: str, transcript_path: Path) -> Dict:
+    """##;解析单个原始会话，返回与 parse_chat_file 相同结构的记录"""
+    try:
+        mtime = datetime.fromtimestamp(transcript_path.stat().st_mtime)
+        scan = scan_transcript(str(transcript_path))
+    except Exception as e:
+        return {"filename": transcript_path.name, "error": str(e)}
+    return {
+        "filename": transcript_path.name,
+        "session_id": session_id,
+        "title": session_id,
+        "mtime": mtime,
+        "chat_time": scan["first_time"] or mtime,
+        "tools": scan["tools"],
+        "files": sorted(scan["files"]),
+        "urls": sorted(scan["urls"]),
+        "prompts": scan["prompts"],
+        "content_preview": "",
+    }
+
+
+def iter_inputs(
+    hist_dir: Path, start_date: Optional[datetime], end_date: datetime, source: str = "md"
+) -> List[Tuple[Path, os.stat_result, str]]:
+    """##;列出统计输入 [(path, stat, session_id)]，按修改时间过滤并排序
+    ##;md: 每个 Markdown 文件；jsonl: 每个会话的原始 transcript（按 session_id 去重）
+    """
+    if source == "jsonl":
+        md_files = get_hist_files(hist_dir, start_date, end_date)
+        candidates = [
+            (path, session_id)
+            for session_id, path in discover_transcripts(hist_dir, md_files).items()
+        ]
+    else:
+        candidates = [(f, "") for f in get_hist_files(hist_dir, start_date, end_date)]
+
+    inputs = []
+    for path, session_id in candidates:
+        try:
+            st = path.stat()
+        except OSError:
+            continue
+        mtime = datetime.fromtimestamp(st.st_mtime)
+        if start_date is not None and not (start_date <= mtime <= end_date):
+            continue
+        inputs.append((path, st, session_id))
+    inputs.sort(key=lambda x: x[1].st_mtime)
+    return inputs
+
+
+def compact_record(parsed: Dict) -> Dict:
+    """##;解析结果转为可缓存的紧凑记录（只保留报告需要的字段）"""
+    return {
+        "filename": parsed["filename"],
+        "session_id": parsed.get("session_id", ""),
+        "title": parsed.get("title", parsed["filename"]),
+        "chat_time": parsed["chat_time"].strftime("%Y-%m-%d %H:%M:%S"),
+        "tools": dict(parsed["tools"]),
+        "files": list(parsed["files"])[:3],
+        "files_count": len(parsed["files"]),
+        "urls_count": len(parsed["urls"]),
+    }
+
+
+def parse_input(item: Tuple[Path, os.stat_result, str], source: str = "md", detail: bool = True) -> Dict:
+    """##;解析 iter_inputs 产出的一个输入（Markdown 文件或原始 transcript）
+    ##;detail=False 时 Markdown 只提取统计字段（见 parse_chat_file）
+    """
+    path, _, session_id = item
+    if source == "jsonl":
+        return parse_transcript_file(session_id, path)
+    return parse_chat_file(path, detail=detail)
+
+
+def build_day_bucket(
+    day: str, inputs: List[Tuple[Path, os.stat_result, str]], source: str, detail: bool = True
+) -> Dict:
+    """##;解析一天的输入并聚合为日桶
+    ##;日桶包含当天合计、按小时的分桶、文件/URL 计数（被多少个会话涉及）和紧凑记录
+    ##;detail=False（--stats-only）时不生成逐个会话的紧凑记录，records 为空
+    """
+    tools = Counter()
+    files = Counter()
+    urls = Counter()
+    hours: Dict[str, Dict] = {}
+    hour_files: Dict[str, set] = {}
+    records = []
+    sessions = 0
+
+    for item in inputs:
+        parsed = parse_input(item, source, detail)
+        st = item[1]
+        if "error" in parsed:
+            continue
+        hour = datetime.fromtimestamp(st.st_mtime).strftime("%H")
+        tool_calls = sum(parsed["tools"].values())
+        tools.update(parsed["tools"])
+        files.update(set(parsed["files"]))
+        urls.update(set(parsed["urls"]))
+        slot = hours.setdefault(hour, {"sessions": 0, "tool_calls": 0, "files": 0})
+        slot["sessions"] += 1
+        slot["tool_calls"] += tool_calls
+        hour_files.setdefault(hour, set()).update(parsed["files"])
+        sessions += 1
+        if detail:
+            records.append(compact_record(parsed))
+
+    for hour, slot in hours.items():
+        slot["files"] = len(hour_files[hour])
+
+    return {
+        "day": day,
+        "sessions": sessions,
+        "tool_calls": sum(tools.values()),
+        "tools": dict(tools),
+        "files": dict(files),
+        "urls": dict(urls),
+        "hours": dict(sorted(hours.items())),
+        "records": records,
+    }
+
+
+def day_signature(inputs: List[Tuple[Path, os.stat_result, str]], source: str, detail: bool = True) -> str:
+    """##;日桶签名：输入文件名、大小、mtime 的摘要，任一变化则该日重新聚合"""
+    h = hashlib.md5(f"{BUCKET_CACHE_VERSION}:{source}:{'detail' if detail else 'stats'}".encode())
+    for path, st, session_id in sorted(inputs, key=lambda x: str(x[0])):
+        h.update(f"{path}|{st.st_size}|{st.st_mtime_ns}|{session_id}\n".encode())
+    return h.hexdigest()
+
+
+def iter_day_buckets(
+    hist_dir: Path,
+    start_date: Optional[datetime],
+    end_date: datetime,
+    source: str = "md",
+    use_cache: bool = True,
+    detail: bool = True,
+) -> Iterator[Dict]:
+    """##;按日期顺序产出日桶，签名未变化的日期直接读取缓存
+    ##;缓存位于 <hist_dir>/_.zco_hist_smy_cache/<source>/<day>.json，新增一天只需聚合这一天
+    ##;detail=False 的日桶不含 records，单独缓存为 <day>.stats.json；完整日桶有效时直接复用
+    """
+    by_day: Dict[str, List] = {}
+    for item in iter_inputs(hist_dir, start_date, end_date, source):
+        day = datetime.fromtimestamp(item[1].st_mtime).strftime("%Y-%m-%d")
+        by_day.setdefault(day, []).append(item)
+
+    cache_dir = hist_dir / BUCKET_CACHE_DIR / source
+    for day in sorted(by_day):
+        inputs = by_day[day]
+        signature = day_signature(inputs, source, detail)
+        cache_file = cache_dir / (f"{day}.json" if detail else f"{day}.stats.json")
+        candidates = [(cache_file, signature)]
+        if not detail:
+            candidates.insert(0, (cache_dir / f"{day}.json", day_signature(inputs, source)))
+        cached = None
+        for candidate, sig in candidates if use_cache else []:
+            try:
+                with open(candidate, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                continue
+            if data.get("sig") == sig:
+                cached = data
+                break
+        if cached is not None:
+            yield cached
+            continue
+
+        bucket = build_day_bucket(day, inputs, source, detail)
+        bucket["sig"] = signature
+        try:
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp_file = cache_file.with_name(cache_file.name + f".{os.getpid()}.tmp")
+            with open(tmp_file, "w", encoding="utf-8") as f:
+                json.dump(bucket, f, ensure_ascii=False)
+            os.replace(tmp_file, cache_file)
+        except OSError as e:
+            print(f"##;@WARN: 写入日桶缓存失败 {cache_file}: {e}", file=sys.stderr)
+        yield bucket
+
+
+def top_n(counter: Dict[str, int], n: int) -> List[Tuple[str, int]]:
+    """##;堆选择前 N 项（次数降序，同次数按名称升序），不对全集排序"""
+    if n <= 0:
+        return []
+    return heapq.nsmallest(n, counter.items(), key=lambda kv: (-kv[1], kv[0]))
+
+
+def merge_buckets(buckets: Iterable[Dict]) -> Dict:
+    """##;合并日桶为整个统计周期的聚合结果
+    ##;Returns:
+    ##;    {total_chats, total_tools, tools, files, urls, days: [...], records: [...]}
+    """
+    tools = Counter()
+    files = Counter()
+    urls = Counter()
+    days = []
+    records = []
+    for bucket in buckets:
+        tools.update(bucket["tools"])
+        files.update(bucket["files"])
+        urls.update(bucket["urls"])
+        days.append(bucket)
+        records.extend(bucket["records"])
+    return {
+        "total_chats": len(records),
+        "total_tools": sum(tools.values()),
+        "tools": tools,
+        "files": files,
+        "urls": urls,
+        "days": days,
+        "records": records,
+    }
+
+
+def load_churn(hist_dir: Path, start_date: Optional[datetime], end_date: datetime) -> Dict[str, Dict]:
+    """##;读取自动提交 hook 记录的每轮改动量（zco_churn.jsonl），按会话汇总统计周期内的轮次
+    ##;Returns:
+    ##;    {session_id: {turns, files, insertions, deletions, max_turn, max_lines, first_time, last_time}}
+    """
+    start = start_date.strftime("%Y-%m-%d %H:%M:%S") if start_date else ""
+    end = end_date.strftime("%Y-%m-%d %H:%M:%S")
+    sessions: Dict[str, Dict] = {}
+    for r in iter_churn(hist_dir):
+        t = str(r.get("time", ""))
+        if (start and t < start) or t > end:
+            continue
+        acc = sessions.setdefault(r["session_id"], {
+            "turns": 0, "files": 0, "insertions": 0, "deletions": 0,
+            "max_turn": 0, "max_lines": 0, "first_time": t, "last_time": t,
+        })
+        lines = int(r.get("insertions", 0)) + int(r.get("deletions", 0))
+        acc["turns"] += 1
+        acc["files"] += int(r.get("files", 0))
+        acc["insertions"] += int(r.get("insertions", 0))
+        acc["deletions"] += int(r.get("deletions", 0))
+        if lines > acc["max_lines"]:
+            acc["max_turn"], acc["max_lines"] = int(r.get("turn", 0)), lines
+        acc["last_time"] = max(acc["last_time"], t)
+    return sessions
+
+
+def summary_stats(merged: Dict) -> Dict:
+    """##;从合并结果生成统计字典"""
+    stats = {
+        "total_chats": merged["total_chats"],
+        "total_tools": merged["total_tools"],
+        "tool_distribution": dict(merged["tools"]),
+        "files_count": len(merged["files"]),
+        "urls_count": len(merged["urls"]),
+    }
+    churn = merged.get("churn")
+    if churn:
+        stats["churn_turns"] = sum(c["turns"] for c in churn.values())
+        stats["churn_insertions"] = sum(c["insertions"] for c in churn.values())
+        stats["churn_deletions"] = sum(c["deletions"] for c in churn.values())
+    return stats
+
+
+def render_churn(churn: Dict[str, Dict]) -> List[str]:
+    """##;渲染每个会话的代码改动（自动提交 hook 按轮记录）"""
+    lines = []
+    if not churn:
+        return lines
+    turns = sum(c["turns"] for c in churn.values())
+    insertions = sum(c["insertions"] for c in churn.values())
+    deletions = sum(c["deletions"] for c in churn.values())
+    lines.append("## 🧮 代码改动（自动提交）")
+    lines.append("")
+    lines.append(f"共 {len(churn)} 个会话、{turns} 轮, +{insertions} / -{deletions} 行"
+                 f"（平均每轮 {(insertions + deletions) / turns:.1f} 行）")
+    lines.append("")
+    lines.append("| 会话 | 最后时间 | 轮次 | 文件 | 新增 | 删除 | 每轮改动行 | 最大一轮 |")
+    lines.append("|------|------|------|------|------|------|------|------|")
+    for session_id, c in sorted(churn.items(), key=lambda kv: kv[1]["last_time"]):
+        per_turn = (c["insertions"] + c["deletions"]) / c["turns"] if c["turns"] else 0
+        biggest = f"#{c['max_turn']} ({c['max_lines']} 行)" if c["max_lines"] else "-"
+        lines.append(
+            f"| `{session_id[:8]}` | {c['last_time']} | {c['turns']} | {c['files']} "
+            f"| +{c['insertions']} | -{c['deletions']} | {per_turn:.1f} | {biggest} |"
+        )
+    lines.append("")
+    return lines
+
+
+def spark_bar(value: int, peak: int, width: int = 20) -> str:
+    """##;按峰值比例生成文本条形图"""
+    if peak <= 0 or value <= 0:
+        return ""
+    return "█" * max(1, round(value / peak * width))
+
+
+def render_trends(days: List[Dict]) -> List[str]:
+    """##;渲染按天、按小时的趋势表"""
+    lines = []
+    if not days:
+        return lines
+
+    lines.append("## 📈 使用趋势")
+    lines.append("")
+    lines.append("### 按天")
+    lines.append("")
+    lines.append("| 日期 | 对话数 | 工具次数 | 文件数 | 工具次数分布 |")
+    lines.append("|------|------|------|------|------|")
+    peak = max(d["tool_calls"] for d in days)
+    for d in days:
+        lines.append(
+            f"| {d['day']} | {d['sessions']} | {d['tool_calls']} | {len(d['files'])} "
+            f"| {spark_bar(d['tool_calls'], peak)} |"
+        )
+    lines.append("")
+
+    ##;按小时：单日显示当天各小时，多日按一天中的小时合计
+    hours: Dict[str, Dict[str, int]] = {}
+    for d in days:
+        for hour, slot in d["hours"].items():
+            acc = hours.setdefault(hour, {"sessions": 0, "tool_calls": 0, "files": 0})
+            for key in acc:
+                acc[key] += slot[key]
+    title = "### 按小时" if len(days) == 1 else "### 按小时（各天合计）"
+    lines.append(title)
+    lines.append("")
+    lines.append("| 小时 | 对话数 | 工具次数 | 文件数 | 工具次数分布 |")
+    lines.append("|------|------|------|------|------|")
+    peak = max(h["tool_calls"] for h in hours.values()) if hours else 0
+    for hour in sorted(hours):
+        h = hours[hour]
+        lines.append(
+            f"| {hour}:00 | {h['sessions']} | {h['tool_calls']} | {h['files']} "
+            f"| {spark_bar(h['tool_calls'], peak)} |"
+        )
+    lines.append("")
+    return lines
+
+
+def generate_summary(
+    buckets: Iterable[Dict],
+    start_date: Optional[datetime],
+    end_date: datetime,
+    top: int = DEFAULT_TOP_N,
+    churn: Optional[Dict[str, Dict]] = None,
+) -> Tuple[str, Dict]:
+    """##;生成汇总报告
+    ##;Args:
+    ##;    buckets: iter_day_buckets 产出的日桶
+    ##;    top: 热点文件/URL 显示数量
+    ##;    churn: load_churn 的结果（每个会话的代码改动）
+    ##;Returns:
+    ##;    (markdown_content, stats_dict)
+    """
+    merged = merge_buckets(buckets)
+    merged["churn"] = churn or {}
+    if not merged["records"]:
+        return "# 对话历史汇总报告\n\n没有找到符合条件的对话记录。\n", {}
+    return render_summary(merged, start_date, end_date, top), summary_stats(merged)
+
+
+def render_summary(
+    merged: Dict,
+    start_date: Optional[datetime],
+    end_date: datetime,
+    top: int = DEFAULT_TOP_N,
+) -> str:
+    """##;把 merge_buckets 的聚合结果渲染为 Markdown 报告"""
+    parsed_files = merged["records"]
+
+    ##;统计数据
+    total_chats = merged["total_chats"]
+    all_tools = merged["tools"]
+    all_files = merged["files"]
+    all_urls = merged["urls"]
+    total_tools = merged["total_tools"]
+
+    ##;生成 Markdown
+    lines = []
+    lines.append("# 对话历史汇总报告")
+    lines.append("")
+    lines.append(f"**生成时间**: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+
+    ##;日期范围
+    if start_date:
+        lines.append(
+            f"**统计周期**: {start_date.strftime('%Y-%m-%d')} 至 {end_date.strftime('%Y-%m-%d')}"
+        )
+    else:
+        lines.append("**统计周期**: 全部历史")
+
+    lines.append(f"**总对话数**: {total_chats}")
+    lines.append("")
+    lines.append("---")
+    lines.append("")
+
+    ##;统计概览
+    lines.append("## 📊 统计概览")
+    lines.append("")
+    lines.append("| 指标 | 数值 |")
+    lines.append("|------|------|")
+    lines.append(f"| 总对话数 | {total_chats} |")
+    lines.append(f"| 使用工具次数 | {total_tools} |")
+    lines.append(f"| 涉及文件数 | {len(all_files)} |")
+    lines.append(f"| 访问 URLs | {len(all_urls)} |")
+    lines.append("")
+
+    ##;工具使用分布
+    if all_tools:
+        lines.append("### 工具使用分布")
+        lines.append("")
+        lines.append("| 工具 | 次数 | 占比 |")
+        lines.append("|------|------|------|")
+
+        for tool, count in all_tools.most_common():
+            percentage = (count / total_tools * 100) if total_tools > 0 else 0
+            lines.append(f"| {tool} | {count} | {percentage:.1f}% |")
+
+        lines.append("")
+
+    ##;使用趋势
+    lines.append("---")
+    lines.append("")
+    lines.extend(render_trends(merged["days"]))
+
+    ##;代码改动
+    churn = merged.get("churn") or {}
+    if churn:
+        lines.append("---")
+        lines.append("")
+        lines.extend(render_churn(churn))
+
+    ##;对话列表
+    lines.append("---")
+    lines.append("")
+    lines.append("## 📝 对话列表")
+    lines.append("")
+
+    for idx, p in enumerate(parsed_files, 1):
+        lines.append(f"### {idx}. {p['filename']}")
+        lines.append("")
+        lines.append(f"- **标题**: {p['title']}")
+        lines.append(f"- **时间**: {p['chat_time']}")
+
+        if p["tools"]:
+            tool_str = ", ".join([f"{t}×{c}" for t, c in Counter(p["tools"]).most_common()])
+            lines.append(f"- **工具**: {tool_str}")
+
+        if p["files"]:
+            lines.append(f"- **文件**: {', '.join(p['files'])}")
+            if p["files_count"] > 3:
+                lines.append(f"  - ... 等 {p['files_count']} 个文件")
+
+        c = churn.get(p.get("session_id", ""))
+        if c:
+            lines.append(f"- **改动**: {c['turns']} 轮, {c['files']} 个文件次, +{c['insertions']} / -{c['deletions']} 行")
+
+        lines.append("")
+
+    ##;热点文件
+    if all_files:
+        lines.append("---")
+        lines.append("")
+        lines.append(f"## 📁 热点文件 Top {top}")
+        lines.append("")
+        lines.append("| 文件 | 涉及对话数 |")
+        lines.append("|------|------|")
+
+        for f, count in top_n(all_files, top):
+            lines.append(f"| `{f}` | {count} |")
+
+        if len(all_files) > top:
+            lines.append("")
+            lines.append(f"*共 {len(all_files)} 个文件*")
+
+        lines.append("")
+
+    ##;热点参考资源
+    if all_urls:
+        lines.append("---")
+        lines.append("")
+        lines.append(f"## 🔗 热点参考资源 Top {top}")
+        lines.append("")
+
+        for url, count in top_n(all_urls, top):
+            lines.append(f"- [{url}]({url}) ×{count}")
+
+        if len(all_urls) > top:
+            lines.append(f"- ... 等共 {len(all_urls)} 个 URL")
+
+        lines.append("")
+
+    ##;页脚
+    lines.append("---")
+    lines.append("")
+    lines.append(f"*生成于 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}*")
+    lines.append("")
+
+    return "\n".join(lines)
+
+
+def select_inputs(hist_dir: Path, days: int = 1, source: str = "md") -> List[Tuple[Path, os.stat_result, str]]:
+    """##;API: 选择统计周期内的输入 [(path, stat, session_id)]，days 含义同 -d"""
+    start_date, end_date = calculate_date_range(days)
+    return iter_inputs(Path(hist_dir), start_date, end_date, source)
+
+
+def aggregate(hist_dir: Path, days: int = 1, source: str = "md", use_cache: bool = True) -> Dict:
+    """##;API: 聚合统计周期内的记录（复用日桶缓存）
+    ##;Returns:
+    ##;    merge_buckets 的结果，另含 start_date / end_date / stats
+    """
+    start_date, end_date = calculate_date_range(days)
+    merged = merge_buckets(iter_day_buckets(Path(hist_dir), start_date, end_date, source, use_cache))
+    merged["churn"] = load_churn(Path(hist_dir), start_date, end_date)
+    merged["start_date"] = start_date
+    merged["end_date"] = end_date
+    merged["stats"] = summary_stats(merged)
+    return merged
+
+
+def render(merged: Dict, top: int = DEFAULT_TOP_N) -> str:
+    """##;API: 渲染 aggregate 的结果为 Markdown 报告"""
+    if not merged["records"]:
+        return "# 对话历史汇总报告\n\n没有找到符合条件的对话记录。\n"
+    return render_summary(merged, merged.get("start_date"), merged.get("end_date") or datetime.now(), top)
+
+
+def make_hist_home(project_dir: Path) -> Path:
+    """##;计算项目的 hist home 路径（与 zco_claude_init.make_hist_home 规则一致，不创建目录）"""
+    git_root_hash = hashlib.md5(str(project_dir).encode()).hexdigest()[:8]
+    return ZCO_HIST_HOME_ROOT / (project_dir.name + "." + git_root_hash)
+
+
+def load_linked_projects(record_file: Path = ZCO_CLAUDE_RECORD_FILE) -> List[Dict]:
+    """##;读取已链接项目记录，返回 [{name, target_path, hist_dir}]
+    ##;hist_dir 优先使用记录中的 zco_hist_home，其次按路径推算 hist home，最后回退到项目内 _.zco_hist
+    """
+    if not record_file.exists():
+        return []
+    try:
+        with open(record_file, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (json.JSONDecodeError, OSError) as e:
+        print(f"##;@ERROR: 读取记录文件失败 {record_file}: {e}")
+        return []
+
+    projects = []
+    seen = set()
+    for item in data.get("linked-projects", []):
+        if isinstance(item, dict):
+            target_path = item.get("target_path", "")
+            hist_home = item.get("zco_hist_home")
+        elif isinstance(item, (list, tuple)) and item:
+            ##;兼容旧格式 (target_path, linked_time, ...)
+            target_path, hist_home = item[0], None
+        else:
+            continue
+        if not target_path or target_path in seen:
+            continue
+        seen.add(target_path)
+
+        target = Path(target_path)
+        candidates = [Path(hist_home)] if hist_home else []
+        candidates += [make_hist_home(target), target / "_.zco_hist"]
+        hist_dir = next((c for c in candidates if c.is_dir()), candidates[0])
+        projects.append({"name": target.name, "target_path": target_path, "hist_dir": hist_dir})
+    return projects
+
+
+def history_signature(hist_dir: Path, source: str = "md") -> List:
+    """##;单次 scandir 计算历史目录签名 [文件数, 总字节, 最大 mtime_ns]，用于判断是否有变化
+    ##;jsonl 时统计输入是原始 transcript（Markdown 之外仍会增长），追加 transcript 的同样三项
+    """
+    count, size, latest = 0, 0, 0
+    md_files = []
+    try:
+        with os.scandir(hist_dir) as it:
+            for entry in it:
+                if not entry.name.endswith(".md") or not entry.is_file():
+                    continue
+                st = entry.stat()
+                count += 1
+                size += st.st_size
+                latest = max(latest, st.st_mtime_ns)
+                md_files.append(Path(entry.path))
+    except OSError:
+        pass
+    signature = [count, size, latest]
+    if source == "jsonl":
+        t_count, t_size, t_latest = 0, 0, 0
+        for path in discover_transcripts(Path(hist_dir), md_files).values():
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            t_count += 1
+            t_size += st.st_size
+            t_latest = max(t_latest, st.st_mtime_ns)
+        signature += [t_count, t_size, t_latest]
+    return signature
+
+
+def summarize_project(
+    project: Dict, start_date: Optional[datetime], end_date: datetime, source: str = "md"
+) -> Dict:
+    """##;汇总单个项目，返回可序列化的结果（用于合并报告和增量状态）"""
+    merged = merge_buckets(iter_day_buckets(Path(project["hist_dir"]), start_date, end_date, source))
+    return {
+        "name": project["name"],
+        "target_path": project["target_path"],
+        "hist_dir": str(project["hist_dir"]),
+        "total_chats": merged["total_chats"],
+        "total_tools": merged["total_tools"],
+        "tool_distribution": dict(merged["tools"]),
+        "files_count": len(merged["files"]),
+        "urls": sorted(merged["urls"]),
+    }
+
+
+def load_rollup_state(state_file: Path = ZCO_ROLLUP_STATE_FILE) -> Dict:
+    """##;读取多项目汇总的增量状态"""
+    try:
+        with open(state_file, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def save_rollup_state(state: Dict, state_file: Path = ZCO_ROLLUP_STATE_FILE):
+    """##;保存多项目汇总的增量状态（先写临时文件再替换）"""
+    state_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = state_file.with_name(state_file.name + f".{os.getpid()}.tmp")
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_file, state_file)
+
+
+def compute_rollup(
+    projects: List[Dict],
+    start_date: Optional[datetime],
+    end_date: datetime,
+    jobs: int = 0,
+    force: bool = False,
+    source: str = "md",
+) -> Tuple[List[Dict], Dict]:
+    """##;并发汇总多个项目，历史签名未变化的项目直接复用上次的汇总结果
+    ##;Returns:
+    ##;    (project_results, stats_dict)
+    """
+    state = {} if force else load_rollup_state()
+    range_key = (start_date.strftime("%Y-%m-%d") if start_date else "all") + f":{source}"
+
+    results: Dict[str, Dict] = {}
+    pending = []
+    skipped = 0
+    for project in projects:
+        signature = history_signature(project["hist_dir"], source)
+        cached = state.get(project["target_path"])
+        if (
+            cached
+            and cached.get("signature") == signature
+            and cached.get("range_key") == range_key
+        ):
+            results[project["target_path"]] = cached["result"]
+            skipped += 1
+        else:
+            pending.append((project, signature))
+
+    max_workers = jobs if jobs > 0 else min(8, os.cpu_count() or 1)
+    if pending:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            futures = [
+                (project, signature, pool.submit(summarize_project, project, start_date, end_date, source))
+                for project, signature in pending
+            ]
+            for project, signature, future in futures:
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"##;@ERROR: 汇总项目失败 {project['target_path']}: {e}")
+                    continue
+                results[project["target_path"]] = result
+                state[project["target_path"]] = {
+                    "signature": signature,
+                    "range_key": range_key,
+                    "result": result,
+                }
+
+    try:
+        save_rollup_state(state)
+    except OSError as e:
+        print(f"##;@WARN: 保存增量状态失败: {e}")
+
+    ##;全局合计
+    ordered = [results[p["target_path"]] for p in projects if p["target_path"] in results]
+    active = [r for r in ordered if r["total_chats"] > 0]
+    all_tools = Counter()
+    all_urls = set()
+    for r in ordered:
+        all_tools.update(r["tool_distribution"])
+        all_urls.update(r["urls"])
+    total_chats = sum(r["total_chats"] for r in ordered)
+    total_tools = sum(all_tools.values())
+    files_count = sum(r["files_count"] for r in ordered)
+
+    stats = {
+        "total_projects": len(projects),
+        "active_projects": len(active),
+        "skipped_projects": skipped,
+        "total_chats": total_chats,
+        "total_tools": total_tools,
+        "tool_distribution": dict(all_tools),
+        "files_count": files_count,
+        "urls_count": len(all_urls),
+    }
+    return ordered, stats
+
+
+def render_rollup(
+    ordered: List[Dict], stats: Dict, start_date: Optional[datetime], end_date: datetime
+) -> str:
+    """##;渲染多项目汇总的 Markdown 报告（全局合计 + 项目分节）"""
+    active = [r for r in ordered if r["total_chats"] > 0]
+    all_tools = Counter(stats["tool_distribution"])
+    total_chats = stats["total_chats"]
+    total_tools = stats["total_tools"]
+
+    lines = []
+    lines.append("# 多项目对话历史汇总报告")
+    lines.append("")
+    lines.append(f"**生成时间**: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    if start_date:
+        lines.append(
+            f"**统计周期**: {start_date.strftime('%Y-%m-%d')} 至 {end_date.strftime('%Y-%m-%d')}"
+        )
+    else:
+        lines.append("**统计周期**: 全部历史")
+    lines.append(
+        f"**项目数**: {stats['total_projects']} (有对话: {len(active)}, "
+        f"无变化复用: {stats['skipped_projects']})"
+    )
+    lines.append(f"**总对话数**: {total_chats}")
+    lines.append("")
+    lines.append("---")
+    lines.append("")
+
+    lines.append("## 📊 全局合计")
+    lines.append("")
+    lines.append("| 指标 | 数值 |")
+    lines.append("|------|------|")
+    lines.append(f"| 总对话数 | {total_chats} |")
+    lines.append(f"| 使用工具次数 | {total_tools} |")
+    lines.append(f"| 涉及文件数 | {stats['files_count']} |")
+    lines.append(f"| 访问 URLs | {stats['urls_count']} |")
+    lines.append("")
+
+    if all_tools:
+        lines.append("### 工具使用分布")
+        lines.append("")
+        lines.append("| 工具 | 次数 | 占比 |")
+        lines.append("|------|------|------|")
+        for tool, count in all_tools.most_common():
+            percentage = (count / total_tools * 100) if total_tools > 0 else 0
+            lines.append(f"| {tool} | {count} | {percentage:.1f}% |")
+        lines.append("")
+
+    lines.append("---")
+    lines.append("")
+    lines.append("## 📦 项目明细")
+    lines.append("")
+    lines.append("| 项目 | 对话数 | 工具次数 | 文件数 | URLs |")
+    lines.append("|------|------|------|------|------|")
+    for r in sorted(ordered, key=lambda x: (-x["total_chats"], x["name"])):
+        lines.append(
+            f"| {r['name']} | {r['total_chats']} | {r['total_tools']} "
+            f"| {r['files_count']} | {len(r['urls'])} |"
+        )
+    lines.append("")
+
+    for r in active:
+        lines.append(f"### {r['name']}")
+        lines.append("")
+        lines.append(f"- **路径**: `{r['target_path']}`")
+        lines.append(f"- **历史目录**: `{r['hist_dir']}`")
+        lines.append(f"- **对话数**: {r['total_chats']}, **工具次数**: {r['total_tools']}")
+        if r["tool_distribution"]:
+            top_tools = Counter(r["tool_distribution"]).most_common()
+            lines.append(f"- **工具**: {', '.join(f'{t}×{c}' for t, c in top_tools)}")
+        lines.append("")
+
+    lines.append("---")
+    lines.append("")
+    lines.append(f"*生成于 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}*")
+    lines.append("")
+
+    return "\n".join(lines)
+
+
+def generate_rollup(
+    projects: List[Dict],
+    start_date: Optional[datetime],
+    end_date: datetime,
+    jobs: int = 0,
+    force: bool = False,
+    source: str = "md",
+) -> Tuple[str, Dict]:
+    """##;并发汇总多个项目，生成带项目分节和全局合计的报告
+    ##;Returns:
+    ##;    (markdown_content, stats_dict)
+    """
+    ordered, stats = compute_rollup(
+        projects, start_date, end_date, jobs=jobs, force=force, source=source
+    )
+    return render_rollup(ordered, stats, start_date, end_date), stats
+
+
+class StatsWriter:
+    """##;机器可读统计输出（json/ndjson/csv），逐条写出会话记录，最后写出聚合分布"""
+
+    def __init__(self, fmt: str, stream: TextIO):
+        self.fmt = fmt
+        self.stream = stream
+        self.count = 0
+        self.csv_writer = None
+        if fmt == "csv":
+            self.csv_writer = csv.DictWriter(stream, fieldnames=CSV_FIELDS, extrasaction="ignore")
+            self.csv_writer.writeheader()
+        elif fmt == "json":
+            stream.write('{"records": [')
+
+    def write(self, record: Dict):
+        """##;写出一条记录（session / project）"""
+        if self.fmt == "ndjson":
+            self.stream.write(json.dumps(record, ensure_ascii=False) + "\n")
+        elif self.fmt == "json":
+            self.stream.write(("," if self.count else "") + "\n  " + json.dumps(record, ensure_ascii=False))
+        else:
+            row = dict(record)
+            if isinstance(row.get("tools"), dict):
+                row["tools"] = ";".join(f"{t}:{c}" for t, c in row["tools"].items())
+            self.csv_writer.writerow(row)
+        self.count += 1
+
+    def finish(self, summary: Dict):
+        """##;写出聚合统计和工具分布"""
+        distribution = distribution_records(summary.get("tool_distribution", {}))
+        summary_record = {"record_type": "summary"}
+        summary_record.update((k, v) for k, v in summary.items() if k != "tool_distribution")
+        if self.fmt == "json":
+            self.stream.write("\n],\n")
+            self.stream.write('"summary": ' + json.dumps(summary_record, ensure_ascii=False) + ",\n")
+            self.stream.write('"tool_distribution": ' + json.dumps(distribution, ensure_ascii=False) + "}\n")
+            return
+        if self.fmt == "csv":
+            summary_record.update(
+                count=summary.get("total_chats", 0), tool_calls=summary.get("total_tools", 0)
+            )
+        for record in distribution + [summary_record]:
+            self.write(record)
+
+
+def distribution_records(tool_distribution: Dict[str, int]) -> List[Dict]:
+    """##;工具分布转为记录列表（按次数降序）"""
+    total = sum(tool_distribution.values())
+    return [
+        {
+            "record_type": "tool",
+            "name": tool,
+            "count": count,
+            "share": round(count / total, 4) if total else 0,
+        }
+        for tool, count in Counter(tool_distribution).most_common()
+    ]
+
+
+def session_record(record: Dict) -> Dict:
+    """##;单个对话的会话记录（输入为日桶中的紧凑记录）"""
+    return {
+        "record_type": "session",
+        "name": record["filename"],
+        "session_id": record.get("session_id", ""),
+        "chat_time": record["chat_time"],
+        "title": record.get("title", ""),
+        "tool_calls": sum(record["tools"].values()),
+        "files_count": record["files_count"],
+        "urls_count": record["urls_count"],
+        "tools": dict(record["tools"]),
+    }
+
+
+def trend_records(merged: Dict, top: int = DEFAULT_TOP_N) -> List[Dict]:
+    """##;按天、按小时的趋势记录和热点文件/URL 记录"""
+    records = []
+    hours: Dict[str, Dict[str, int]] = {}
+    for d in merged["days"]:
+        records.append({
+            "record_type": "day",
+            "name": d["day"],
+            "count": d["sessions"],
+            "tool_calls": d["tool_calls"],
+            "files_count": len(d["files"]),
+            "urls_count": len(d["urls"]),
+            "tools": d["tools"],
+        })
+        for hour, slot in d["hours"].items():
+            acc = hours.setdefault(hour, {"sessions": 0, "tool_calls": 0, "files": 0})
+            for key in acc:
+                acc[key] += slot[key]
+    for hour in sorted(hours):
+        records.append({
+            "record_type": "hour",
+            "name": hour,
+            "count": hours[hour]["sessions"],
+            "tool_calls": hours[hour]["tool_calls"],
+            "files_count": hours[hour]["files"],
+        })
+    for path, count in top_n(merged["files"], top):
+        records.append({"record_type": "file", "name": path, "count": count})
+    for url, count in top_n(merged["urls"], top):
+        records.append({"record_type": "url", "name": url, "count": count})
+    return records
+
+
+def stream_stats(
+    buckets: Iterable[Dict],
+    writer: StatsWriter,
+    stats_only: bool = False,
+    top: int = DEFAULT_TOP_N,
+) -> Dict:
+    """##;逐个日桶输出会话记录，最后输出趋势、热点和聚合统计
+    ##;Returns:
+    ##;    stats_dict（与 generate_summary 的统计字典一致）
+    """
+    tools = Counter()
+    files = Counter()
+    urls = Counter()
+    days = []
+    total_chats = 0
+
+    for bucket in buckets:
+        tools.update(bucket["tools"])
+        files.update(bucket["files"])
+        urls.update(bucket["urls"])
+        total_chats += bucket["sessions"]
+        ##;趋势只需日级汇总，逐条记录写出后即丢弃
+        days.append({k: v for k, v in bucket.items() if k != "records"})
+        if not stats_only:
+            for record in bucket["records"]:
+                writer.write(session_record(record))
+
+    merged = {
+        "total_chats": total_chats,
+        "total_tools": sum(tools.values()),
+        "tools": tools,
+        "files": files,
+        "urls": urls,
+        "days": days,
+    }
+    if not stats_only:
+        for record in trend_records(merged, top):
+            writer.write(record)
+
+    stats = summary_stats(merged)
+    writer.finish(stats)
+    return stats
+
+
+def open_output(output: Optional[str]) -> TextIO:
+    """##;打开机器可读格式的输出流，None 或 "-" 表示 stdout"""
+    if not output or output == "-":
+        return sys.stdout
+    Path(output).parent.mkdir(parents=True, exist_ok=True)
+    return open(output, "w", encoding="utf-8", newline="")
+
+
+def write_machine_output(args, buckets: Iterable[Dict]) -> Dict:
+    """##;单项目机器可读输出"""
+    stream = open_output(args.output)
+    try:
+        return stream_stats(
+            buckets, StatsWriter(args.format, stream), stats_only=args.stats_only, top=args.top
+        )
+    finally:
+        if stream is not sys.stdout:
+            stream.close()
+
+
+def main_all_projects(args) -> int:
+    """##;--all-projects 模式：汇总全部已链接项目"""
+    start_date, end_date = calculate_date_range(args.days)
+    record_file = Path(args.record_file) if args.record_file else ZCO_CLAUDE_RECORD_FILE
+    projects = load_linked_projects(record_file)
+    if not projects:
+        print(f"##;@NOTE: 没有找到已链接项目: {record_file}")
+        return 0
+
+    if args.format != "md":
+        print(f"##;找到 {len(projects)} 个已链接项目", file=sys.stderr)
+        ordered, stats = compute_rollup(
+            projects, start_date, end_date, jobs=args.jobs, force=args.force, source=args.source
+        )
+        stream = open_output(args.output)
+        try:
+            writer = StatsWriter(args.format, stream)
+            if not args.stats_only:
+                for r in ordered:
+                    writer.write({
+                        "record_type": "project",
+                        "name": r["name"],
+                        "title": r["target_path"],
+                        "count": r["total_chats"],
+                        "tool_calls": r["total_tools"],
+                        "files_count": r["files_count"],
+                        "urls_count": len(r["urls"]),
+                        "tools": r["tool_distribution"],
+                    })
+            writer.finish(stats)
+        finally:
+            if stream is not sys.stdout:
+                stream.close()
+        return 0
+
+    print(f"##;找到 {len(projects)} 个已链接项目")
+    ordered, stats = compute_rollup(
+        projects, start_date, end_date, jobs=args.jobs, force=args.force, source=args.source
+    )
+    markdown_content = render_rollup(ordered, stats, start_date, end_date)
+
+    output_dir = Path(os.environ.get("AICO_DOCS", get_git_root() / "AICO_DOCS"))
+    output_dir.mkdir(parents=True, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d")
+    output_file = output_dir / f"zco_hist_smy_all_{timestamp}.md"
+
+    try:
+        output_file.write_text(markdown_content, encoding="utf-8")
+        print(f"##;汇总报告已保存: {output_file}")
+        print(
+            f"##;统计: {stats['total_projects']} 个项目 (复用 {stats['skipped_projects']}), "
+            f"{stats['total_chats']} 个对话, {stats['total_tools']} 次工具调用"
+        )
+    except Exception as e:
+        print(f"##;@ERROR: 保存文件失败: {e}")
+        return 1
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """##;命令行入口，argv 为 None 时读取 sys.argv；返回退出码"""
+    args = parse_args(argv)
+
+    if args.all_projects:
+        return main_all_projects(args)
+
+    ##;计算日期范围
+    start_date, end_date = calculate_date_range(args.days)
+
+    ##;获取项目根目录
+    git_root = get_git_root()
+
+    ##;查找 _.zco_hist 目录
+    ## hist_dir = git_root / "_.zco_hist"
+    hist_dir = get_hist_dir(git_root)
+    if not hist_dir.exists():
+        print(f"##;@ERROR: 未找到对话目录: {hist_dir}")
+        print("请先启用对话保存功能并执行一些对话。")
+        return 1
+
+    ##;机器可读格式：不生成 Markdown，直接流式输出统计记录
+    if args.format != "md":
+        buckets = iter_day_buckets(
+            hist_dir, start_date, end_date, args.source, use_cache=not args.no_cache, detail=not args.stats_only
+        )
+        stats = write_machine_output(args, buckets)
+        print(f"##;统计: {stats['total_chats']} 个对话", file=sys.stderr)
+        return 0
+
+    ##;按天聚合（未变化的日期直接读取缓存）
+    buckets = list(
+        iter_day_buckets(hist_dir, start_date, end_date, args.source, use_cache=not args.no_cache)
+    )
+    total = sum(b["sessions"] for b in buckets)
+
+    if not total:
+        date_range = (
+            f"{start_date.strftime('%Y-%m-%d')} 至 {end_date.strftime('%Y-%m-%d')}"
+            if start_date
+            else "全部历史"
+        )
+        print(f"##;@NOTE: 在 {date_range} 范围内没有找到对话记录")
+        return 0
+
+    unit = "个会话" if args.source == "jsonl" else "个对话文件"
+    print(f"##;找到 {total} {unit}，共 {len(buckets)} 天")
+
+    ##;生成汇总
+    churn = load_churn(hist_dir, start_date, end_date)
+    markdown_content, stats = generate_summary(buckets, start_date, end_date, top=args.top, churn=churn)
+
+    ##;确定输出目录
+    output_dir = Path(os.environ.get("AICO_DOCS", git_root / "AICO_DOCS"))
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    ##;生成文件名
+    timestamp = datetime.now().strftime("%Y%m%d")
+    output_file = output_dir / f"zco_hist_smy_{timestamp}.md"
+
+    ##;写入文件
+    try:
+        output_file.write_text(markdown_content, encoding="utf-8")
+        print(f"##;汇总报告已保存: {output_file}")
+        print(f"##;统计: {stats.get('total_chats', 0)} 个对话, {stats.get('total_tools', 0)} 次工具调用")
+        if churn:
+            print(f"##;改动: {stats['churn_turns']} 轮, +{stats['churn_insertions']} / -{stats['churn_deletions']} 行")
+    except Exception as e:
+        print(f"##;@ERROR: 保存文件失败: {e}")
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+##;bench_hist_hooks: 对话历史 hooks 的解析/渲染基准测试
+##;用法:
+##;  python3 benchmarks/bench_hist_hooks.py                       # 100 ~ 100k 行, 和 baseline.json 对比
+##;  python3 benchmarks/bench_hist_hooks.py --sizes 100,1000000   # 包含 1M 行
+##;  python3 benchmarks/bench_hist_hooks.py --update-baseline     # 重新记录基线
+##;  python3 benchmarks/bench_hist_hooks.py --check               # 超过阈值时退出码为 1
+##;
+##;测试的阶段（与 Stop hook 中的调用顺序一致）:
+##;  parse_transcript → extract_tool_results → extract_references
+##;  → generate_markdown (save_chat_spec) → generate_cli_style_markdown (save_chat_cli_style)
+##;
+##;合成会话由 gen_transcript.py 生成，按参数缓存在 --cache-dir 中，重复运行不会重新生成
+"""
+
+import argparse
+import gc
+import hashlib
+import json
+import platform
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+BENCH_DIR = Path(__file__).resolve().parent
+HOOKS_DIR = BENCH_DIR.parent / "ClaudeSettings" / "hooks"
+sys.path.insert(0, str(HOOKS_DIR))
+sys.path.insert(0, str(BENCH_DIR))
+
+import gen_transcript  # noqa: E402
+import save_chat_cli_style  # noqa: E402
+import save_chat_spec  # noqa: E402
+from zco_hist_common import parse_transcript  # noqa: E402
+
+BASELINE_FILE = BENCH_DIR / "baseline.json"
+DEFAULT_SIZES = "100,1000,10000,100000"
+DEFAULT_RESULT_SIZE = 512
+DEFAULT_THRESHOLD = 1.25
+SESSION_ID = gen_transcript.SESSION_ID
+STAGES = ("parse_transcript", "extract_tool_results", "extract_references",
+          "generate_markdown", "generate_cli_style_markdown")
+
+
+def transcript_for(size: int, args, cache_dir: Path) -> Path:
+    """按生成参数缓存合成会话文件"""
+    params = dict(lines=size, tool_mix=args.tool_mix, result_size=args.result_size,
+                  cjk=args.cjk, emoji=args.emoji, seed=args.seed)
+    key = hashlib.md5(json.dumps(params, sort_keys=True).encode()).hexdigest()[:10]
+    path = cache_dir / f"transcript_{size}_{key}.jsonl"
+    if not path.is_file():
+        tmp = path.with_suffix(".tmp")
+        gen_transcript.write_transcript(tmp, **params)
+        tmp.replace(path)
+    return path
+
+
+def time_call(fn: Callable, repeat: int):
+    """运行 fn repeat 次（计时期间关闭 GC），返回 (各次毫秒, 最后一次的返回值)"""
+    samples, result = [], None
+    for _ in range(repeat):
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            result = fn()
+            samples.append((time.perf_counter() - start) * 1000)
+        finally:
+            gc.enable()
+    return samples, result
+
+
+def bench_size(path: Path, repeat: int) -> Dict[str, Dict[str, float]]:
+    """按 Stop hook 的调用顺序逐阶段计时，每阶段取中位数和最小值"""
+    timings = {}
+
+    def record(stage: str, fn: Callable):
+        samples, result = time_call(fn, repeat)
+        timings[stage] = dict(median_ms=round(statistics.median(samples), 3), min_ms=round(min(samples), 3))
+        return result
+
+    messages = record("parse_transcript", lambda: parse_transcript(str(path)))
+    tool_results = record("extract_tool_results", lambda: save_chat_spec.extract_tool_results(messages))
+    tool_calls = save_chat_spec.extract_tool_calls(messages)
+    references = record("extract_references",
+                        lambda: save_chat_spec.extract_references(tool_calls, tool_results))
+    record("generate_markdown",
+           lambda: save_chat_spec.generate_markdown(messages, tool_calls, references, SESSION_ID))
+    record("generate_cli_style_markdown",
+           lambda: save_chat_cli_style.generate_cli_style_markdown(messages, SESSION_ID))
+    return timings
+
+
+def load_baseline(path: Path) -> Dict:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def format_ratio(current: float, base: float, threshold: float) -> str:
+    if not base:
+        return "      -"
+    ratio = current / base
+    flag = " ⚠️" if ratio > threshold else ""
+    return f"{ratio:>6.2f}x{flag}"
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='对话历史 hooks 解析/渲染基准测试')
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help=f'会话行数列表（默认: {DEFAULT_SIZES}）')
+    parser.add_argument('--repeat', type=int, default=0,
+                        help='每阶段重复次数（默认: 按规模自动, ≤10k 行 5 次, 更大 1~3 次）')
+    parser.add_argument('--tool-mix', default=gen_transcript.DEFAULT_TOOL_MIX, help='工具权重')
+    parser.add_argument('--result-size', type=int, default=DEFAULT_RESULT_SIZE,
+                        help=f'工具结果平均字节数（默认: {DEFAULT_RESULT_SIZE}）')
+    parser.add_argument('--cjk', type=float, default=0.3, help='中文词比例（默认: 0.3）')
+    parser.add_argument('--emoji', type=float, default=0.05, help='emoji 比例（默认: 0.05）')
+    parser.add_argument('--seed', type=int, default=gen_transcript.DEFAULT_SEED, help='随机种子')
+    parser.add_argument('--cache-dir', default=None,
+                        help='合成会话缓存目录（默认: 系统临时目录下 zco_bench_transcripts）')
+    parser.add_argument('--baseline', default=str(BASELINE_FILE), help='基线文件路径')
+    parser.add_argument('--update-baseline', action='store_true', help='把本次结果写入基线文件')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help=f'相对基线的回归阈值（默认: {DEFAULT_THRESHOLD}）')
+    parser.add_argument('--check', action='store_true', help='任一阶段超过阈值时返回 1')
+    parser.add_argument('--json', action='store_true', help='输出 JSON')
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    import tempfile
+
+    args = parse_args(argv)
+    sizes: List[int] = [int(s) for s in args.sizes.split(',') if s.strip()]
+    cache_dir = Path(args.cache_dir) if args.cache_dir else Path(tempfile.gettempdir()) / "zco_bench_transcripts"
+    cache_dir.mkdir(parents=True, exist_ok=True)
+
+    results = {}
+    for size in sizes:
+        path = transcript_for(size, args, cache_dir)
+        repeat = args.repeat or (5 if size <= 10000 else 3 if size <= 100000 else 1)
+        results[str(size)] = dict(bytes=path.stat().st_size, repeat=repeat, stages=bench_size(path, repeat))
+
+    report = dict(
+        meta=dict(python=platform.python_version(), implementation=platform.python_implementation(),
+                  machine=platform.machine(), system=platform.system(), tool_mix=args.tool_mix,
+                  result_size=args.result_size, cjk=args.cjk, emoji=args.emoji, seed=args.seed),
+        results=results,
+    )
+    baseline_path = Path(args.baseline)
+    baseline = load_baseline(baseline_path).get("results", {})
+
+    regressions = []
+    for size, data in results.items():
+        for stage in STAGES:
+            base = baseline.get(size, {}).get("stages", {}).get(stage, {}).get("median_ms")
+            current = data["stages"][stage]["median_ms"]
+            if base and current / base > args.threshold:
+                regressions.append(dict(size=int(size), stage=stage, baseline_ms=base, current_ms=current))
+    report["regressions"] = regressions
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print(f"Python {report['meta']['python']} ({report['meta']['machine']}), "
+              f"基线: {baseline_path if baseline else '无'}\n")
+        print(f"{'lines':>8} {'MB':>7}  {'stage':<28} {'median ms':>10} {'min ms':>10} {'vs base':>9}")
+        print("-" * 80)
+        for size, data in results.items():
+            for stage in STAGES:
+                t = data["stages"][stage]
+                base = baseline.get(size, {}).get("stages", {}).get(stage, {}).get("median_ms")
+                print(f"{size:>8} {data['bytes'] / 1024 / 1024:>7.1f}  {stage:<28} "
+                      f"{t['median_ms']:>10.2f} {t['min_ms']:>10.2f} {format_ratio(t['median_ms'], base, args.threshold)}")
+        if regressions:
+            print(f"\n⚠️  {len(regressions)} 个阶段比基线慢 {args.threshold:.2f} 倍以上")
+
+    if args.update_baseline:
+        with open(baseline_path, 'w', encoding='utf-8') as f:
+            json.dump(dict(meta=report["meta"], results=results), f, ensure_ascii=False, indent=2)
+            f.write('\n')
+        print(f"\n✅ 基线已写入 {baseline_path}", file=sys.stderr)
+
+    return 1 if args.check and regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+##;gen_transcript: 生成可复现的合成会话 JSONL（Claude 会话格式），用于 hooks 基准测试
+##;用法:
+##;  python3 benchmarks/gen_transcript.py -o /tmp/t.jsonl --lines 100000
+##;  python3 benchmarks/gen_transcript.py -o /tmp/t.jsonl --lines 1000 \
+##;      --tool-mix Read=5,Bash=3,Grep=2,WebFetch=1 --result-size 4096 --cjk 0.5 --emoji 0.1
+##;
+##;同样的参数 + --seed 得到逐字节相同的文件（时间戳由行号推算，不依赖当前时间）
+##;每轮对话: 用户提问 → 助手文本 + 若干 tool_use → tool_result → 助手回答，
+##;另混入少量 system 行（hooks 会过滤掉这些行，但需要读过）
+"""
+
+import argparse
+import json
+import random
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterator
+
+DEFAULT_TOOL_MIX = "Read=5,Bash=3,Grep=2,Edit=2,WebFetch=1,Task=1"
+DEFAULT_RESULT_SIZE = 2048
+DEFAULT_SEED = 20260101
+SESSION_ID = "5e55104d-0000-4000-8000-00000000be4c"
+START_TIME = datetime(2026, 1, 1, 9, 0, 0)
+
+ASCII_WORDS = ("parse", "render", "index", "cache", "session", "history", "commit", "hook",
+               "transcript", "buffer", "token", "stream", "config", "module", "error", "value")
+CJK_WORDS = ("解析", "渲染", "索引", "缓存", "会话", "历史", "提交", "钩子",
+             "对话记录", "缓冲区", "配置", "模块", "错误", "数值", "性能", "优化")
+EMOJIS = ("✅", "🚀", "📄", "🌐", "🤖", "⚠️", "🔥", "💡", "👨‍💻", "🇨🇳")
+
+
+def parse_tool_mix(spec: str) -> Dict[str, int]:
+    """解析 'Read=5,Bash=3' 为 {工具名: 权重}"""
+    mix = {}
+    for part in spec.split(','):
+        name, _, weight = part.strip().partition('=')
+        if name:
+            mix[name] = int(weight or 1)
+    if not mix or sum(mix.values()) <= 0:
+        raise ValueError(f"无效的 tool mix: {spec!r}")
+    return mix
+
+
+class TranscriptGenerator:
+    """##;按行产出合成会话记录（dict），行数精确等于 lines"""
+
+    def __init__(self, lines: int, tool_mix: str = DEFAULT_TOOL_MIX,
+                 result_size: int = DEFAULT_RESULT_SIZE, cjk: float = 0.3, emoji: float = 0.05,
+                 tools_per_turn: int = 2, seed: int = DEFAULT_SEED):
+        self.lines = lines
+        self.mix = parse_tool_mix(tool_mix)
+        self.result_size = result_size
+        self.cjk = cjk
+        self.emoji = emoji
+        self.tools_per_turn = max(tools_per_turn, 1)
+        self.rng = random.Random(seed)
+        self._tool_names = list(self.mix)
+        self._tool_weights = list(self.mix.values())
+        self._line_no = 0
+
+    def text(self, words: int) -> str:
+        """生成混合中英文/emoji 的文本"""
+        rng = self.rng
+        out = []
+        for _ in range(words):
+            r = rng.random()
+            if r < self.emoji:
+                out.append(rng.choice(EMOJIS))
+            elif r < self.emoji + self.cjk:
+                out.append(rng.choice(CJK_WORDS))
+            else:
+                out.append(rng.choice(ASCII_WORDS))
+        return ' '.join(out)
+
+    def result_text(self) -> str:
+        """生成工具结果文本，长度在 result_size 的 0.5~1.5 倍之间，夹带 URL"""
+        rng = self.rng
+        target = int(self.result_size * rng.uniform(0.5, 1.5))
+        parts, size = [], 0
+        while size < target:
+            if rng.random() < 0.05:
+                line = f"see https://example.com/docs/{rng.randrange(1000)}#{rng.choice(ASCII_WORDS)}"
+            else:
+                line = f"{rng.randrange(10000):>5}  {self.text(8)}"
+            parts.append(line)
+            size += len(line) + 1
+        return '\n'.join(parts)
+
+    def tool_input(self, name: str, idx: int) -> Dict:
+        """按工具类型生成 tool_use 的 input"""
+        rng = self.rng
+        if name in ("Read", "Edit", "Write"):
+            data = {"file_path": f"/repo/src/pkg_{idx % 50}/mod_{rng.randrange(200)}.py"}
+            if name == "Edit":
+                data.update(old_string=self.text(6), new_string=self.text(6))
+            return data
+        if name == "Bash":
+            return {"command": f"python -m pytest -q tests/test_{rng.randrange(100)}.py",
+                    "description": self.text(4)}
+        if name == "Grep":
+            return {"pattern": rng.choice(ASCII_WORDS), "path": "/repo/src"}
+        if name in ("WebFetch", "WebSearch"):
+            return {"url": f"https://example.com/article/{rng.randrange(5000)}", "prompt": self.text(6)}
+        if name == "Task":
+            return {"subagent_type": rng.choice(("Explore", "Plan", "general-purpose")),
+                    "prompt": self.text(10)}
+        return {"arg": self.text(4)}
+
+    def _record(self, record_type: str, message: Dict = None, **extra) -> Dict:
+        ##; 时间戳由行号推算，保证可复现
+        ts = START_TIME + timedelta(seconds=self._line_no)
+        self._line_no += 1
+        record = {"type": record_type, "sessionId": SESSION_ID,
+                  "timestamp": ts.strftime('%Y-%m-%dT%H:%M:%S.000Z'), "uuid": f"{self._line_no:08x}"}
+        if message is not None:
+            record["message"] = message
+        record.update(extra)
+        return record
+
+    def _turn(self, turn: int) -> Iterator[Dict]:
+        """一轮对话的全部行"""
+        rng = self.rng
+        yield self._record("user", {"role": "user", "content": f"第 {turn} 轮: {self.text(12)}"})
+        if turn % 25 == 0:
+            yield self._record("system", content=self.text(6), level="info")
+        calls = rng.choices(self._tool_names, self._tool_weights, k=rng.randint(1, self.tools_per_turn))
+        for k, name in enumerate(calls):
+            tool_id = f"toolu_{turn:06d}_{k}"
+            yield self._record("assistant", {"role": "assistant", "model": "bench-model", "content": [
+                {"type": "text", "text": self.text(10)},
+                {"type": "tool_use", "id": tool_id, "name": name, "input": self.tool_input(name, turn)},
+            ]})
+            result = self.result_text()
+            yield self._record("user", {"role": "user", "content": [
+                {"type": "tool_result", "tool_use_id": tool_id, "content": result},
+            ]}, toolUseResult={"tool_use_id": tool_id, "content": [{"type": "text", "text": result}]})
+        yield self._record("assistant", {"role": "assistant", "model": "bench-model", "content": [
+            {"type": "text", "text": f"{self.text(30)}\n\n```python\ndef f_{turn}():\n    return {turn}\n```"},
+        ]})
+
+    def __iter__(self) -> Iterator[Dict]:
+        turn, count = 0, 0
+        while True:
+            for record in self._turn(turn):
+                if count >= self.lines:
+                    return
+                count += 1
+                yield record
+            turn += 1
+
+
+def write_transcript(path, lines: int, **kwargs) -> Path:
+    """流式写出合成会话文件（1M 行也不占用大量内存）"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        for record in TranscriptGenerator(lines, **kwargs):
+            f.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')))
+            f.write('\n')
+    return path
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='生成可复现的合成会话 JSONL')
+    parser.add_argument('-o', '--output', required=True, help='输出文件路径')
+    parser.add_argument('--lines', type=int, default=1000, help='总行数（默认: 1000）')
+    parser.add_argument('--tool-mix', default=DEFAULT_TOOL_MIX, help=f'工具权重（默认: {DEFAULT_TOOL_MIX}）')
+    parser.add_argument('--tools-per-turn', type=int, default=2, help='每轮最多工具调用数（默认: 2）')
+    parser.add_argument('--result-size', type=int, default=DEFAULT_RESULT_SIZE,
+                        help=f'工具结果平均字节数（默认: {DEFAULT_RESULT_SIZE}）')
+    parser.add_argument('--cjk', type=float, default=0.3, help='中文词比例（默认: 0.3）')
+    parser.add_argument('--emoji', type=float, default=0.05, help='emoji 比例（默认: 0.05）')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help='随机种子')
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    path = write_transcript(args.output, args.lines, tool_mix=args.tool_mix, result_size=args.result_size,
+                           cjk=args.cjk, emoji=args.emoji, tools_per_turn=args.tools_per_turn, seed=args.seed)
+    print(f"{path}: {args.lines} 行, {path.stat().st_size / 1024 / 1024:.1f} MB", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Unit tests for gen_transcript.py and bench_hist_hooks.py
+
+Tests:
+1. Exact line count and byte-identical output for the same seed
+2. Generated transcript parses through the hooks and contains CJK/emoji and the tool mix
+3. Benchmark run writes and compares against a baseline
+"""
+
+import json
+import shutil
+import sys
+import tempfile
+import unittest
+from contextlib import redirect_stderr, redirect_stdout
+from io import StringIO
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR))
+
+import bench_hist_hooks  # noqa: E402
+import gen_transcript  # noqa: E402
+from zco_hist_common import parse_transcript  # noqa: E402
+
+
+class TestGenTranscript(unittest.TestCase):
+    """Test suite for the synthetic transcript generator and benchmark"""
+
+    def setUp(self):
+        """Create temporary test directory"""
+        self.test_dir = Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        """Clean up temporary files"""
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_01_lines_and_reproducible(self):
+        a = gen_transcript.write_transcript(self.test_dir / "a.jsonl", 257, seed=7)
+        b = gen_transcript.write_transcript(self.test_dir / "b.jsonl", 257, seed=7)
+        c = gen_transcript.write_transcript(self.test_dir / "c.jsonl", 257, seed=8)
+        self.assertEqual(len(a.read_bytes().splitlines()), 257)
+        self.assertEqual(a.read_bytes(), b.read_bytes())
+        self.assertNotEqual(a.read_bytes(), c.read_bytes())
+
+    def test_02_parses_through_hooks(self):
+        path = gen_transcript.write_transcript(self.test_dir / "t.jsonl", 500, tool_mix="Read=1,WebFetch=1",
+                                               cjk=0.5, emoji=0.2)
+        messages = parse_transcript(str(path))
+        ##; system 行被过滤，其余都是 user/assistant
+        self.assertTrue(0 < len(messages) < 500)
+        text = path.read_text(encoding="utf-8")
+        self.assertTrue(any(w in text for w in gen_transcript.CJK_WORDS))
+        self.assertTrue(any(e in text for e in gen_transcript.EMOJIS))
+        tools = {item["name"] for m in messages if m["type"] == "assistant"
+                 for item in m["message"]["content"] if item.get("type") == "tool_use"}
+        self.assertEqual(tools, {"Read", "WebFetch"})
+
+    def test_03_bench_baseline(self):
+        baseline = self.test_dir / "baseline.json"
+        argv = ["--sizes", "100", "--repeat", "1", "--cache-dir", str(self.test_dir), "--baseline", str(baseline)]
+        with redirect_stdout(StringIO()), redirect_stderr(StringIO()):
+            self.assertEqual(bench_hist_hooks.main(argv + ["--update-baseline"]), 0)
+        stages = json.loads(baseline.read_text(encoding="utf-8"))["results"]["100"]["stages"]
+        self.assertEqual(set(stages), set(bench_hist_hooks.STAGES))
+
+        ##; 把基线改成极小值，--check 应报告回归
+        data = json.loads(baseline.read_text(encoding="utf-8"))
+        for stage in data["results"]["100"]["stages"].values():
+            stage["median_ms"] = 1e-6
+        baseline.write_text(json.dumps(data), encoding="utf-8")
+        out = StringIO()
+        with redirect_stdout(out), redirect_stderr(StringIO()):
+            self.assertEqual(bench_hist_hooks.main(argv + ["--check", "--json"]), 1)
+        self.assertEqual(len(json.loads(out.getvalue())["regressions"]), len(bench_hist_hooks.STAGES))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Unit tests for zco_claude_init.py
+
+Tests:
+1. percentile uses the nearest-rank definition
+2. hooks bench summary: p50/p95/max, CPU mean, peak RSS and failures on a fixed sample
+3. hooks capture --index parsing rejects non-integers with an error instead of a traceback
+"""
+
+import subprocess
+import sys
+import unittest
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(ROOT_DIR))
+
+from zco_claude_init import parse_index_list, percentile, summarize_bench_samples  # noqa: E402
+
+
+class TestZcoClaudeInit(unittest.TestCase):
+    """Test suite for the zco-claude CLI helpers"""
+
+    def test_01_percentile(self):
+        self.assertEqual(percentile(list(range(1, 101)), 95), 95)
+        self.assertEqual(percentile(list(range(1, 101)), 100), 100)
+        self.assertEqual(percentile([1, 2], 50), 1)
+        self.assertEqual(percentile(list(range(1, 7)), 50), 3)
+        self.assertEqual(percentile([7], 99), 7)
+        self.assertEqual(percentile([1, 2, 3], 0), 1)
+        self.assertEqual(percentile([], 50), 0.0)
+
+    def test_02_bench_summary(self):
+        walls = [40.0, 10.0, 30.0, 20.0]
+        samples = [dict(wall_ms=w, cpu_ms=w / 2, maxrss_kb=1000 + i, returncode=int(w == 30.0))
+                   for i, w in enumerate(walls)]
+        self.assertEqual(summarize_bench_samples(samples),
+                         dict(wall_p50=20.0, wall_p95=40.0, wall_max=40.0, cpu_mean=12.5,
+                              maxrss_kb=1003, failures=1))
+        self.assertEqual(summarize_bench_samples(samples[:1])["wall_p50"], 40.0)
+
+    def test_03_capture_index(self):
+        self.assertEqual(parse_index_list("3,5"), [3, 5])
+        self.assertEqual(parse_index_list(" 3, ,0 "), [3, 0])
+        for bad in ("3,x", "-1", "1.5"):
+            with self.assertRaises(ValueError):
+                parse_index_list(bad)
+        proc = subprocess.run([sys.executable, str(ROOT_DIR / "zco_claude_init.py"), "hooks", "capture", "extract",
+                               "--index", "3,x"], capture_output=True, text=True)
+        self.assertEqual(proc.returncode, 1)
+        self.assertIn("--index", proc.stdout)
+        self.assertNotIn("Traceback", proc.stderr)
+
+
+if __name__ == '__main__':
+    unittest.main()
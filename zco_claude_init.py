@@ -28,6 +28,7 @@ import shutil
 import difflib
 import subprocess
 import hashlib
+import math
 from datetime import datetime
 from pathlib import Path
 
@@ -38,6 +39,35 @@ ZCO_CLAUDE_TPL_DIR = Path(ZCO_CLAUDE_ROOT) / "ClaudeSettings"
 ZCO_CLAUDE_IGNORE_FILE = ZCO_CLAUDE_TPL_DIR / "DOT.claudeignore"
 ZCO_CLAUDE_RECORD_FILE = Path.home() / ".claude" / "zco-linked-projects.json"
 ZCO_CLAUDE_CONFIG_FILE = Path.home() / ".claude" / "settings.json"
+ZCO_HIST_HOME_ROOT = Path.home() / ".claude" / "zco_hist"
+##; hist home 标记文件, 记录该目录属于哪个 Git 根目录
+ZCO_HIST_HOME_MARKER = ".zco_hist_home.json"
+##; 孤立 hist home 的归档目录 (以 _. 开头的条目不视为 hist home)
+ZCO_HIST_ARCHIVE_DIR = ZCO_HIST_HOME_ROOT / "_.archive"
+##; Claude 保存原始会话 JSONL 的目录: ~/.claude/projects/<编码后的项目路径>/<session_id>.jsonl
+CLAUDE_PROJECTS_DIR = Path.home() / ".claude" / "projects"
+##; hist rebuild 使用的渲染器: 类型 -> (hooks 模块名, 保存函数名)
+HIST_RENDERERS = {
+    "spec": ("save_chat_spec", "save_conversation"),
+    "plain": ("save_chat_plain", "save_simple_conversation"),
+    "cli_style": ("save_chat_cli_style", "save_conversation"),
+}
+##; hooks 分阶段耗时记录 (ZCO_HOOK_METRICS=1 时由 hooks 追加, 位于历史目录下)
+ZCO_HOOK_METRICS_FILE = "zco_hook_metrics.jsonl"
+##; 超过该文件数 (index 条目数, ZCO_GIT_ACCEL_MIN_FILES 覆盖) 的仓库, init 时建议开启 untracked cache / fsmonitor
+ZCO_GIT_ACCEL_MIN_FILES = 5000
+##; snapshot restore / rewind 前拍快照时等待 hook 释放 snapshot.lock 的秒数
+ZCO_SNAPSHOT_LOCK_WAIT = 30
+##; hist du 的目录统计缓存 (按目录 mtime 失效; 可原地追加的 other 类文件每次重新 stat)
+ZCO_HIST_DU_CACHE_FILE = ZCO_HIST_HOME_ROOT / "_.du_cache.json"
+ZCO_HIST_DU_CACHE_VERSION = 2
+##; 历史文件类型: 按文件名后缀识别 (压缩文件先去掉 .gz/.zst)
+HIST_FILE_TYPES = (
+    ("_spec_resources.txt", "resources"),
+    ("_spec.md", "spec"),
+    ("_plain.md", "plain"),
+    ("_cli_style.md", "cli_style"),
+)
 
 class M_Color:
     """
@@ -997,6 +1027,85 @@ def merge_unique(ary1, ary2, ary3):
     return merged, stats
 
 
+def git_index_entries(git_dir):
+    """读取 index 文件头中的条目数 (DIRC + 版本 + 条目数), 不启动 git 进程; 读取失败返回 0"""
+    try:
+        with open(Path(git_dir) / "index", 'rb') as f:
+            header = f.read(12)
+    except OSError:
+        return 0
+    if len(header) < 12 or header[:4] != b'DIRC':
+        return 0
+    return int.from_bytes(header[8:12], 'big')
+
+
+def time_git_status(toplevel, untracked_mode, runs=3):
+    """运行 git status (与自动提交 hook 相同的参数) runs 次, 返回耗时中位数 (毫秒)"""
+    import statistics
+    import time
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(['git', '-C', str(toplevel), 'status', '--porcelain=v2', '-z',
+                        f'--untracked-files={untracked_mode}'], capture_output=True)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def init_git_accel(target_path):
+    """
+    大仓库: 建议开启 core.untrackedCache 和 core.fsmonitor (内置 daemon, 需要 git 编译支持), 并报告前后耗时
+
+    自动提交 hook 读取 .git/config 检测这两项: untracked cache 开启时改用 --untracked-files=normal.
+    非交互运行时由 ZCO_GIT_ACCEL=yes|no 决定, 未设置则跳过.
+    """
+    _rebuild_worker_init(str(ZCO_CLAUDE_TPL_DIR / "hooks"))
+    from git_auto_commit import repo_accel, repo_info
+
+    info = repo_info(str(target_path))
+    if info is None:
+        return
+    git_dir, toplevel, _ = info
+    try:
+        min_files = int(os.environ.get('ZCO_GIT_ACCEL_MIN_FILES', ZCO_GIT_ACCEL_MIN_FILES))
+    except ValueError:
+        min_files = ZCO_GIT_ACCEL_MIN_FILES
+    entries = git_index_entries(git_dir)
+    if entries < min_files:
+        return
+    accel = repo_accel(toplevel)
+    build = subprocess.run(['git', 'version', '--build-options'], capture_output=True, text=True).stdout
+    fsmonitor_supported = 'fsmonitor--daemon' in build
+    wanted = [key for key, on in (('core.untrackedCache', not accel['untracked_cache']),
+                                  ('core.fsmonitor', fsmonitor_supported and not accel['fsmonitor'])) if on]
+    if not wanted:
+        pf_color(f"  ✔️  大仓库加速已开启 ({entries} 个文件): untrackedCache={accel['untracked_cache']}, "
+                 f"fsmonitor={accel['fsmonitor']}", M_Color.GREEN)
+        return
+
+    print(f"\n仓库有 {entries} 个文件 (≥ {min_files}), 自动提交 hook 的 git status 会扫描整个工作区")
+    if not fsmonitor_supported:
+        print("    (当前 git 不支持内置 fsmonitor daemon, 只开启 untracked cache)")
+    answer = os.environ.get('ZCO_GIT_ACCEL', '').strip().lower()
+    if not answer:
+        if not sys.stdin.isatty():
+            pf_color("    跳过: 非交互运行 (设置 ZCO_GIT_ACCEL=yes 开启)", M_Color.YELLOW)
+            return
+        answer = input(f"    是否开启 {', '.join(wanted)}？(y/N): ").strip().lower()
+    if answer not in ('y', 'yes', '1', 'true'):
+        pf_color("    跳过大仓库加速", M_Color.YELLOW)
+        return
+
+    before = time_git_status(toplevel, 'all')
+    for key in wanted:
+        subprocess.run(['git', '-C', toplevel, 'config', key, 'true'], check=False)
+    ##; 预热: 首次 status 写入 untracked cache 扩展并启动 fsmonitor daemon
+    time_git_status(toplevel, 'normal', runs=2)
+    after = time_git_status(toplevel, 'normal')
+    pf_color(f"  ✅ 已开启 {', '.join(wanted)}; git status: {before:.0f}ms → {after:.0f}ms "
+             f"({before / max(after, 0.001):.1f}x)", M_Color.GREEN)
+
+
 def init_claudeignore(target_path):
     """
     为目标项目创建 .claudeignore 文件
@@ -1174,12 +1283,1302 @@ def make_hist_home(project_dir: Path = None) -> Path:
     git_root = get_git_root(project_dir)
     git_root_hash = hashlib.md5(str(git_root).encode()).hexdigest()[:8]
     git_name = git_root.name + '.' + git_root_hash
-    base_dir = Path.home() / ".claude" / 'zco_hist' / git_name
+    base_dir = ZCO_HIST_HOME_ROOT / git_name
     # base_dir.mkdir(exist_ok=True)
     os.makedirs(str(base_dir), exist_ok=True)
+    write_hist_home_marker(base_dir, git_root)
     return base_dir
 
 
+def write_hist_home_marker(hist_home: Path, git_root: Path):
+    """写入 hist home 标记文件 (已存在且指向同一 Git 根目录时跳过)"""
+    marker = hist_home / ZCO_HIST_HOME_MARKER
+    if read_hist_home_marker(hist_home).get("git_root") == str(git_root):
+        return
+    data = dict(git_root=str(git_root), created_time=datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+    tmp_file = marker.with_name(marker.name + f".{os.getpid()}.tmp")
+    try:
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_file, marker)
+    except OSError as e:
+        pf_color(f"警告：写入 hist home 标记失败 {marker}: {e}", M_Color.YELLOW)
+
+
+def read_hist_home_marker(hist_home: Path) -> dict:
+    """读取 hist home 标记文件, 不存在或损坏时返回空字典"""
+    try:
+        with open(hist_home / ZCO_HIST_HOME_MARKER, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def iter_dir_files(root: Path):
+    """
+    用 os.scandir 递归遍历目录下的普通文件 (不跟随软链接)
+
+    Yields:
+        (os.DirEntry, os.stat_result)
+    """
+    stack = [str(root)]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            yield entry, entry.stat(follow_symlinks=False)
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+
+
+def dir_usage(root: Path) -> tuple:
+    """统计目录占用 (字节数, 文件数)"""
+    total_bytes, total_files = 0, 0
+    for _, st in iter_dir_files(root):
+        total_bytes += st.st_size
+        total_files += 1
+    return total_bytes, total_files
+
+
+def format_size(size: int) -> str:
+    """字节数转为可读格式"""
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f"{size} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+def list_hist_homes(hist_root: Path = ZCO_HIST_HOME_ROOT) -> list:
+    """列出所有 hist home 目录 (跳过 _. 开头的状态文件和归档目录)"""
+    if not hist_root.is_dir():
+        return []
+    homes = []
+    with os.scandir(hist_root) as it:
+        for entry in it:
+            if entry.name.startswith('_.') or not entry.is_dir(follow_symlinks=False):
+                continue
+            homes.append(Path(entry.path))
+    return sorted(homes)
+
+
+def load_linked_targets(record_file: Path = ZCO_CLAUDE_RECORD_FILE) -> dict:
+    """
+    读取已链接项目, 按 hist home 目录名索引
+
+    Returns:
+        dict: {hist_home_name: target_path}
+    """
+    try:
+        with open(record_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+    targets = {}
+    for item in data.get("linked-projects", []):
+        if isinstance(item, dict):
+            target_path = item.get("target_path")
+            hist_home = item.get("zco_hist_home")
+        elif isinstance(item, (list, tuple)) and item:
+            target_path, hist_home = item[0], None
+        else:
+            continue
+        if not target_path:
+            continue
+        if hist_home:
+            targets[Path(hist_home).name] = target_path
+        name_hash = hashlib.md5(str(target_path).encode()).hexdigest()[:8]
+        targets[Path(target_path).name + '.' + name_hash] = target_path
+    return targets
+
+
+def classify_hist_home(hist_home: Path, linked_targets: dict) -> tuple:
+    """
+    判断 hist home 是否孤立
+
+    Returns:
+        (status, project_path, reason): status 为 active / orphan / unknown
+    """
+    marker = read_hist_home_marker(hist_home)
+    git_root = marker.get("git_root") or linked_targets.get(hist_home.name)
+    if not git_root:
+        return "unknown", "", "无标记文件且不在链接记录中"
+
+    root = Path(git_root)
+    if not root.exists():
+        return "orphan", git_root, "项目目录不存在"
+
+    link = root / '_.zco_hist'
+    if link.is_symlink():
+        try:
+            if link.resolve() != hist_home.resolve():
+                return "orphan", git_root, f"项目已使用其他 hist home: {link.resolve()}"
+        except OSError:
+            pass
+    return "active", git_root, ""
+
+
+def archive_hist_home(hist_home: Path, archive_dir: Path = ZCO_HIST_ARCHIVE_DIR) -> Path:
+    """把 hist home 打包为 tar.gz 后删除原目录, 返回归档文件路径"""
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    base_name = archive_dir / f"{hist_home.name}.{datetime.now().strftime('%y%m%d_%H%M%S')}"
+    archive = shutil.make_archive(str(base_name), 'gztar', root_dir=str(hist_home.parent),
+                                  base_dir=hist_home.name)
+    shutil.rmtree(hist_home)
+    return Path(archive)
+
+
+def hist_file_type(name: str) -> str:
+    """按文件名判断历史文件类型: spec / plain / cli_style / resources / other"""
+    for suffix in ('.gz', '.zst'):
+        if name.endswith(suffix):
+            name = name[:-len(suffix)]
+            break
+    for suffix, file_type in HIST_FILE_TYPES:
+        if name.endswith(suffix):
+            return file_type
+    return "other"
+
+
+def hist_file_month(name: str, mtime: float) -> str:
+    """文件所属月份: 优先取文件名中的 log_YYMMDD, 否则用修改时间"""
+    if name.startswith('log_') and name[4:10].isdigit():
+        return f"20{name[4:6]}-{name[6:8]}"
+    return datetime.fromtimestamp(mtime).strftime('%Y-%m')
+
+
+def scan_dir_du(path: str, cache: dict, fresh: dict):
+    """
+    统计单个目录 (递归) 按 类型/月份 的 字节数和文件数
+
+    目录 mtime 未变化时复用 cache 中该目录的统计, 只对子目录递归 stat.
+    对话记录 (spec/plain/cli_style/resources) 以临时文件 + rename 写入, 变化必然更新目录 mtime, 可以缓存;
+    other 类文件 (zco_sessions.jsonl / 耗时记录 / 采集 / 轮次索引等) 会原地追加而不改目录 mtime,
+    缓存中只记文件名, 每次重新 stat.
+    新的目录统计写入 fresh (供主线程合并后保存).
+
+    Returns:
+        dict: {type: {month: [bytes, files]}}
+    """
+    result = {}
+
+    def merge(stats):
+        for file_type, months in stats.items():
+            bucket = result.setdefault(file_type, {})
+            for month, (size, count) in months.items():
+                acc = bucket.setdefault(month, [0, 0])
+                acc[0] += size
+                acc[1] += count
+
+    def add(stats, name, st):
+        months = stats.setdefault(hist_file_type(name), {})
+        acc = months.setdefault(hist_file_month(name, st.st_mtime), [0, 0])
+        acc[0] += st.st_size
+        acc[1] += 1
+
+    stack = [path]
+    while stack:
+        current = stack.pop()
+        try:
+            mtime_ns = os.stat(current).st_mtime_ns
+        except OSError:
+            continue
+        cached = cache.get(current)
+        live_stats = {}
+        if cached and cached.get("mtime_ns") == mtime_ns:
+            entry = cached
+            for name in entry["live"]:
+                try:
+                    add(live_stats, name, os.stat(os.path.join(current, name), follow_symlinks=False))
+                except OSError:
+                    continue
+        else:
+            stats, dirs, live = {}, [], []
+            try:
+                with os.scandir(current) as it:
+                    for item in it:
+                        try:
+                            if item.is_dir(follow_symlinks=False):
+                                dirs.append(item.name)
+                                continue
+                            if not item.is_file(follow_symlinks=False):
+                                continue
+                            st = item.stat(follow_symlinks=False)
+                        except OSError:
+                            continue
+                        if hist_file_type(item.name) == "other":
+                            live.append(item.name)
+                            add(live_stats, item.name, st)
+                        else:
+                            add(stats, item.name, st)
+            except OSError:
+                continue
+            entry = dict(mtime_ns=mtime_ns, dirs=dirs, stats=stats, live=live)
+        fresh[current] = entry
+        merge(entry["stats"])
+        merge(live_stats)
+        stack.extend(os.path.join(current, d) for d in entry["dirs"])
+    return result
+
+
+def load_du_cache(cache_file: Path = ZCO_HIST_DU_CACHE_FILE) -> dict:
+    """读取 hist du 缓存"""
+    try:
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        ##; 旧版本缓存没有 live 列表, 整体丢弃重新统计
+        if not isinstance(data, dict) or data.get("version") != ZCO_HIST_DU_CACHE_VERSION:
+            return {}
+        return data.get("dirs", {})
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def save_du_cache(dirs: dict, cache_file: Path = ZCO_HIST_DU_CACHE_FILE):
+    """保存 hist du 缓存 (先写临时文件再替换)"""
+    cache_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = cache_file.with_name(cache_file.name + f".{os.getpid()}.tmp")
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(dict(version=ZCO_HIST_DU_CACHE_VERSION, dirs=dirs), f, ensure_ascii=False)
+    os.replace(tmp_file, cache_file)
+
+
+def collect_hist_du(jobs=None, use_cache=True) -> dict:
+    """
+    并发统计所有 hist home 的占用
+
+    Returns:
+        dict: {total_bytes, total_files, projects: [...], by_type: {...}, by_month: {...}}
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    homes = list_hist_homes()
+    cache = load_du_cache() if use_cache else {}
+    jobs = jobs or min(8, (os.cpu_count() or 1) * 2)
+
+    def scan_home(home):
+        fresh = {}
+        return scan_dir_du(str(home), cache, fresh), fresh
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        results = list(pool.map(scan_home, homes))
+
+    projects, by_type, by_month = [], {}, {}
+    new_cache = {}
+    for home, (stats, fresh) in zip(homes, results):
+        new_cache.update(fresh)
+        p_type, p_month = {}, {}
+        for file_type, months in stats.items():
+            for month, (size, count) in months.items():
+                for table, key in ((p_type, file_type), (p_month, month),
+                                   (by_type, file_type), (by_month, month)):
+                    acc = table.setdefault(key, [0, 0])
+                    acc[0] += size
+                    acc[1] += count
+        projects.append(dict(
+            name=home.name,
+            hist_home=str(home),
+            project=read_hist_home_marker(home).get("git_root", ""),
+            bytes=sum(v[0] for v in p_type.values()),
+            files=sum(v[1] for v in p_type.values()),
+            by_type={k: dict(bytes=v[0], files=v[1]) for k, v in sorted(p_type.items())},
+            by_month={k: dict(bytes=v[0], files=v[1]) for k, v in sorted(p_month.items())},
+        ))
+
+    if homes:
+        try:
+            save_du_cache(new_cache)
+        except OSError as e:
+            pf_color(f"警告：保存 hist du 缓存失败: {e}", M_Color.YELLOW)
+
+    projects.sort(key=lambda p: p["bytes"], reverse=True)
+    return dict(
+        hist_root=str(ZCO_HIST_HOME_ROOT),
+        total_bytes=sum(p["bytes"] for p in projects),
+        total_files=sum(p["files"] for p in projects),
+        projects=projects,
+        by_type={k: dict(bytes=v[0], files=v[1]) for k, v in sorted(by_type.items())},
+        by_month={k: dict(bytes=v[0], files=v[1]) for k, v in sorted(by_month.items())},
+    )
+
+
+def cmd_hist_du(as_json=False, jobs=None, use_cache=True):
+    """
+    子命令: hist du - 统计对话历史占用 (按项目 / 类型 / 月份)
+
+    Args:
+        as_json: 输出 JSON (供清理策略等脚本使用)
+        jobs: 并发线程数
+        use_cache: 是否使用按目录 mtime 失效的缓存
+    """
+    usage = collect_hist_du(jobs=jobs, use_cache=use_cache)
+    quota_mb = os.environ.get('ZCO_HIST_QUOTA_MB', '').strip()
+    try:
+        quota_bytes = int(float(quota_mb) * 1024 * 1024) if quota_mb else None
+    except ValueError:
+        quota_bytes = None
+    if quota_bytes is not None:
+        usage["quota_bytes"] = quota_bytes
+        for p in usage["projects"]:
+            p["over_quota"] = p["bytes"] > quota_bytes
+
+    if as_json:
+        print(json.dumps(usage, ensure_ascii=False, indent=2))
+        return
+
+    pf_color("\n💾 对话历史占用\n", M_Color.CYAN)
+    pf_color(f"hist 根目录： {usage['hist_root']}\n", M_Color.GREEN)
+    if not usage["projects"]:
+        print("无 hist home 目录")
+        return
+
+    pf_color(f"{'大小':>10} {'文件数':>7}  项目", M_Color.CYAN)
+    pf_color("-" * 80, M_Color.CYAN)
+    for p in usage["projects"]:
+        over = p.get("over_quota")
+        pf_color(f"{format_size(p['bytes']):>10} {p['files']:>7}  {p['name']}"
+                 + ("  ⚠️ 超出配额" if over else ""), M_Color.RED if over else M_Color.GREEN)
+
+    for title, table in (("按类型", usage["by_type"]), ("按月份", usage["by_month"])):
+        pf_color(f"\n{title}:", M_Color.CYAN)
+        for key, v in table.items():
+            print(f"  {key:<12} {format_size(v['bytes']):>10} {v['files']:>7}")
+
+    pf_color(f"\n总计: {len(usage['projects'])} 个项目, {usage['total_files']} 个文件, "
+             f"{format_size(usage['total_bytes'])}")
+    if quota_bytes is not None:
+        pf_color(f"单项目配额 (ZCO_HIST_QUOTA_MB): {format_size(quota_bytes)}, "
+                 f"超出配额可在项目内执行 zco-clean --quota-mb {quota_mb}", M_Color.YELLOW)
+
+
+def claude_project_dir(project_path: Path) -> Path:
+    """Claude 存放该项目原始会话的目录 (路径中非字母数字字符替换为 -)"""
+    import re
+    return CLAUDE_PROJECTS_DIR / re.sub(r'[^A-Za-z0-9-]', '-', str(project_path))
+
+
+def discover_project_sessions(project_path: Path, hist_dir: Path) -> dict:
+    """
+    收集项目的原始会话: 会话索引 zco_sessions.jsonl + ~/.claude/projects/<编码路径>/*.jsonl
+
+    Returns:
+        dict: {session_id: transcript_path}
+    """
+    from zco_hist_common import load_sessions
+
+    sessions = {}
+    for session_id, record in load_sessions(hist_dir).items():
+        path = Path(record.get("transcript_path", ""))
+        if path.is_file():
+            sessions[session_id] = path
+    claude_dir = claude_project_dir(project_path)
+    if claude_dir.is_dir():
+        with os.scandir(claude_dir) as it:
+            for entry in it:
+                if entry.name.endswith('.jsonl') and entry.is_file():
+                    sessions.setdefault(entry.name[:-len('.jsonl')], Path(entry.path))
+    return sessions
+
+
+def _rebuild_worker_init(hooks_dir: str):
+    """hist rebuild 子进程初始化: 导入 hooks 渲染模块"""
+    if hooks_dir not in sys.path:
+        sys.path.insert(0, hooks_dir)
+
+
+def _rebuild_session(task: dict) -> dict:
+    """
+    hist rebuild 子进程任务: 用 hooks 的渲染器重新生成一个会话的历史文件
+
+    输出文件名和 mtime 使用 transcript 的 mtime, 重复执行会覆盖同名文件, 日期统计不受影响.
+    """
+    import contextlib
+    import importlib
+    import io
+    from zco_hist_common import hist_filename
+
+    transcript = task["transcript"]
+    mtime = os.stat(transcript).st_mtime
+    now = datetime.fromtimestamp(mtime)
+    hist_dir = Path(task["hist_dir"])
+    result = dict(session_id=task["session_id"], kinds=[], errors=[], bytes=os.path.getsize(transcript))
+    for kind in task["kinds"]:
+        module_name, func_name = HIST_RENDERERS[kind]
+        save = getattr(importlib.import_module(module_name), func_name)
+        log = io.StringIO()
+        with contextlib.redirect_stderr(log):
+            save(transcript, task["project"], task["session_id"], now=now, hist_dir=hist_dir)
+        outputs = [hist_dir / hist_filename(task["session_id"], kind, now=now)]
+        if kind == "spec":
+            outputs.append(hist_dir / hist_filename(task["session_id"], "spec_resources", ext=".txt", now=now))
+        if not outputs[0].exists():
+            result["errors"].append(f"{kind}: {log.getvalue().strip().splitlines()[-1:] or '未生成输出'}")
+            continue
+        for output in outputs:
+            if output.exists():
+                os.utime(output, (mtime, mtime))
+        result["kinds"].append(kind)
+    return result
+
+
+def cmd_hist_rebuild(project=None, since=None, jobs=None, kinds=None, force=False,
+                     record_file=None, tpl_dir=None):
+    """
+    子命令: hist rebuild - 用 hooks 渲染器从原始会话 JSONL 重新生成历史 Markdown
+
+    Args:
+        project: 项目路径, 默认重建所有已链接项目
+        since: 只处理该日期 (YYYY-MM-DD) 之后修改的会话
+        jobs: 并发进程数
+        kinds: 渲染类型列表 (spec / plain / cli_style), 默认全部
+        force: 忽略 "输出比 transcript 新则跳过" 的判断
+        record_file: 记录文件路径, 默认为 ZCO_CLAUDE_RECORD_FILE
+        tpl_dir: 模板目录 (提供 hooks 渲染器), 默认为 ZCO_CLAUDE_TPL_DIR
+    """
+    import time
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    hooks_dir = str(Path(tpl_dir or ZCO_CLAUDE_TPL_DIR) / "hooks")
+    _rebuild_worker_init(hooks_dir)
+    from zco_hist_common import ensure_dir, hist_dir_path, session_tag
+
+    kinds = kinds or list(HIST_RENDERERS)
+    try:
+        since_ts = datetime.strptime(since, "%Y-%m-%d").timestamp() if since else None
+    except ValueError:
+        pf_color(f"错误：--since 日期格式应为 YYYY-MM-DD: {since!r}", M_Color.RED)
+        return
+
+    targets = load_linked_targets(Path(record_file) if record_file else ZCO_CLAUDE_RECORD_FILE)
+    ##; 项目 -> 记录中的 hist home (load_linked_targets 先放入记录的 zco_hist_home, 再放入按路径推算的名字)
+    record_homes = {}
+    for name, target in targets.items():
+        record_homes.setdefault(str(Path(target)), ZCO_HIST_HOME_ROOT / name)
+    if project:
+        projects = [get_git_root(Path(project).resolve())]
+    else:
+        projects = sorted({Path(t) for t in targets.values()})
+
+    def rebuild_hist_dir(project_path: Path) -> Path:
+        """输出目录: 项目已有的历史目录 (通常是指向 hist home 的软链接), 否则直接写入 hist home, 不在项目内新建普通目录"""
+        link = hist_dir_path(project_path)
+        if link.is_symlink() or link.exists():
+            ensure_dir(link)
+            return link
+        home = record_homes.get(str(project_path))
+        if home is None:
+            return make_hist_home(project_path)
+        home.mkdir(parents=True, exist_ok=True)
+        write_hist_home_marker(home, project_path)
+        return home
+
+    pf_color("\n🔁 重建对话历史\n", M_Color.CYAN)
+    tasks, skipped = [], 0
+    for project_path in projects:
+        if not project_path.is_dir():
+            pf_color(f"  跳过不存在的项目: {project_path}", M_Color.YELLOW)
+            continue
+        hist_dir = rebuild_hist_dir(project_path)
+        ##; 已有输出按 (会话8位, 类型) 记录最新 mtime
+        latest = {}
+        with os.scandir(hist_dir) as it:
+            for entry in it:
+                name = entry.name
+                if not name.startswith('log_') or not name.endswith('.md'):
+                    continue
+                parts = name[:-3].split('_', 4)
+                if len(parts) == 5:
+                    key = (parts[3], parts[4])
+                    latest[key] = max(latest.get(key, 0), entry.stat().st_mtime)
+        count = 0
+        for session_id, transcript in sorted(discover_project_sessions(project_path, hist_dir).items()):
+            st = transcript.stat()
+            if since_ts is not None and st.st_mtime < since_ts:
+                continue
+            tag = session_tag(session_id)
+            todo = [k for k in kinds if force or latest.get((tag, k), 0) < st.st_mtime]
+            if not todo:
+                skipped += 1
+                continue
+            tasks.append(dict(session_id=session_id, transcript=str(transcript), project=str(project_path),
+                              hist_dir=str(hist_dir), kinds=todo))
+            count += 1
+        pf_color(f"  {project_path}: {count} 个会话待重建", M_Color.GREEN)
+
+    if not tasks:
+        pf_color(f"\n无需重建 (跳过 {skipped} 个已是最新的会话)")
+        return
+
+    jobs = jobs or os.cpu_count() or 1
+    start = time.monotonic()
+    done, failed, total_bytes = 0, 0, 0
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_rebuild_worker_init,
+                             initargs=(hooks_dir,)) as pool:
+        futures = [pool.submit(_rebuild_session, task) for task in tasks]
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                failed += 1
+                pf_color(f"  ✗ {e}", M_Color.RED)
+                continue
+            done += 1
+            total_bytes += result["bytes"]
+            for error in result["errors"]:
+                failed += 1
+                pf_color(f"  ✗ {result['session_id']} {error}", M_Color.RED)
+            if done % 20 == 0 or done == len(tasks):
+                elapsed = time.monotonic() - start
+                print(f"  [{done}/{len(tasks)}] {done / elapsed:.1f} 会话/秒, "
+                      f"{total_bytes / 1024 / 1024 / elapsed:.1f} MB/秒")
+
+    elapsed = time.monotonic() - start
+    pf_color(f"\n完成: 重建 {done} 个会话, 失败 {failed}, 跳过 {skipped}, "
+             f"读取 {format_size(total_bytes)}, 耗时 {elapsed:.1f}s ({jobs} 进程)")
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    """最近秩百分位 (输入需已排序)"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def load_hook_metrics(hist_dirs: list, days: int = 30) -> list:
+    """读取各历史目录下的 hook 耗时记录, 只保留最近 days 天 (0 表示全部)"""
+    cutoff = (datetime.now().timestamp() - days * 86400) if days else None
+    records = []
+    for hist_dir in hist_dirs:
+        metrics_file = Path(hist_dir) / ZCO_HOOK_METRICS_FILE
+        try:
+            f = open(metrics_file, 'r', encoding='utf-8')
+        except OSError:
+            continue
+        with f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    ts = datetime.strptime(record["time"], "%Y-%m-%d %H:%M:%S").timestamp()
+                    float(record["total_ms"])
+                except (ValueError, KeyError, TypeError):
+                    continue
+                if cutoff is not None and ts < cutoff:
+                    continue
+                record["project"] = Path(hist_dir).name
+                records.append(record)
+    return records
+
+
+def summarize_hook_metrics(records: list) -> dict:
+    """
+    按 (hook, event) 汇总耗时
+
+    Returns:
+        dict: {hooks: [{hook, event, count, p50, p95, p99, max, phases: {phase: p50},
+                        counters: {name: 合计}, counted_runs}],
+               daily: [{day, hook, count, p50, p95}]}
+    """
+    groups, daily = {}, {}
+    for r in records:
+        key = (r.get("hook", ""), r.get("event", ""))
+        groups.setdefault(key, []).append(r)
+        daily.setdefault((r["time"][:10], r.get("hook", "")), []).append(r["total_ms"])
+
+    hooks = []
+    for (hook, event), items in sorted(groups.items()):
+        totals = sorted(r["total_ms"] for r in items)
+        phase_values, counters, counted_runs = {}, {}, 0
+        for r in items:
+            for phase, ms in (r.get("phases") or {}).items():
+                phase_values.setdefault(phase, []).append(ms)
+            if r.get("counters"):
+                counted_runs += 1
+                for name, value in r["counters"].items():
+                    counters[name] = counters.get(name, 0) + value
+        hooks.append(dict(
+            hook=hook, event=event, count=len(totals),
+            p50=percentile(totals, 50), p95=percentile(totals, 95), p99=percentile(totals, 99),
+            max=totals[-1],
+            phases={k: percentile(sorted(v), 50) for k, v in phase_values.items()},
+            counters=counters, counted_runs=counted_runs,
+        ))
+
+    trend = []
+    for (day, hook), values in sorted(daily.items()):
+        values.sort()
+        trend.append(dict(day=day, hook=hook, count=len(values),
+                          p50=percentile(values, 50), p95=percentile(values, 95)))
+    return dict(hooks=hooks, daily=trend)
+
+
+def cmd_hook_stats(project=None, days=30, as_json=False):
+    """
+    子命令: hook-stats - 汇总 hooks 耗时 (需设置 ZCO_HOOK_METRICS=1 采集)
+
+    Args:
+        project: 只统计该项目, 默认统计所有 hist home
+        days: 统计最近 N 天, 0 表示全部
+        as_json: 输出 JSON
+    """
+    if project:
+        _rebuild_worker_init(str(ZCO_CLAUDE_TPL_DIR / "hooks"))
+        from zco_hist_common import hist_dir_path
+        hist_dirs = [hist_dir_path(get_git_root(Path(project).resolve()))]
+    else:
+        hist_dirs = list_hist_homes()
+    summary = summarize_hook_metrics(load_hook_metrics(hist_dirs, days))
+
+    if as_json:
+        print(json.dumps(summary, ensure_ascii=False, indent=2))
+        return
+
+    pf_color("\n⏱️  Hook 耗时统计 (ms)\n", M_Color.CYAN)
+    if not summary["hooks"]:
+        print("无耗时记录, 设置环境变量 ZCO_HOOK_METRICS=1 后 hooks 会记录到 _.zco_hist/zco_hook_metrics.jsonl")
+        return
+
+    pf_color(f"{'hook':<22} {'event':<18} {'次数':>6} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}", M_Color.CYAN)
+    pf_color("-" * 86, M_Color.CYAN)
+    for h in summary["hooks"]:
+        pf_color(f"{h['hook']:<22} {h['event']:<18} {h['count']:>6} {h['p50']:>8.1f} "
+                 f"{h['p95']:>8.1f} {h['p99']:>8.1f} {h['max']:>8.1f}")
+        if h["phases"]:
+            print(f"{'':<24}阶段 p50: " + ", ".join(f"{k}={v:.1f}" for k, v in h["phases"].items()))
+        if h["counters"]:
+            print(f"{'':<24}计数合计 ({h['counted_runs']}/{h['count']} 次运行): "
+                  + ", ".join(f"{k}={v:g}" for k, v in sorted(h["counters"].items())))
+
+    pf_color("\n按天趋势 (p50 / p95):", M_Color.CYAN)
+    for d in summary["daily"]:
+        print(f"  {d['day']}  {d['hook']:<22} {d['count']:>5} 次  {d['p50']:>8.1f} / {d['p95']:.1f}")
+
+
+def load_settings_layers(project_dir: Path) -> list:
+    """
+    读取生效的 settings 层 (低 -> 高): ~/.claude/settings.json, PROJECT/.claude/settings.json,
+    PROJECT/.claude/settings.local.json
+
+    Returns:
+        list: [(path, settings_dict)]
+    """
+    layers = []
+    for path in (ZCO_CLAUDE_CONFIG_FILE,
+                 project_dir / ".claude" / "settings.json",
+                 project_dir / ".claude" / "settings.local.json"):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            continue
+        if isinstance(data, dict):
+            layers.append((path, data))
+    return layers
+
+
+def collect_hook_commands(layers: list) -> tuple:
+    """
+    合并各层的 hooks (所有层的 hook 都会执行, 相同命令去重) 和 env (高优先级覆盖)
+
+    Returns:
+        (hooks, env): hooks 为 [(event, command, layer_path)]
+    """
+    hooks, env, seen = [], {}, set()
+    for path, data in layers:
+        env.update({k: str(v) for k, v in (data.get("env") or {}).items()})
+        for event, groups in (data.get("hooks") or {}).items():
+            for group in groups or []:
+                for hook in group.get("hooks", []) if isinstance(group, dict) else []:
+                    command = hook.get("command") if hook.get("type", "command") == "command" else None
+                    if command and (event, command) not in seen:
+                        seen.add((event, command))
+                        hooks.append((event, command, path))
+    return hooks, env
+
+
+def write_synthetic_transcript(path: Path, turns: int = 20):
+    """生成用于 bench 的合成会话 JSONL (每轮: 用户提问 + 工具调用 + 工具结果 + 回答)"""
+    lines = []
+    for i in range(turns):
+        ts = f"2026-01-01T00:{i // 60:02d}:{i % 60:02d}.000Z"
+        lines.append({"type": "user", "timestamp": ts,
+                      "message": {"role": "user", "content": f"第 {i} 轮: 请读取 src/mod_{i}.py 并解释"}})
+        lines.append({"type": "assistant", "timestamp": ts, "message": {"role": "assistant", "content": [
+            {"type": "text", "text": f"读取 mod_{i}.py"},
+            {"type": "tool_use", "id": f"t{i}", "name": "Read", "input": {"file_path": f"src/mod_{i}.py"}},
+        ]}})
+        lines.append({"type": "user", "timestamp": ts, "message": {"role": "user", "content": [
+            {"type": "tool_result", "tool_use_id": f"t{i}", "content": "def f():\n    return 1\n" * 20},
+        ]}})
+        lines.append({"type": "assistant", "timestamp": ts, "message": {"role": "assistant", "content": [
+            {"type": "text", "text": f"mod_{i}.py 定义了函数 f ✅ 参考 https://example.com/{i}"},
+        ]}})
+    path.write_text("\n".join(json.dumps(l, ensure_ascii=False) for l in lines) + "\n", encoding='utf-8')
+
+
+def synthetic_hook_payload(event: str, scratch_dir: Path, transcript: Path) -> dict:
+    """按事件类型生成合成的 hook 输入"""
+    payload = dict(hook_event_name=event, session_id="00000000-bench-4000-8000-000000000000",
+                   transcript_path=str(transcript), cwd=str(scratch_dir))
+    if event == "UserPromptSubmit":
+        payload["prompt"] = "bench prompt"
+    elif event in ("PreToolUse", "PostToolUse"):
+        payload.update(tool_name="Read", tool_input={"file_path": str(scratch_dir / "README.md")})
+        if event == "PostToolUse":
+            payload["tool_response"] = {"content": "bench"}
+    elif event == "SessionStart":
+        payload["source"] = "startup"
+    elif event == "Notification":
+        payload["message"] = "bench notification"
+    elif event in ("Stop", "SubagentStop"):
+        payload["stop_hook_active"] = False
+    return payload
+
+
+def load_bench_payloads(project_dir: Path) -> dict:
+    """
+    读取 debug_hook.py 采集的 hook 输入: hook_debug_<event>.json 的 full_input,
+    以及环形采集文件 hook_capture_<event>.jsonl 中每个事件最新的一条 (优先)
+
+    快照文件固定写在 <root>/_.zco_hist, 环形采集按 ZCO_CHAT_SAVE_DIR 定位 (与 debug_hook.py 一致)
+
+    Returns:
+        dict: {event: payload}
+    """
+    _rebuild_worker_init(str(ZCO_CLAUDE_TPL_DIR / "hooks"))
+    from zco_hist_common import hist_dir_path, iter_captures
+
+    payloads = {}
+    for debug_file in (project_dir / '_.zco_hist').glob("hook_debug_*.json"):
+        try:
+            with open(debug_file, 'r', encoding='utf-8') as f:
+                payload = json.load(f).get("full_input")
+        except (OSError, json.JSONDecodeError, AttributeError):
+            continue
+        if isinstance(payload, dict) and payload.get("hook_event_name"):
+            payloads[payload["hook_event_name"]] = payload
+
+    for record in iter_captures(hist_dir_path(project_dir)):
+        payload = record.get("input")
+        if isinstance(payload, dict) and record.get("event"):
+            payloads[record["event"]] = dict(payload, hook_event_name=record["event"])
+    return payloads
+
+
+def parse_index_list(text: str) -> list:
+    """解析逗号分隔的记录序号 (如 "3,5"); 含非整数或负数时抛出 ValueError"""
+    indexes = [int(x) for x in text.split(',') if x.strip()]
+    if any(i < 0 for i in indexes):
+        raise ValueError(text)
+    return indexes
+
+
+def cmd_hooks_capture(action, project=None, event=None, session=None, limit=20, indexes=None,
+                      output=None, as_json=False):
+    """
+    子命令: hooks capture list|extract - 查看 debug_hook 环形采集的事件
+
+    Args:
+        action: list 列出记录; extract 输出记录的 hook 输入 (可直接用于 hooks bench 或手工重放)
+        project: 项目路径, 默认当前 Git 仓库
+        event: 只看该事件
+        session: 只看 session_id 以此开头的记录
+        limit: 只取最近 N 条 (0 为全部)
+        indexes: extract 指定的序号列表 (list 输出的 #)
+        output: extract 输出目录, 每条记录一个 JSON 文件; 不指定时逐行输出到 stdout
+        as_json: list 输出 JSON
+    """
+    _rebuild_worker_init(str(ZCO_CLAUDE_TPL_DIR / "hooks"))
+    from zco_hist_common import hist_dir_path, iter_captures, list_capture_events
+
+    project_dir = get_git_root(Path(project).resolve() if project else None)
+    hist_dir = hist_dir_path(project_dir)
+    if not hist_dir.is_dir() or not list_capture_events(hist_dir):
+        pf_color(f"未找到采集记录: {hist_dir}/hook_capture_*.jsonl (设置 ZCO_HOOK_CAPTURE=ring 启用)",
+                 M_Color.YELLOW)
+        return
+
+    records = [(i, r) for i, r in enumerate(iter_captures(hist_dir, event))
+               if not session or str(r.get("session_id", "")).startswith(session)]
+    if indexes:
+        wanted = set(indexes)
+        records = [(i, r) for i, r in records if i in wanted]
+    elif limit:
+        records = records[-limit:]
+
+    if action == 'extract':
+        if output:
+            out_dir = Path(output)
+            out_dir.mkdir(parents=True, exist_ok=True)
+            for i, r in records:
+                path = out_dir / f"capture_{i:05d}_{r.get('event', 'unknown')}.json"
+                with open(path, 'w', encoding='utf-8') as f:
+                    json.dump(r.get("input", {}), f, ensure_ascii=False, indent=2)
+            pf_color(f"✅ 已导出 {len(records)} 条记录到 {out_dir}", M_Color.GREEN)
+        else:
+            for _, r in records:
+                print(json.dumps(r.get("input", {}), ensure_ascii=False))
+        return
+
+    if as_json:
+        print(json.dumps([dict(r, index=i) for i, r in records], ensure_ascii=False, indent=2))
+        return
+    print(f"{'#':>5}  {'time':<23} {'event':<18} {'session':<9} {'bytes':>7}  detail")
+    print("-" * 90)
+    for i, r in records:
+        payload = r.get("input") or {}
+        detail = payload.get("tool_name") or payload.get("prompt") or payload.get("source") or ""
+        size = len(json.dumps(payload, ensure_ascii=False).encode('utf-8'))
+        print(f"{i:>5}  {str(r.get('ts', '')):<23} {str(r.get('event', '')):<18} "
+              f"{str(r.get('session_id', ''))[:8]:<9} {size:>7}  {str(detail)[:40]}")
+
+
+def run_hook_once(command: str, payload: dict, env: dict, cwd: Path) -> dict:
+    """
+    运行一次 hook 命令, 用 os.wait4 取子进程资源占用
+
+    Returns:
+        dict: {wall_ms, cpu_ms, maxrss_kb, returncode}
+    """
+    import time
+    start = time.perf_counter()
+    proc = subprocess.Popen(command, shell=True, cwd=str(cwd), env=env, stdin=subprocess.PIPE,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        proc.stdin.write(json.dumps(payload, ensure_ascii=False).encode('utf-8'))
+        proc.stdin.close()
+    except BrokenPipeError:
+        pass
+    _, status, usage = os.wait4(proc.pid, 0)
+    wall_ms = (time.perf_counter() - start) * 1000
+    proc.returncode = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -os.WTERMSIG(status)
+    ##; ru_maxrss: Linux 为 KB, macOS 为字节
+    maxrss_kb = usage.ru_maxrss // 1024 if sys.platform == 'darwin' else usage.ru_maxrss
+    return dict(wall_ms=wall_ms, cpu_ms=(usage.ru_utime + usage.ru_stime) * 1000,
+                maxrss_kb=maxrss_kb, returncode=proc.returncode)
+
+
+def cmd_snapshot(action, project=None, branch=None, show_all=False, limit=20, rev=None, paths=None,
+                 to_dir=None, older_than=24.0, by='session', dry_run=False, run_gc=True):
+    """
+    子命令: snapshot list|restore|log|squash - 查看/恢复 git_auto_commit.py 快照模式记录的工作区快照
+
+    快照保存在 refs/zco/snapshots/<分支>, 不在用户的分支历史中.
+
+    Args:
+        action: list 列出快照; restore 恢复快照; log 查看后台自动提交日志; squash 压缩未推送的 tm: 提交
+        project: 项目路径, 默认当前 Git 仓库
+        branch: 快照所属分支, 默认当前分支
+        show_all: list 列出所有分支的快照
+        limit: 每个分支最多列出 N 个
+        rev: restore 的快照: 数字 N 表示该分支倒数第 N 个 (0 为最新), 也可以是任意提交名
+        paths: restore 只恢复这些路径
+        to_dir: restore 导出到该目录 (不改动工作区)
+        older_than: squash 只压缩早于该小时数的 tm: 提交
+        by: squash 分组方式, session (按 Zco-Session trailer, 没有时按日期) 或 day
+        dry_run: squash 只列出计划, 不改写
+        run_gc: squash 后在后台运行 git maintenance run --auto
+    """
+    _rebuild_worker_init(str(ZCO_CLAUDE_TPL_DIR / "hooks"))
+    from git_auto_commit import (SNAPSHOT_OK, SNAPSHOT_REF_PREFIX, SQUASH_BACKUP_PREFIX, background_paths,
+                                 repo_info, snapshot_ref, take_snapshot)
+
+    info = repo_info(str(Path(project).resolve() if project else Path.cwd()))
+    if info is None:
+        pf_color("❌ 不是 Git 仓库", M_Color.RED)
+        return
+    git_dir, toplevel, current_branch = info
+    branch = branch or current_branch
+
+    def git(*args, **kwargs):
+        return subprocess.run(['git', '-C', toplevel] + list(args), capture_output=True, text=True, **kwargs)
+
+    if action == 'log':
+        log_file = Path(background_paths(git_dir)["log"])
+        if not log_file.is_file():
+            pf_color(f"没有后台自动提交日志 (设置 ZCO_AUTO_GIT_COMMIT_BACKGROUND=1 启用): {log_file}",
+                     M_Color.YELLOW)
+            return
+        with open(log_file, 'r', encoding='utf-8') as f:
+            lines = f.readlines()[-limit:]
+        print(f"{'time':<19}  {'mode':<8} {'status':<10} {'合并':>4} {'ms':>8}  detail")
+        print("-" * 80)
+        for line in lines:
+            try:
+                r = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            text = (f"{r.get('time', ''):<19}  {str(r.get('mode', '')):<8} {r.get('status', ''):<10} "
+                    f"{r.get('requests', 1):>4} {r.get('ms', 0):>8.1f}  {r.get('commit', '')[:10]} {r.get('detail', '')}")
+            if r.get("status") == "error":
+                pf_color(text, M_Color.RED)
+            else:
+                print(text)
+        return
+
+    if action == 'squash':
+        from git_auto_commit import run_maintenance, squash_tm_commits
+        result = squash_tm_commits(toplevel, older_than, by, dry_run=dry_run)
+        for run in result.get("runs", []):
+            print(f"  {run['first'][:10]}..{run['last'][:10]}  {run['count']:>4} 个提交  {run['key']}")
+        if result["status"] == "error":
+            pf_color(f"❌ 压缩失败: {result.get('detail', '')}", M_Color.RED)
+            return
+        if result["status"] == "skipped":
+            pf_color(f"跳过: {result.get('detail', '')}", M_Color.YELLOW)
+            return
+        if result["status"] == "unchanged":
+            pf_color(f"没有可压缩的 tm: 提交 (未推送且早于 {older_than:g} 小时), 分支: {result['branch']}",
+                     M_Color.YELLOW)
+        elif result["status"] == "planned":
+            pf_color(f"[dry-run] 将压缩 {len(result['runs'])} 段, 减少 {result['removed']} 个提交", M_Color.CYAN)
+        else:
+            pf_color(f"✅ {result['branch']}: 压缩 {len(result['runs'])} 段, 减少 {result['removed']} 个提交 "
+                     f"({result['old_head'][:10]} → {result['new_head'][:10]})", M_Color.GREEN)
+            print(f"   原 HEAD 备份: {SQUASH_BACKUP_PREFIX}{result['branch']}")
+        if run_gc and not dry_run:
+            run_maintenance(toplevel, background=True)
+            print("   已在后台启动 git maintenance")
+        return
+
+    if action == 'list':
+        refs = git('for-each-ref', '--format=%(refname)', SNAPSHOT_REF_PREFIX).stdout.split()
+        if not show_all:
+            refs = [r for r in refs if r == snapshot_ref(branch)]
+        if not refs:
+            pf_color(f"没有快照 (设置 ZCO_AUTO_GIT_COMMIT_MODE=snapshot 启用), 分支: {branch}", M_Color.YELLOW)
+            return
+        for ref in refs:
+            pf_color(f"\n📸 {ref}", M_Color.CYAN)
+            out = git('log', f'-n{limit}', '--format=%h%x00%ci%x00%B%x01', ref).stdout
+            for n, entry in enumerate(e for e in out.split('\x01') if e.strip()):
+                short, date, body = entry.strip('\n').split('\x00', 2)
+                ##; 说明取 prompt 行, 没有时取其它附加说明 (如恢复前的快照)
+                notes = [l for l in body.splitlines()[1:] if l and not l.startswith(('head: ', 'session: '))]
+                note = next((l[len('prompt: '):] for l in notes if l.startswith('prompt: ')), notes[0] if notes else '')
+                print(f"  {n:>3}  {short}  {date[:19]}  {note[:60]}")
+        return
+
+    if not rev:
+        pf_color("❌ 请指定要恢复的快照", M_Color.RED)
+        return
+    commit = f"{snapshot_ref(branch)}~{rev}" if rev.isdigit() else rev
+    resolved = git('rev-parse', '-q', '--verify', commit + '^{commit}')
+    if resolved.returncode != 0:
+        pf_color(f"❌ 找不到快照: {commit}", M_Color.RED)
+        return
+    commit = resolved.stdout.strip()
+    pathspec = list(paths or [])
+
+    if to_dir:
+        out_dir = Path(to_dir).resolve()
+        out_dir.mkdir(parents=True, exist_ok=True)
+        archive = subprocess.Popen(['git', '-C', toplevel, 'archive', commit, '--'] + pathspec,
+                                   stdout=subprocess.PIPE)
+        subprocess.run(['tar', '-x', '-C', str(out_dir)], stdin=archive.stdout, check=False)
+        archive.stdout.close()
+        if archive.wait() != 0:
+            pf_color("❌ 导出失败", M_Color.RED)
+            return
+        pf_color(f"✅ 快照 {commit[:10]} 已导出到 {out_dir}", M_Color.GREEN)
+        return
+
+    ##; 恢复前先给当前工作区拍一个快照, 恢复操作本身可以撤销
+    before = take_snapshot(toplevel, f"restore: before restoring {commit}", wait=ZCO_SNAPSHOT_LOCK_WAIT)
+    if before["status"] not in SNAPSHOT_OK:
+        reason = before.get('error') or f"{ZCO_SNAPSHOT_LOCK_WAIT} 秒内未能获取 snapshot.lock (hook 正在拍快照)"
+        pf_color(f"❌ 恢复前快照失败, 已取消 (工作区未改动): {reason}", M_Color.RED)
+        return
+    result = git('restore', f'--source={commit}', '--worktree', '--', *(pathspec or ['.']))
+    if result.returncode != 0:
+        pf_color(f"❌ 恢复失败: {result.stderr.strip()}", M_Color.RED)
+        return
+    pf_color(f"✅ 工作区已恢复到快照 {commit[:10]} (index 和 HEAD 未改动)", M_Color.GREEN)
+    if before.get("commit"):
+        print(f"   恢复前的状态: {before['commit'][:10]} ({before['ref']})")
+
+
+def cmd_rewind(project=None, session=None, turn=None, list_only=False):
+    """
+    子命令: rewind - 按会话轮次把工作区恢复到第 N 轮提示时的快照
+
+    git_auto_commit.py 在每轮提示时把快照 (提交模式为 HEAD) 记入 _.zco_hist/zco_turns/<会话8位>.turns,
+    定长记录按偏移直接读取, 不遍历提交历史.
+
+    Args:
+        project: 项目路径, 默认当前 Git 仓库
+        session: 会话 id 或其前缀, 默认最近有记录的会话
+        turn: 轮次 (从 1 开始)
+        list_only: 只列出该会话的轮次
+    """
+    _rebuild_worker_init(str(ZCO_CLAUDE_TPL_DIR / "hooks"))
+    from git_auto_commit import SNAPSHOT_OK, repo_info, take_snapshot
+    from zco_hist_common import (TURN_FLAG_COALESCED, TURN_FLAG_SNAPSHOT, hist_dir_path, iter_turns,
+                                 list_turn_sessions, read_turn, session_tag)
+
+    info = repo_info(str(Path(project).resolve() if project else Path.cwd()))
+    if info is None:
+        pf_color("❌ 不是 Git 仓库", M_Color.RED)
+        return
+    git_dir, toplevel, _ = info
+    hist_dir = hist_dir_path(toplevel)
+    sessions = list_turn_sessions(hist_dir) if (hist_dir / 'zco_turns').is_dir() else []
+    if not sessions:
+        pf_color(f"没有轮次索引 (需启用 ZCO_AUTO_GIT_COMMIT_MODE): {hist_dir}/zco_turns", M_Color.YELLOW)
+        return
+
+    ##; 会话: 完整 id / 8 位以上前缀按 session_tag 换算, 更短的前缀在已有会话中匹配
+    if not session:
+        tag = sessions[0][0]
+    elif len(session.replace('-', '')) >= 8:
+        tag = session_tag(session)
+    else:
+        matches = [s[0] for s in sessions if s[0].startswith(session.lower())]
+        if len(matches) != 1:
+            pf_color(f"❌ 会话前缀 {session!r} 匹配到 {len(matches)} 个会话: {matches[:5]}", M_Color.RED)
+            return
+        tag = matches[0]
+
+    def describe(rec):
+        kind = "snapshot" if rec["flags"] & TURN_FLAG_SNAPSHOT else "HEAD" if rec["commit"] else "-"
+        if rec["flags"] & TURN_FLAG_COALESCED:
+            kind += " (合并)"
+        when = datetime.fromtimestamp(rec["time"]).strftime('%Y-%m-%d %H:%M:%S')
+        return f"{rec['turn']:>5}  {when}  {rec['commit'][:10] or '-':<10}  {kind}"
+
+    if list_only or turn is None:
+        pf_color(f"\n🔁 会话 {tag} (最近的会话: {', '.join(s[0] for s in sessions[:5])})", M_Color.CYAN)
+        print(f"{'turn':>5}  {'time':<19}  {'commit':<10}  kind")
+        for rec in iter_turns(hist_dir, tag):
+            print(describe(rec))
+        if not list_only:
+            print(f"\n用法: zco-claude rewind --session {tag} --turn N")
+        return
+
+    rec = read_turn(hist_dir, tag, turn)
+    if rec is None:
+        pf_color(f"❌ 会话 {tag} 没有第 {turn} 轮的记录", M_Color.RED)
+        return
+    if not rec["tree"]:
+        pf_color(f"❌ 第 {turn} 轮没有可用的快照 (自动提交失败或后台尚未完成)", M_Color.RED)
+        return
+
+    def git(*args, **kwargs):
+        return subprocess.run(['git', '-C', toplevel] + list(args), capture_output=True, text=True, **kwargs)
+
+    if git('cat-file', '-e', rec["tree"]).returncode != 0:
+        pf_color(f"❌ 快照对象已不存在 (可能被压缩或 gc): {rec['tree']}", M_Color.RED)
+        return
+
+    ##; 恢复前先给当前工作区拍一个快照, rewind 本身可以撤销
+    before = take_snapshot(toplevel, f"rewind: before session {tag} turn {turn}", wait=ZCO_SNAPSHOT_LOCK_WAIT)
+    if before["status"] not in SNAPSHOT_OK:
+        reason = before.get('error') or f"{ZCO_SNAPSHOT_LOCK_WAIT} 秒内未能获取 snapshot.lock (hook 正在拍快照)"
+        pf_color(f"❌ 恢复前快照失败, 已取消 (工作区未改动): {reason}", M_Color.RED)
+        return
+
+    ##; 在临时 index 中 read-tree + checkout-index, 用户的 index 和 HEAD 不变
+    index_file = Path(git_dir) / 'zco' / 'rewind.index'
+    env = dict(os.environ, GIT_INDEX_FILE=str(index_file))
+    try:
+        for args in (['read-tree', rec["tree"]], ['checkout-index', '-a', '-f']):
+            result = git(*args, env=env)
+            if result.returncode != 0:
+                pf_color(f"❌ 恢复失败: {result.stderr.strip()}", M_Color.RED)
+                return
+    finally:
+        index_file.unlink(missing_ok=True)
+
+    ##; 快照包含未追踪文件, 之后新增的文件一并删除 (仍保存在恢复前的快照里)
+    removed = 0
+    if rec["flags"] & TURN_FLAG_SNAPSHOT:
+        added = git('diff-tree', '-r', '-z', '--name-only', '--diff-filter=A', rec["tree"], before["tree"])
+        for rel in (p for p in added.stdout.split('\0') if p):
+            try:
+                (Path(toplevel) / rel).unlink()
+                removed += 1
+            except OSError:
+                pass
+
+    pf_color(f"✅ 工作区已恢复到会话 {tag} 第 {turn} 轮: {describe(rec).strip()}", M_Color.GREEN)
+    if removed:
+        print(f"   删除了之后新增的 {removed} 个文件")
+    if before.get("commit"):
+        print(f"   恢复前的状态: {before['commit'][:10]} ({before['ref']}), "
+              f"可用 zco-claude snapshot restore {before['commit'][:10]} 撤销")
+
+
+def summarize_bench_samples(samples: list) -> dict:
+    """汇总一个 hook 的多次运行结果 (run_hook_once 的返回值): 墙钟 p50/p95/max、平均 CPU、峰值 RSS、失败次数"""
+    walls = sorted(x["wall_ms"] for x in samples)
+    return dict(
+        wall_p50=percentile(walls, 50), wall_p95=percentile(walls, 95), wall_max=walls[-1],
+        cpu_mean=sum(x["cpu_ms"] for x in samples) / len(samples),
+        maxrss_kb=max(x["maxrss_kb"] for x in samples),
+        failures=sum(1 for x in samples if x["returncode"] != 0),
+    )
+
+
+def cmd_hooks_bench(project=None, runs=10, event_filter=None, as_json=False):
+    """
+    子命令: hooks bench - 用采集/合成的输入重放生效 settings 中配置的每个 hook 命令
+
+    Args:
+        project: 项目路径 (读取其 settings 层和采集的输入), 默认当前 Git 仓库
+        runs: 每个 hook 运行次数
+        event_filter: 只测试该事件
+        as_json: 输出 JSON
+    """
+    import tempfile
+
+    project_dir = get_git_root(Path(project).resolve() if project else None)
+    layers = load_settings_layers(project_dir)
+    hooks, settings_env = collect_hook_commands(layers)
+    if event_filter:
+        hooks = [h for h in hooks if h[0] == event_filter]
+    if not hooks:
+        pf_color(f"未找到 hook 命令 (settings 层: {[str(p) for p, _ in layers]})", M_Color.YELLOW)
+        return
+
+    captured = load_bench_payloads(project_dir)
+    scratch_root = Path(tempfile.mkdtemp(prefix="zco_hooks_bench_"))
+    try:
+        ##; 临时 Git 仓库作为 hook 的 cwd, hooks 的输出和提交都落在这里
+        scratch_dir = scratch_root / "repo"
+        scratch_dir.mkdir()
+        subprocess.run(['git', 'init', '-q', str(scratch_dir)], check=True)
+        (scratch_dir / "README.md").write_text("bench\n", encoding='utf-8')
+        for args in (['add', '.'], ['-c', 'user.name=bench', '-c', 'user.email=bench@localhost',
+                                    'commit', '-q', '-m', 'init']):
+            subprocess.run(['git', '-C', str(scratch_dir)] + args, check=True, capture_output=True)
+        transcript = scratch_root / "transcript.jsonl"
+        write_synthetic_transcript(transcript)
+
+        env = dict(os.environ)
+        env.update(settings_env)
+        env["CLAUDE_PROJECT_DIR"] = str(project_dir)
+        env.setdefault("GIT_AUTHOR_NAME", "bench")
+        env.setdefault("GIT_AUTHOR_EMAIL", "bench@localhost")
+        env.setdefault("GIT_COMMITTER_NAME", "bench")
+        env.setdefault("GIT_COMMITTER_EMAIL", "bench@localhost")
+
+        results = []
+        for event, command, layer in hooks:
+            if event in captured:
+                payload, source = dict(captured[event]), "captured"
+                payload["cwd"] = str(scratch_dir)
+                if not Path(str(payload.get("transcript_path", ""))).is_file():
+                    payload["transcript_path"] = str(transcript)
+            else:
+                payload, source = synthetic_hook_payload(event, scratch_dir, transcript), "synthetic"
+            samples = []
+            for i in range(runs):
+                ##; 每次运行前制造一处改动, 让自动提交类 hook 有实际工作
+                (scratch_dir / "bench.txt").write_text(f"{i}\n", encoding='utf-8')
+                samples.append(run_hook_once(command, payload, env, scratch_dir))
+            results.append(dict(event=event, command=command, layer=str(layer), payload=source, runs=runs,
+                                **summarize_bench_samples(samples)))
+    finally:
+        shutil.rmtree(scratch_root, ignore_errors=True)
+
+    if as_json:
+        print(json.dumps(dict(project=str(project_dir), results=results), ensure_ascii=False, indent=2))
+        return
+
+    pf_color(f"\n🏎️  Hooks bench ({runs} 次/hook, 项目: {project_dir})\n", M_Color.CYAN)
+    pf_color(f"{'event':<18} {'wall p50':>9} {'p95':>9} {'max':>9} {'cpu':>8} {'RSS MB':>7} {'失败':>4}  command",
+             M_Color.CYAN)
+    pf_color("-" * 100, M_Color.CYAN)
+    for r in results:
+        color = M_Color.RED if r["failures"] else M_Color.GREEN
+        pf_color(f"{r['event']:<18} {r['wall_p50']:>9.1f} {r['wall_p95']:>9.1f} {r['wall_max']:>9.1f} "
+                 f"{r['cpu_mean']:>8.1f} {r['maxrss_kb'] / 1024:>7.1f} {r['failures']:>4}  "
+                 f"{r['command']}  [{r['payload']}]", color)
+
+    pf_color("\n按事件合计 (p50 之和, 即该事件每次触发增加的延迟):", M_Color.CYAN)
+    per_event = {}
+    for r in results:
+        per_event[r["event"]] = per_event.get(r["event"], 0.0) + r["wall_p50"]
+    for event, total in per_event.items():
+        print(f"  {event:<18} {total:>9.1f} ms")
+
+
+def cmd_hist_gc(record_file=None, action=None, include_unknown=False, jobs=None):
+    """
+    子命令: hist gc - 清理孤立的 hist home
+
+    Args:
+        record_file: 记录文件路径，默认为 ZCO_CLAUDE_RECORD_FILE
+        action: None 只报告, "archive" 打包后删除, "delete" 直接删除
+        include_unknown: 同时处理无法判断归属的目录
+        jobs: 并发统计目录大小的线程数
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    record_file = Path(record_file) if record_file else ZCO_CLAUDE_RECORD_FILE
+    pf_color("\n🧹 hist home 垃圾回收\n", M_Color.CYAN)
+    pf_color(f"hist 根目录： {ZCO_HIST_HOME_ROOT}", M_Color.GREEN)
+    pf_color(f"记录文件： {record_file}\n", M_Color.GREEN)
+
+    homes = list_hist_homes()
+    if not homes:
+        print("无 hist home 目录")
+        return
+
+    linked_targets = load_linked_targets(record_file)
+    classified = [(home,) + classify_hist_home(home, linked_targets) for home in homes]
+    candidates = [c for c in classified if c[1] == "orphan" or (include_unknown and c[1] == "unknown")]
+
+    ##; 并发统计目录大小 (I/O 为主, 线程池即可)
+    jobs = jobs or min(8, (os.cpu_count() or 1) * 2)
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        usages = dict(zip(homes, pool.map(dir_usage, homes)))
+
+    active_bytes = sum(usages[c[0]][0] for c in classified if c[1] == "active")
+    pf_color(f"{'状态':<8} {'大小':>10} {'文件数':>7}  目录 / 原因", M_Color.CYAN)
+    pf_color("-" * 80, M_Color.CYAN)
+    for home, status, project, reason in classified:
+        if status == "active":
+            continue
+        size, count = usages[home]
+        color = M_Color.RED if status == "orphan" else M_Color.YELLOW
+        pf_color(f"{status:<8} {format_size(size):>10} {count:>7}  {home.name}", color)
+        if project:
+            print(f"{'':<28}项目: {project}")
+        print(f"{'':<28}原因: {reason}")
+
+    orphan_count = sum(1 for c in classified if c[1] == "orphan")
+    unknown_count = sum(1 for c in classified if c[1] == "unknown")
+    candidate_bytes = sum(usages[c[0]][0] for c in candidates)
+    pf_color(f"\n总计: {len(homes)} 个 hist home, 活跃 {len(homes) - orphan_count - unknown_count} 个"
+             f" ({format_size(active_bytes)}), 孤立 {orphan_count} 个, 未知 {unknown_count} 个")
+    pf_color(f"可回收: {len(candidates)} 个目录, {format_size(candidate_bytes)}")
+
+    if not action or not candidates:
+        if candidates:
+            pf_color("\n提示: 使用 --archive 打包到 "
+                     f"{ZCO_HIST_ARCHIVE_DIR} 后删除, 或 --delete 直接删除", M_Color.YELLOW)
+        return
+
+    for home, status, project, reason in candidates:
+        try:
+            if action == "archive":
+                archive = archive_hist_home(home)
+                pf_color(f"  ✓ 已归档 {home.name} -> {archive}")
+            else:
+                shutil.rmtree(home)
+                pf_color(f"  ✓ 已删除 {home.name}")
+        except Exception as e:
+            pf_color(f"  ✗ {home.name} 处理失败: {e}", M_Color.RED)
+
+
 def cmd_init_project(target_path=None, tpl_dir=None, flag_git_root=False):
     """
     子命令: init - 初始化项目的 .claude/ 配置
@@ -1282,6 +2681,12 @@ def cmd_init_project(target_path=None, tpl_dir=None, flag_git_root=False):
     else:
         pf_color(f"  - 已生成项目本地配置  ")
 
+    ##; 大仓库: 建议开启 untracked cache / fsmonitor
+    try:
+        init_git_accel(target_path)
+    except Exception as e:
+        print(f"\n✗ 检查大仓库加速失败: {e}")
+
     pf_color(
         f"""\n建议:
         [1] 执行 echo \"**/*.local.*\" >> .gitignore 来忽略本地配置文件
@@ -1683,6 +3088,15 @@ def print_brief_help():
         ("list-linked-repos", "列出所有已链接的项目"),
         ("fix-linked-repos",  "修复已链接项目的软链接"),
         ("fix",               "修复指定项目的软链接"),
+        ("hist gc",           "清理孤立的 hist home (~/.claude/zco_hist)"),
+        ("hist du",           "统计对话历史占用 (按项目/类型/月份)"),
+        ("hist rebuild",      "从原始会话 JSONL 重新生成历史 Markdown"),
+        ("hook-stats",        "汇总 hooks 耗时 p50/p95/p99 与趋势"),
+        ("hooks bench",       "重放 hook 输入, 测量每个 hook 的耗时/CPU/内存"),
+        ("hooks capture",     "列出/导出 debug_hook 环形采集的事件"),
+        ("snapshot",          "列出/恢复自动提交快照模式的工作区快照"),
+        ("snapshot squash",   "压缩未推送的旧 tm: 自动提交并运行 git maintenance"),
+        ("rewind",            "把工作区恢复到会话第 N 轮提示时的快照"),
     ]
     for cmd, desc in cmds:
         pf_color(f"  {cmd:<22} {desc}", color_code=M_Color.CYAN)
@@ -1695,13 +3109,23 @@ def print_brief_help():
 
 
 def main():
-    """主函数"""
+    """主函数 (设置 ZCO_PROFILE=cpu|sample 时在 profiler 下运行, 结果保存到 ~/.claude/zco_hist/_.profiles)"""
+    if not os.environ.get('ZCO_PROFILE'):
+        return run_cli()
+    _rebuild_worker_init(str(ZCO_CLAUDE_TPL_DIR / "hooks"))
+    from zco_hist_common import run_entry
+    command = next((a for a in sys.argv[1:] if not a.startswith('-')), 'global')
+    return run_entry(run_cli, f"cli-{command}", out_dir=ZCO_HIST_HOME_ROOT / "_.profiles", read_payload=False)
+
+
+def run_cli():
+    """命令行解析与分发"""
     ##; 向后兼容：检查第一个参数是否是子命令或路径
     import sys
     argv = sys.argv[1:]
 
     ##; 定义有效的子命令
-    valid_commands = {'init', 'list-linked-repos', 'fix-linked-repos', 'fix'}
+    valid_commands = {'init', 'list-linked-repos', 'fix-linked-repos', 'fix', 'hist', 'hook-stats', 'hooks', 'snapshot', 'rewind'}
 
     want_verbose = '--verbose' in argv
 
@@ -1744,10 +3168,42 @@ def main():
 5. 修复项目配置:
    %(prog)s fix /path/to/target/project [--tpl TPL_DIR]
 
+6. 清理孤立的 hist home:
+   %(prog)s hist gc [--archive | --delete] [--include-unknown] [-j N]
+
+7. 统计对话历史占用:
+   %(prog)s hist du [--json] [--no-cache] [-j N]
+
+8. 重建对话历史 Markdown:
+   %(prog)s hist rebuild [--project P] [--since YYYY-MM-DD] [--jobs N] [--kinds spec,plain,cli_style]
+
+9. 汇总 hooks 耗时 (hooks 需设置 ZCO_HOOK_METRICS=1):
+   %(prog)s hook-stats [--project P] [--days N] [--json]
+
+10. 基准测试已配置的 hooks:
+   %(prog)s hooks bench [--project P] [-n N] [--event Stop] [--json]
+
+11. 查看 debug_hook 环形采集 (ZCO_HOOK_CAPTURE=ring):
+   %(prog)s hooks capture list [--event Stop] [--session S] [-n 20]
+   %(prog)s hooks capture extract --index 3,5 [-o DIR]
+
+12. 工作区快照 (ZCO_AUTO_GIT_COMMIT_MODE=snapshot):
+   %(prog)s snapshot list [--all] [-n 20]
+   %(prog)s snapshot restore 2 [PATH ...] [--to DIR]
+   %(prog)s snapshot log            # 后台自动提交日志 (ZCO_AUTO_GIT_COMMIT_BACKGROUND=1)
+   %(prog)s snapshot squash [--older-than 24] [--by session|day] [--dry-run]
+
+13. 回到会话第 N 轮提示时的工作区 (需启用 ZCO_AUTO_GIT_COMMIT_MODE):
+   %(prog)s rewind --list [--session S]
+   %(prog)s rewind --session S --turn 37
+
 说明:
   - init . : 在当前目录初始化 .claude/ 配置
   - list-linked-repos: 显示所有已初始化的项目列表
   - fix-linked-repos: 检查并修复所有软链接
+  - hist gc: 对照链接记录和文件系统, 报告/归档/删除孤立的 hist home
+  - hist du: 按项目、类型 (_spec/_plain/_cli_style/_resources)、月份统计占用
+  - hist rebuild: 渲染格式变化或 hook 曾关闭时, 用原始会话重新生成历史
   - 当前版本: %(prog)s {VERSION}
   - 默认模板(TPL_DIR): {ZCO_CLAUDE_TPL_DIR}
   - 默认汇总(RECORD_FILE): {ZCO_CLAUDE_RECORD_FILE}
@@ -1841,6 +3297,333 @@ def main():
         help='记录文件路径（可选，默认为 ~/.claude/zco-linked-projects.json）'
     )
 
+    ##; 子命令: hist - 对话历史目录管理
+    parser_hist = subparsers.add_parser(
+        'hist',
+        help='管理 ~/.claude/zco_hist 下的对话历史目录',
+        description='管理 ~/.claude/zco_hist 下的对话历史目录'
+    )
+    hist_subparsers = parser_hist.add_subparsers(dest='hist_command', help='hist 子命令')
+    parser_hist_gc = hist_subparsers.add_parser(
+        'gc',
+        help='清理孤立的 hist home',
+        description='对照链接记录和文件系统找出孤立的 hist home (项目已删除/移动/改用其他目录), 报告大小并归档或删除'
+    )
+    parser_hist_gc.add_argument(
+        '--record-file',
+        default=None,
+        help='记录文件路径（可选，默认为 ~/.claude/zco-linked-projects.json）'
+    )
+    gc_action = parser_hist_gc.add_mutually_exclusive_group()
+    gc_action.add_argument(
+        '--archive',
+        dest='gc_action',
+        action='store_const',
+        const='archive',
+        help=f'打包为 tar.gz 到 {ZCO_HIST_ARCHIVE_DIR} 后删除'
+    )
+    gc_action.add_argument(
+        '--delete',
+        dest='gc_action',
+        action='store_const',
+        const='delete',
+        help='直接删除（不可恢复）'
+    )
+    parser_hist_gc.add_argument(
+        '--include-unknown',
+        action='store_true',
+        default=False,
+        help='同时处理无标记文件且不在链接记录中的目录'
+    )
+    parser_hist_gc.add_argument(
+        '-j', '--jobs',
+        type=int,
+        default=None,
+        help='统计目录大小的并发线程数（默认: min(8, CPU*2)）'
+    )
+
+    parser_hist_du = hist_subparsers.add_parser(
+        'du',
+        help='统计对话历史占用',
+        description='并发统计所有 hist home 按项目、类型、月份的字节数和文件数 (目录 mtime 未变化时使用缓存)'
+    )
+    parser_hist_du.add_argument(
+        '--json',
+        action='store_true',
+        default=False,
+        help='输出 JSON'
+    )
+    parser_hist_du.add_argument(
+        '--no-cache',
+        action='store_true',
+        default=False,
+        help='忽略缓存重新统计'
+    )
+    parser_hist_du.add_argument(
+        '-j', '--jobs',
+        type=int,
+        default=None,
+        help='并发线程数（默认: min(8, CPU*2)）'
+    )
+
+    parser_hist_rebuild = hist_subparsers.add_parser(
+        'rebuild',
+        help='从原始会话 JSONL 重新生成历史 Markdown',
+        description='用 hooks 的 spec/plain/cli_style 渲染器并行重建历史, 输出比 transcript 新的会话跳过'
+    )
+    parser_hist_rebuild.add_argument(
+        '--project',
+        default=None,
+        help='项目路径（可选，默认为所有已链接项目）'
+    )
+    parser_hist_rebuild.add_argument(
+        '--since',
+        default=None,
+        help='只处理该日期之后修改的会话 (YYYY-MM-DD)'
+    )
+    parser_hist_rebuild.add_argument(
+        '-j', '--jobs',
+        type=int,
+        default=None,
+        help='并发进程数（默认: CPU 数）'
+    )
+    parser_hist_rebuild.add_argument(
+        '--kinds',
+        default=','.join(HIST_RENDERERS),
+        help=f"渲染类型，逗号分隔（默认: {','.join(HIST_RENDERERS)}）"
+    )
+    parser_hist_rebuild.add_argument(
+        '--force',
+        action='store_true',
+        default=False,
+        help='忽略已有输出，全部重建'
+    )
+    parser_hist_rebuild.add_argument(
+        '--record-file',
+        default=None,
+        help='记录文件路径（可选，默认为 ~/.claude/zco-linked-projects.json）'
+    )
+    parser_hist_rebuild.add_argument(
+        '--tpl',
+        default=None,
+        help='模板目录路径（可选，默认为 ClaudeSettings，提供 hooks 渲染器）'
+    )
+
+    ##; 子命令: hook-stats
+    parser_hook_stats = subparsers.add_parser(
+        'hook-stats',
+        help='汇总 hooks 耗时',
+        description='读取 zco_hook_metrics.jsonl, 按 hook/事件 输出 p50/p95/p99、各阶段耗时和按天趋势'
+    )
+    parser_hook_stats.add_argument(
+        '--project',
+        default=None,
+        help='项目路径（可选，默认为 ~/.claude/zco_hist 下所有项目）'
+    )
+    parser_hook_stats.add_argument(
+        '-d', '--days',
+        type=int,
+        default=30,
+        help='统计最近 N 天，0 表示全部（默认: 30）'
+    )
+    parser_hook_stats.add_argument(
+        '--json',
+        action='store_true',
+        default=False,
+        help='输出 JSON'
+    )
+
+    ##; 子命令: hooks
+    parser_hooks = subparsers.add_parser(
+        'hooks',
+        help='hooks 工具',
+        description='hooks 工具'
+    )
+    hooks_subparsers = parser_hooks.add_subparsers(dest='hooks_command', help='hooks 子命令')
+    parser_hooks_bench = hooks_subparsers.add_parser(
+        'bench',
+        help='重放 hook 输入并测量耗时',
+        description='读取生效的 settings 层, 用 debug_hook 采集的输入(没有则合成)在临时 Git 仓库中运行每个 hook N 次, '
+                    '报告 wall/CPU 时间和峰值内存'
+    )
+    parser_hooks_bench.add_argument(
+        '--project',
+        default=None,
+        help='项目路径（可选，默认为当前 Git 仓库）'
+    )
+    parser_hooks_bench.add_argument(
+        '-n', '--runs',
+        type=int,
+        default=10,
+        help='每个 hook 运行次数（默认: 10）'
+    )
+    parser_hooks_bench.add_argument(
+        '--event',
+        default=None,
+        help='只测试该事件的 hooks，如 Stop、UserPromptSubmit'
+    )
+    parser_hooks_bench.add_argument(
+        '--json',
+        action='store_true',
+        default=False,
+        help='输出 JSON'
+    )
+
+    parser_hooks_capture = hooks_subparsers.add_parser(
+        'capture',
+        help='查看 debug_hook 环形采集的事件',
+        description='列出/导出 debug_hook.py 在 ZCO_HOOK_CAPTURE=ring 模式下采集的 hook 输入'
+    )
+    parser_hooks_capture.add_argument(
+        'capture_action',
+        choices=['list', 'extract'],
+        help='list: 列出记录; extract: 输出记录的 hook 输入 JSON'
+    )
+    parser_hooks_capture.add_argument(
+        '--project',
+        default=None,
+        help='项目路径（可选，默认为当前 Git 仓库）'
+    )
+    parser_hooks_capture.add_argument(
+        '--event',
+        default=None,
+        help='只看该事件，如 Stop、PreToolUse'
+    )
+    parser_hooks_capture.add_argument(
+        '--session',
+        default=None,
+        help='只看 session_id 以此开头的记录'
+    )
+    parser_hooks_capture.add_argument(
+        '-n', '--limit',
+        type=int,
+        default=20,
+        help='只取最近 N 条，0 为全部（默认: 20）'
+    )
+    parser_hooks_capture.add_argument(
+        '--index',
+        default=None,
+        help='extract: 指定记录序号，逗号分隔（list 输出的 #）'
+    )
+    parser_hooks_capture.add_argument(
+        '-o', '--output',
+        default=None,
+        help='extract: 输出目录（每条记录一个 JSON 文件），默认逐行输出到 stdout'
+    )
+    parser_hooks_capture.add_argument(
+        '--json',
+        action='store_true',
+        default=False,
+        help='list: 输出 JSON'
+    )
+
+    ##; 子命令: snapshot
+    parser_snapshot = subparsers.add_parser(
+        'snapshot',
+        help='列出/恢复工作区快照',
+        description='git_auto_commit.py 快照模式 (ZCO_AUTO_GIT_COMMIT_MODE=snapshot) 把工作区记录在 '
+                    'refs/zco/snapshots/<分支>, 不改动 index 和 HEAD'
+    )
+    parser_snapshot.add_argument(
+        'snapshot_action',
+        choices=['list', 'restore', 'log', 'squash'],
+        help='list: 列出快照; restore: 恢复快照到工作区 (恢复前自动为当前工作区拍快照); '
+             'log: 查看后台自动提交日志 (ZCO_AUTO_GIT_COMMIT_BACKGROUND=1); '
+             'squash: 把未推送的旧 tm: 自动提交按会话/日期压缩 (不改写已推送的历史)'
+    )
+    parser_snapshot.add_argument(
+        'rev',
+        nargs='?',
+        default=None,
+        help='restore: 快照序号 (list 输出的数字, 0 为最新) 或提交名'
+    )
+    parser_snapshot.add_argument(
+        'paths',
+        nargs='*',
+        help='restore: 只恢复这些路径'
+    )
+    parser_snapshot.add_argument(
+        '--project',
+        default=None,
+        help='项目路径（可选，默认为当前 Git 仓库）'
+    )
+    parser_snapshot.add_argument(
+        '--branch',
+        default=None,
+        help='快照所属分支（默认: 当前分支）'
+    )
+    parser_snapshot.add_argument(
+        '--all',
+        action='store_true',
+        default=False,
+        help='list: 列出所有分支的快照'
+    )
+    parser_snapshot.add_argument(
+        '-n', '--limit',
+        type=int,
+        default=20,
+        help='list/log: 最多列出 N 条（默认: 20）'
+    )
+    parser_snapshot.add_argument(
+        '--to',
+        default=None,
+        help='restore: 导出到该目录而不改动工作区'
+    )
+    parser_snapshot.add_argument(
+        '--older-than',
+        type=float,
+        default=24.0,
+        help='squash: 只压缩早于 N 小时的 tm: 提交（默认: 24）'
+    )
+    parser_snapshot.add_argument(
+        '--by',
+        choices=['session', 'day'],
+        default='session',
+        help='squash: 分组方式（默认: session, 没有会话 trailer 的提交按日期）'
+    )
+    parser_snapshot.add_argument(
+        '--dry-run',
+        action='store_true',
+        default=False,
+        help='squash: 只列出将被压缩的提交'
+    )
+    parser_snapshot.add_argument(
+        '--no-gc',
+        action='store_true',
+        default=False,
+        help='squash: 不运行 git maintenance'
+    )
+
+    ##; 子命令: rewind
+    parser_rewind = subparsers.add_parser(
+        'rewind',
+        help='把工作区恢复到会话第 N 轮提示时的快照',
+        description='git_auto_commit.py 每轮提示记录一次快照 (或 HEAD) 到 _.zco_hist/zco_turns, '
+                    '按轮次直接定位并用 read-tree/checkout-index 恢复工作区, 不改动 index 和 HEAD'
+    )
+    parser_rewind.add_argument(
+        '--session',
+        default=None,
+        help='会话 id 或前缀（默认: 最近有记录的会话）'
+    )
+    parser_rewind.add_argument(
+        '--turn',
+        type=int,
+        default=None,
+        help='轮次, 从 1 开始（不指定时列出轮次）'
+    )
+    parser_rewind.add_argument(
+        '--list',
+        action='store_true',
+        default=False,
+        help='只列出会话的轮次'
+    )
+    parser_rewind.add_argument(
+        '--project',
+        default=None,
+        help='项目路径（可选，默认为当前 Git 仓库）'
+    )
+
     ##; 解析参数
     args = parser.parse_args()
 
@@ -1863,6 +3646,55 @@ def main():
     elif args.command == 'fix':
         cmd_fix(project_path=args.project_path, tpl_dir=args.tpl, record_file=args.record_file)
         return
+
+    elif args.command == 'hist':
+        if args.hist_command == 'gc':
+            cmd_hist_gc(record_file=args.record_file, action=args.gc_action,
+                        include_unknown=args.include_unknown, jobs=args.jobs)
+        elif args.hist_command == 'du':
+            cmd_hist_du(as_json=args.json, jobs=args.jobs, use_cache=not args.no_cache)
+        elif args.hist_command == 'rebuild':
+            kinds = [k.strip() for k in args.kinds.split(',') if k.strip()]
+            unknown = [k for k in kinds if k not in HIST_RENDERERS]
+            if unknown:
+                pf_color(f"错误：未知渲染类型 {unknown}, 可选: {list(HIST_RENDERERS)}", M_Color.RED)
+                sys.exit(1)
+            cmd_hist_rebuild(project=args.project, since=args.since, jobs=args.jobs, kinds=kinds,
+                             force=args.force, record_file=args.record_file, tpl_dir=args.tpl)
+        else:
+            parser_hist.print_help()
+        return
+
+    elif args.command == 'snapshot':
+        cmd_snapshot(args.snapshot_action, project=args.project, branch=args.branch, show_all=args.all,
+                     limit=max(args.limit, 1), rev=args.rev, paths=args.paths, to_dir=args.to,
+                     older_than=max(args.older_than, 0.0), by=args.by, dry_run=args.dry_run, run_gc=not args.no_gc)
+        return
+
+    elif args.command == 'rewind':
+        cmd_rewind(project=args.project, session=args.session, turn=args.turn, list_only=args.list)
+        return
+
+    elif args.command == 'hooks':
+        if args.hooks_command == 'bench':
+            cmd_hooks_bench(project=args.project, runs=max(args.runs, 1), event_filter=args.event,
+                            as_json=args.json)
+        elif args.hooks_command == 'capture':
+            try:
+                indexes = parse_index_list(args.index) if args.index else None
+            except ValueError:
+                pf_color(f"错误：--index 应为逗号分隔的非负整数 (list 输出的 #): {args.index!r}", M_Color.RED)
+                sys.exit(1)
+            cmd_hooks_capture(args.capture_action, project=args.project, event=args.event,
+                              session=args.session, limit=max(args.limit, 0), indexes=indexes,
+                              output=args.output, as_json=args.json)
+        else:
+            parser_hooks.print_help()
+        return
+
+    elif args.command == 'hook-stats':
+        cmd_hook_stats(project=args.project, days=args.days, as_json=args.json)
+        return
     else:
         # print help
         parser.print_help()